@@ -1,8 +1,10 @@
-from flask import Flask, session
+from flask import Flask, current_app, session, url_for
 from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
+from .cache import FragmentCache
 from .config import Config
 from .helpers import get_match_score
+from .images import has_variants, variant_url
 
 db = SQLAlchemy()
 
@@ -54,6 +56,25 @@ def status_badge(status: str):
         return Markup('<div class="muted" style="margin-top:6px">Pending</div>')
     return Markup('<div class="muted" style="margin-top:6px"></div>')
 
+def ground_image_src(ground, size='thumb'):
+    """Return the image URL for a ground at the given size ('thumb', 'medium' or None for original).
+    Uploaded images link straight to their stored variant. Everything else goes through the ground_image
+    route, which serves the local copy (and its variants) of scraped images, redirects to remote ones
+    and draws a placeholder for grounds without an image.
+    """
+    if has_variants(getattr(ground, 'image_url', None)):
+        return variant_url(ground.image_url, size)
+    return url_for('ground_image', ground_id=ground.id, size=size)
+
+def ground_card(ground):
+    """Rendered image and body of a ground card (partials/_ground_card.html), cached per ground until it changes.
+    Rendered straight from the Jinja environment, without context processors, so nothing user-specific ends up in it.
+    """
+    def render():
+        template = current_app.jinja_env.get_template('partials/_ground_card.html')
+        return Markup(template.render(ground=ground))
+    return current_app.extensions['ground_cards'].get_or_render(ground.id, render)
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -65,6 +86,8 @@ def create_app():
     app.jinja_env.filters['format_number'] = format_number
     app.jinja_env.filters['match_percent'] = match_percent
     app.jinja_env.filters['status_badge'] = status_badge
+    app.jinja_env.filters['ground_image_src'] = ground_image_src
+    app.jinja_env.filters['ground_card'] = ground_card
 
     @app.context_processor
     def inject_user_context():
@@ -85,7 +108,21 @@ def create_app():
             pass
         return dict(current_user_name=name, current_role=role)
     
+    from . import metrics
+    metrics.init_metrics(app)
+
     from . import routes
     routes.init_routes(app)
+
+    from . import commands
+    commands.init_commands(app)
+
+    from . import invalidation
+    invalidation.init_invalidation(app)
+
+    # Ground edits (from any worker) make the cached cards of that ground unreachable
+    ground_cards = FragmentCache(app.config['GROUND_CARD_CACHE_SIZE'], app.config['GROUND_CARD_CACHE_TTL'])
+    app.extensions['ground_cards'] = ground_cards
+    invalidation.subscribe('ground', ground_cards.invalidate)
     
     return app
@@ -0,0 +1,88 @@
+"""
+In-process result caches
+A small thread-safe LRU with a per-entry TTL; subscribe clear() to the invalidation bus to evict on writes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire ttl seconds after they were stored"""
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, *_args, **_kwargs):
+        """Drop every entry (accepts and ignores invalidation event arguments)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FragmentCache:
+    """Rendered HTML fragments (or other small per-object values) keyed by object id.
+    invalidate() drops an object's fragment (without a row id every fragment is dropped). A render that
+    was already running when any invalidation happened is returned but not stored, so it cannot put an
+    old fragment back; one generation counter guards that instead of a version per object ever seen.
+    """
+
+    def __init__(self, maxsize=2048, ttl=3600):
+        self._cache = TTLCache(maxsize, ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, obj_id, render):
+        html = self._cache.get(obj_id)
+        if html is None:
+            generation = self._generation
+            html = render()
+            with self._lock:
+                if generation == self._generation:
+                    self._cache.set(obj_id, html)
+        return html
+
+    def invalidate(self, _table=None, _op=None, row_id=None):
+        with self._lock:
+            self._generation += 1
+            if row_id is None:
+                self._cache.clear()
+            else:
+                self._cache.discard(row_id)
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,118 @@
+"""
+Flask CLI commands for maintenance and verification tasks
+Run with: flask --app run <command>
+"""
+
+import click
+
+from .geo import geocode
+from .locations import resolve_location
+from .models import db, Client, Company, Ground, Preferences
+
+
+def init_commands(app):
+    """Register all CLI commands"""
+
+    @app.cli.command('matching-parity')
+    @click.option('--company-id', type=int, default=None, help='Only check this company (default: all).')
+    def matching_parity(company_id):
+        """Check that the SQL matching engine scores exactly like the Python engine."""
+        from .matching_sql import check_parity
+
+        company_ids = [company_id] if company_id else [c.id for c in Company.query.order_by(Company.id).all()]
+        failed = False
+        for cid in company_ids:
+            differences = check_parity(cid)
+            if differences:
+                failed = True
+                click.echo(f'Company {cid}: {len(differences)} differences')
+                for line in differences[:20]:
+                    click.echo(f'  {line}')
+            else:
+                click.echo(f'Company {cid}: engines agree')
+        if failed:
+            raise SystemExit(1)
+
+
+    @app.cli.command('resolve-locations')
+    @click.option('--all', 'resolve_all', is_flag=True, help='Also re-resolve rows that already have a location id.')
+    def resolve_locations(resolve_all):
+        """Fill location_id and lat/lng of existing clients, grounds and preferences."""
+        for model in (Client, Ground, Preferences):
+            query = model.query
+            if not resolve_all:
+                query = query.filter(db.or_(model.location_id == None, model.lat == None))
+            resolved = total = 0
+            for row in query.all():
+                total += 1
+                row.location_id = resolve_location(row.location)
+                if row.lat is None or row.lng is None or resolve_all:
+                    coords = geocode(row.location)
+                    if coords:
+                        row.lat, row.lng = coords
+                resolved += row.location_id is not None
+            db.session.commit()
+            click.echo(f'{model.__tablename__}: {resolved}/{total} locations resolved')
+
+
+    @app.cli.command('snapshot-grounds')
+    def snapshot_grounds():
+        """Rewrite the shared ground snapshot now (e.g. from cron after bulk imports)."""
+        from .snapshot import refresh_snapshot
+
+        directory = app.config.get('GROUND_SNAPSHOT_DIR')
+        if not directory:
+            raise click.ClickException('GROUND_SNAPSHOT_DIR is empty; the snapshot is disabled')
+        generation = refresh_snapshot(directory, force=True)
+        click.echo(f'Ground snapshot generation {generation} written to {directory}')
+
+
+    @app.cli.command('generate-data')
+    @click.option('--companies', default=5, show_default=True)
+    @click.option('--clients', 'clients_per_company', default=200, show_default=True, help='Clients per company.')
+    @click.option('--grounds', default=10000, show_default=True)
+    @click.option('--matches', 'matches_per_client', default=5, show_default=True, help='Matches per client.')
+    @click.option('--seed', default=1, show_default=True, help='Same seed and existing data = same rows.')
+    @click.option('--batch-size', default=5000, show_default=True, help='Rows per COPY / executemany batch.')
+    def generate_data(companies, clients_per_company, grounds, matches_per_client, seed, batch_size):
+        """Add synthetic companies, clients, preferences, grounds and matches for scale testing."""
+        import time
+
+        from .synthetic import generate_dataset
+
+        def progress(table, rows):
+            click.echo(f'\r{table}: {rows:,} rows', nl=False)
+
+        started = time.perf_counter()
+        counts = generate_dataset(db.engine, companies, clients_per_company, grounds, matches_per_client,
+                                  seed=seed, batch_size=batch_size, progress=progress)
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        click.echo(f'\r{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s): '
+                   + ', '.join(f'{table} {rows:,}' for table, rows in counts.items()))
+
+
+    @app.cli.command('import-data')
+    @click.argument('kind', type=click.Choice(['grounds', 'clients']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--company', required=True, help='Company name or id: the provider of the grounds / owner of the clients.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'jsonl']), default=None,
+                  help='Default: from the file extension.')
+    @click.option('--batch-size', default=1000, show_default=True, help='Rows per COPY / executemany batch.')
+    def import_data(kind, path, company, fmt, batch_size):
+        """Bulk import grounds or clients from a CSV, JSON or JSON Lines file; invalid rows are reported and skipped."""
+        from .importer import detect_format, import_file
+
+        found = Company.query.get(int(company)) if company.isdigit() else Company.query.filter_by(name=company).first()
+        if found is None:
+            raise click.ClickException(f'Unknown company {company!r}')
+        try:
+            with open(path, 'rb') as stream:
+                result = import_file(db.engine, kind, stream, fmt or detect_format(path), found, batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for number, message in result.errors:
+            click.echo(f'row {number}: {message}', err=True)
+        click.echo(f'{result.imported:,} {kind} imported for {found.name}, {result.rejected:,} rows skipped')
+        if result.rejected:
+            raise SystemExit(1)
@@ -1,9 +1,16 @@
+import hashlib
 import os
+import tempfile
 from dotenv import load_dotenv
 from sqlalchemy.pool import NullPool
 
 load_dotenv()
 
+def _default_snapshot_dir():
+    """One snapshot directory per database, so apps on different databases never read each other's catalog"""
+    key = hashlib.sha256((os.getenv('DATABASE_URL') or '').encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'groundmatch-snapshot-{key}')
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
@@ -11,3 +18,71 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         "poolclass": NullPool  # Prevents MaxClientsInSessionMode error on Supabase
     }
+    # Browser cache lifetime (seconds) for ground images served by the app
+    IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', 86400))
+    PLACEHOLDER_CACHE_MAX_AGE = int(os.getenv('PLACEHOLDER_CACHE_MAX_AGE', 300))
+
+    # Image uploads: storage backend ('supabase' or 'local'; auto-detected when empty)
+    IMAGE_STORAGE = os.getenv('IMAGE_STORAGE', '')
+    SUPABASE_URL = os.getenv('SUPABASE_URL')
+    SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+    SUPABASE_BUCKET = os.getenv('SUPABASE_GROUND_BUCKET', 'ground-images')
+    # Photo size limit; only the image upload routes cap their request body (see limit_request_body)
+    MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+    # Bulk import files are read row by row, so their cap only bounds disk use and import time
+    MAX_IMPORT_BYTES = int(os.getenv('MAX_IMPORT_BYTES', 100 * 1024 * 1024))
+    IMAGE_UPLOAD_ASYNC = os.getenv('IMAGE_UPLOAD_ASYNC', '1') == '1'
+
+    # S3-compatible bucket (IMAGE_STORAGE=s3)
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_PUBLIC_URL = os.getenv('S3_PUBLIC_URL')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+    S3_REGION = os.getenv('S3_REGION')
+    S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY')
+
+    # Let the front-end server send local image files (zero-copy):
+    # USE_X_SENDFILE for Apache/lighttpd, IMAGE_ACCEL_REDIRECT_PREFIX for an nginx internal location
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', '0') == '1'
+    IMAGE_ACCEL_REDIRECT_PREFIX = os.getenv('IMAGE_ACCEL_REDIRECT_PREFIX', '')
+
+    # Matching engine for /match/run: 'python' (score in the web worker), 'parallel' (shard clients
+    # over worker processes) or 'sql' (score inside the database)
+    MATCHING_ENGINE = os.getenv('MATCHING_ENGINE', 'python')
+    MATCHING_WORKERS = int(os.getenv('MATCHING_WORKERS', 0))  # 0 = one per CPU core
+    MATCHING_PARALLEL_MIN_CLIENTS = int(os.getenv('MATCHING_PARALLEL_MIN_CLIENTS', 200))
+    MATCHING_TOP_K = int(os.getenv('MATCHING_TOP_K', 0))  # best grounds kept per client, 0 = all
+
+    # Memory-mapped ground catalog shared by all workers on a host (empty dir disables it; the default is a
+    # temp directory per DATABASE_URL); rewritten in the background after ground changes and at least every
+    # GROUND_SNAPSHOT_MAX_AGE seconds, while requests read the database
+    GROUND_SNAPSHOT_DIR = os.getenv('GROUND_SNAPSHOT_DIR', _default_snapshot_dir())
+    GROUND_SNAPSHOT_MAX_AGE = int(os.getenv('GROUND_SNAPSHOT_MAX_AGE', 300))
+
+    # grounds_list: plots per page and the result cache of ordered ids per filter combination
+    GROUNDS_PER_PAGE = int(os.getenv('GROUNDS_PER_PAGE', 24))
+    GROUNDS_CACHE_SIZE = int(os.getenv('GROUNDS_CACHE_SIZE', 512))
+    GROUNDS_CACHE_TTL = int(os.getenv('GROUNDS_CACHE_TTL', 120))
+    # matches_list: approved matches per page (ranked by total score in SQL)
+    MATCHES_PER_PAGE = int(os.getenv('MATCHES_PER_PAGE', 60))
+    # client_dashboard: best approved matches shown (the rest are on the matches list)
+    CLIENT_DASHBOARD_MATCHES = int(os.getenv('CLIENT_DASHBOARD_MATCHES', 12))
+
+    # Anonymous home page cache and rendered ground card fragments (seconds / entries); 0 disables
+    HOME_PAGE_CACHE_TTL = int(os.getenv('HOME_PAGE_CACHE_TTL', 300))
+    GROUND_CARD_CACHE_SIZE = int(os.getenv('GROUND_CARD_CACHE_SIZE', 2048))
+    GROUND_CARD_CACHE_TTL = int(os.getenv('GROUND_CARD_CACHE_TTL', 3600))
+    # Columns ground_image needs per ground, so conditional image requests are answered without a query
+    GROUND_IMAGE_CACHE_SIZE = int(os.getenv('GROUND_IMAGE_CACHE_SIZE', 8192))
+    GROUND_IMAGE_CACHE_TTL = int(os.getenv('GROUND_IMAGE_CACHE_TTL', 3600))
+
+    # Per-request metrics at /metrics (Prometheus format) and a warning log, with the SQL statements,
+    # for requests slower than SLOW_REQUEST_SECONDS (0 = never). /metrics answers only scrapers sending
+    # "Authorization: Bearer <METRICS_TOKEN>"; without a token it is not served at all
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))
+
+    # Cross-worker cache invalidation: 'postgres' (LISTEN/NOTIFY, needs the triggers from
+    # docs/DDL_schema.sql), 'local' (single process, ORM events) or 'auto' (by database URL)
+    INVALIDATION_BACKEND = os.getenv('INVALIDATION_BACKEND', 'auto')
@@ -0,0 +1,153 @@
+"""
+Geographic helpers for location matching
+Offline geocoding of Belgian locations, distance-band scoring and a grid index for radius queries
+"""
+
+import math
+import threading
+
+from .locations import lookup_place
+
+# Equirectangular projection around Belgium's mid-latitude. Within the country
+# this is accurate to well under 1%, and it only needs + and *, so the SQL
+# matching engine can compute exactly the same numbers as Python.
+KM_PER_DEG_LAT = 111.32
+KM_PER_DEG_LNG = KM_PER_DEG_LAT * math.cos(math.radians(50.5))
+
+# (max distance in km, location score); anything further scores 0
+LOCATION_DISTANCE_BANDS = (
+    (2, 100),
+    (10, 85),
+    (20, 70),
+    (35, 40),
+)
+
+DEFAULT_RADIUS_KM = 10
+
+
+# ============================================================================
+# OFFLINE GEOCODING
+# ============================================================================
+
+def geocode(text):
+    """Return (lat, lng) for a Belgian location string, or None if unknown.
+    Uses the postcode area's own coordinates, so deelgemeenten keep their position.
+    """
+    place = lookup_place(text)
+    return (place.lat, place.lng) if place else None
+
+
+# ============================================================================
+# DISTANCES
+# ============================================================================
+
+def squared_distance_km(lat1, lng1, lat2, lng2):
+    """Squared distance in km² (kept squared so SQL can compare without sqrt)"""
+    dy = (lat1 - lat2) * KM_PER_DEG_LAT
+    dx = (lng1 - lng2) * KM_PER_DEG_LNG
+    return dx * dx + dy * dy
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    return math.sqrt(squared_distance_km(lat1, lng1, lat2, lng2))
+
+
+def coords_of(obj):
+    """(lat, lng) of a Ground/Preferences/Client-like object, or None when not geocoded"""
+    lat = getattr(obj, 'lat', None)
+    lng = getattr(obj, 'lng', None)
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
+
+
+def distance_score(a, b):
+    """Location score (0-100) for two (lat, lng) points using LOCATION_DISTANCE_BANDS"""
+    d2 = squared_distance_km(a[0], a[1], b[0], b[1])
+    for max_km, score in LOCATION_DISTANCE_BANDS:
+        if d2 <= max_km * max_km:
+            return score
+    return 0
+
+
+# ============================================================================
+# GRID INDEX - radius queries without scanning every ground
+# ============================================================================
+
+class GridIndex:
+    """Buckets points into square cells of cell_km so a radius query only visits nearby cells"""
+
+    def __init__(self, points, cell_km=5.0):
+        """points: iterable of (item_id, lat, lng)"""
+        self.cell_km = cell_km
+        self.cells = {}
+        self.size = 0
+        for item_id, lat, lng in points:
+            if lat is None or lng is None:
+                continue
+            self.cells.setdefault(self._cell(lat, lng), []).append((item_id, lat, lng))
+            self.size += 1
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat * KM_PER_DEG_LAT / self.cell_km),
+                math.floor(lng * KM_PER_DEG_LNG / self.cell_km))
+
+    def within(self, lat, lng, radius_km):
+        """Return [(item_id, distance_km)] within radius_km of (lat, lng), nearest first"""
+        cx, cy = self._cell(lat, lng)
+        reach = int(math.ceil(radius_km / self.cell_km))
+        r2 = radius_km * radius_km
+        found = []
+        for x in range(cx - reach, cx + reach + 1):
+            for y in range(cy - reach, cy + reach + 1):
+                for item_id, plat, plng in self.cells.get((x, y), ()):
+                    d2 = squared_distance_km(lat, lng, plat, plng)
+                    if d2 <= r2:
+                        found.append((item_id, math.sqrt(d2)))
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+# Shared index over all geocoded grounds. It follows the ground snapshot's generation when the
+# snapshot is enabled (so it is current in every worker); otherwise it is rebuilt after ground changes.
+_ground_grid = None
+_ground_grid_key = None
+_ground_grid_dirty = True
+_ground_grid_lock = threading.Lock()
+
+
+def invalidate_ground_grid(*_args, **_kwargs):
+    """Mark the shared ground grid stale; the next query rebuilds it"""
+    global _ground_grid_dirty
+    _ground_grid_dirty = True
+
+
+def get_ground_grid():
+    """Return the shared GridIndex of ground coordinates, rebuilding it if stale"""
+    global _ground_grid, _ground_grid_key, _ground_grid_dirty
+    from .snapshot import current_snapshot
+    snapshot = current_snapshot()
+    key = snapshot.generation if snapshot is not None else None
+    if _ground_grid is not None and not _ground_grid_dirty and key == _ground_grid_key:
+        return _ground_grid
+    with _ground_grid_lock:
+        if _ground_grid is None or _ground_grid_dirty or key != _ground_grid_key:
+            _ground_grid_dirty = False
+            if snapshot is not None:
+                c = snapshot.columns
+                # NaN (missing coordinates) is the only value not equal to itself
+                points = ((i, lat, lng) for i, lat, lng in zip(c['id'], c['lat'], c['lng']) if lat == lat)
+            else:
+                from .models import db, Ground
+                points = db.session.query(Ground.id, Ground.lat, Ground.lng).filter(Ground.lat != None).all()
+            _ground_grid = GridIndex(points)
+            _ground_grid_key = key
+    return _ground_grid
+
+
+def grounds_within(location, radius_km):
+    """Ids of grounds within radius_km of a location string (nearest first), or None if it cannot be geocoded"""
+    center = geocode(location)
+    if center is None:
+        return None
+    return [ground_id for ground_id, _ in get_ground_grid().within(center[0], center[1], radius_km)]
@@ -0,0 +1,482 @@
+"""
+Image fetching and caching for ground photos
+Downloads scraped images concurrently into a content-addressed cache
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .storage import MmapLocalStorage, write_atomic
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except Exception:
+    requests = None
+    HTTPAdapter = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized between processes
+    fcntl = None
+
+try:
+    from bs4 import BeautifulSoup
+except Exception:
+    BeautifulSoup = None
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+    ImageOps = None
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+GROUNDS_IMAGE_DIR = os.path.join(os.path.dirname(__file__), 'static', 'images', 'grounds')
+IMAGE_CACHE_DIR = os.path.join(GROUNDS_IMAGE_DIR, 'cache')
+# Held while the index and failure log are merged and rewritten
+IMAGE_CACHE_LOCK_FILE = 'index.lock'
+FETCH_WORKERS = int(os.getenv('IMAGE_FETCH_WORKERS', 8))
+FETCH_TIMEOUT = 15
+# Failed downloads are retried with exponential backoff (IMAGE_RETRY_BACKOFF seconds after the first
+# failure, doubling per attempt), at most IMAGE_RETRY_BATCH sources per run, and given up after
+# IMAGE_RETRY_MAX_ATTEMPTS attempts
+RETRY_MAX_ATTEMPTS = int(os.getenv('IMAGE_RETRY_MAX_ATTEMPTS', 5))
+RETRY_BACKOFF = int(os.getenv('IMAGE_RETRY_BACKOFF', 900))
+RETRY_BATCH = int(os.getenv('IMAGE_RETRY_BATCH', 20))
+USER_AGENT = 'Mozilla/5.0'
+
+# Resized variants (bounding box in px) served to listing cards and detail pages
+IMAGE_SIZES = {
+    'thumb': (480, 270),
+    'medium': (1024, 576),
+}
+VARIANT_EXT = 'webp'
+VARIANT_MIMETYPE = 'image/webp'
+VARIANT_QUALITY = 80
+
+# Uploads stored under this prefix in the bucket have variants next to them
+VARIANT_PREFIX = 'grounds/'
+
+
+# Scraped images live on local disk as <id>.jpg plus <id>_<size>.webp variants
+GROUND_IMAGES = MmapLocalStorage(GROUNDS_IMAGE_DIR, '/static/images/grounds')
+
+
+def ground_image_name(ground_id, size=None):
+    """Return the object name of a scraped ground image (or one of its variants)"""
+    if size in IMAGE_SIZES:
+        return f"{ground_id}_{size}.{VARIANT_EXT}"
+    return f"{ground_id}.jpg"
+
+
+def ground_image_path(ground_id, size=None):
+    """Return the local path of the served image (or one of its variants) for a ground"""
+    return GROUND_IMAGES.path(ground_image_name(ground_id, size))
+
+
+# ============================================================================
+# VARIANTS - Thumbnail and medium renditions
+# ============================================================================
+
+def make_variants(data):
+    """Return {size: bytes} WebP renditions for every entry in IMAGE_SIZES.
+    Returns an empty dict if Pillow is unavailable or the bytes are not an image.
+    """
+    if Image is None:
+        return {}
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Let the JPEG decoder downscale while decoding; much cheaper for big photos
+            largest = max(IMAGE_SIZES.values())
+            img.draft('RGB', largest)
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            variants = {}
+            for size, box in IMAGE_SIZES.items():
+                rendition = img.copy()
+                rendition.thumbnail(box, Image.LANCZOS)
+                buf = io.BytesIO()
+                rendition.save(buf, 'WEBP', quality=VARIANT_QUALITY, method=4)
+                variants[size] = buf.getvalue()
+            return variants
+    except Exception:
+        return {}
+
+
+def variant_object_name(object_name, size):
+    """Storage object name of a variant: grounds/abc.jpg -> grounds/abc_thumb.webp"""
+    stem = object_name.rsplit('.', 1)[0]
+    return f"{stem}_{size}.{VARIANT_EXT}"
+
+
+def has_variants(image_url):
+    """Whether image_url is an upload stored under VARIANT_PREFIX, which has resized variants next to it"""
+    return bool(image_url) and f"/{VARIANT_PREFIX}" in image_url.partition('?')[0]
+
+
+def variant_url(image_url, size):
+    """Return the URL of a resized variant of an uploaded image.
+    Only uploads stored under VARIANT_PREFIX have variants; any other URL is returned unchanged.
+    """
+    if size not in IMAGE_SIZES or not has_variants(image_url):
+        return image_url
+    base, sep, query = image_url.partition('?')
+    return variant_object_name(base, size) + sep + query
+
+
+def save_local_variants(ground_id, data=None):
+    """Write resized variants for a local ground image. Returns the sizes written."""
+    if data is None:
+        try:
+            data = GROUND_IMAGES.read(ground_image_name(ground_id))
+        except OSError:
+            return []
+    written = []
+    for size, blob in make_variants(data).items():
+        GROUND_IMAGES.save_bytes(ground_image_name(ground_id, size), blob, VARIANT_MIMETYPE)
+        written.append(size)
+    return written
+
+
+# ============================================================================
+# CONTENT-ADDRESSED CACHE
+# ============================================================================
+
+class ImageCache:
+    """Stores image bytes by SHA-256 digest with a URL -> digest index.
+
+    Identical images (same bytes, or same source URL) are stored once. Failed
+    downloads are kept in a separate log so they can be retried later.
+    Several processes may share one cache: each remembers the entries it changed
+    and save() merges only those into the files on disk.
+    """
+
+    def __init__(self, root=IMAGE_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self.failures_path = os.path.join(root, 'failures.json')
+        self._lock = threading.Lock()
+        self._index = self._load_json(self.index_path)
+        self._failures = self._load_json(self.failures_path)
+        # Entries changed since the last save (None: failure removed)
+        self._index_updates = {}
+        self._failure_updates = {}
+
+    @staticmethod
+    def _load_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _dump_json(path, data):
+        # Per-process temp file + rename, so readers and concurrent writers never see a half-written index
+        write_atomic(path, json.dumps(data).encode('utf-8'))
+
+    def blob_path(self, digest, size=None):
+        """Path of a cached blob (or its variant), sharded by the first two hex characters"""
+        if size in IMAGE_SIZES:
+            return os.path.join(self.root, digest[:2], f"{digest}_{size}.{VARIANT_EXT}")
+        return os.path.join(self.root, digest[:2], f"{digest}.jpg")
+
+    def ensure_variants(self, digest):
+        """Render missing variants of a cached blob. Returns the sizes available."""
+        missing = [size for size in IMAGE_SIZES if not os.path.exists(self.blob_path(digest, size))]
+        if missing:
+            try:
+                with open(self.blob_path(digest), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return []
+            for size, blob in make_variants(data).items():
+                write_atomic(self.blob_path(digest, size), blob)
+        return [size for size in IMAGE_SIZES if os.path.exists(self.blob_path(digest, size))]
+
+    def lookup(self, url):
+        """Return the digest cached for url, or None if missing"""
+        with self._lock:
+            digest = self._index.get(url)
+        if digest and os.path.exists(self.blob_path(digest)):
+            return digest
+        return None
+
+    def store(self, data, *urls):
+        """Store bytes under their digest and index them by every given URL"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, data)
+        with self._lock:
+            for url in urls:
+                if url:
+                    self._index[url] = self._index_updates[url] = digest
+                    self._failures.pop(url, None)
+                    self._failure_updates[url] = None
+        return digest
+
+    def record_failure(self, url, ground_ids, plot, error):
+        """Remember a failed download so it can be retried later"""
+        with self._lock:
+            previous = self._failures.get(url, {})
+            self._failures[url] = self._failure_updates[url] = {
+                'ground_ids': sorted(set(previous.get('ground_ids', [])) | set(ground_ids)),
+                'plot': {k: plot.get(k) for k in ('image_url', 'detail_url')},
+                'error': str(error),
+                'attempts': previous.get('attempts', 0) + 1,
+                'last_attempt': datetime.utcnow().isoformat(timespec='seconds'),
+            }
+
+    def failures(self):
+        """Return a copy of the failure log keyed by source URL"""
+        with self._lock:
+            return dict(self._failures)
+
+    def due_failures(self, now=None, max_attempts=RETRY_MAX_ATTEMPTS, backoff=RETRY_BACKOFF):
+        """Failures worth retrying now: fewer than max_attempts attempts and past their backoff window,
+        oldest attempt first"""
+        now = now or datetime.utcnow()
+        due = []
+        for url, failure in self.failures().items():
+            attempts = failure.get('attempts', 1)
+            if attempts >= max_attempts:
+                continue
+            try:
+                last_attempt = datetime.fromisoformat(failure.get('last_attempt') or '')
+            except ValueError:
+                last_attempt = datetime.min
+            if last_attempt + timedelta(seconds=backoff * 2 ** (attempts - 1)) <= now:
+                due.append((last_attempt, url, failure))
+        return [(url, failure) for _, url, failure in sorted(due, key=lambda item: item[:2])]
+
+    def prune_failures(self, ground_ids):
+        """Forget failures of grounds that no longer exist. Returns the number of entries dropped."""
+        ground_ids = set(ground_ids)
+        with self._lock:
+            dropped = 0
+            for url, failure in list(self._failures.items()):
+                remaining = [gid for gid in failure.get('ground_ids', []) if gid in ground_ids]
+                if len(remaining) == len(failure.get('ground_ids', [])):
+                    continue
+                if remaining:
+                    failure['ground_ids'] = remaining
+                    self._failure_updates[url] = failure
+                else:
+                    del self._failures[url]
+                    self._failure_updates[url] = None
+                    dropped += 1
+        return dropped
+
+    def save(self):
+        """Persist the index and failure log to disk.
+        Under a file lock, the files are re-read and this cache's changes since its last save are
+        merged into them, so entries other processes saved meanwhile are kept (and picked up here).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, IMAGE_CACHE_LOCK_FILE), 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with self._lock:
+                    index_updates, self._index_updates = self._index_updates, {}
+                    failure_updates, self._failure_updates = self._failure_updates, {}
+                index = self._load_json(self.index_path)
+                index.update(index_updates)
+                failures = self._load_json(self.failures_path)
+                self._apply_failure_updates(failures, failure_updates)
+                self._dump_json(self.index_path, index)
+                self._dump_json(self.failures_path, failures)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        with self._lock:
+            # Changes made by other threads while saving stay pending for the next save
+            self._index = {**index, **self._index_updates}
+            self._apply_failure_updates(failures, self._failure_updates)
+            self._failures = failures
+
+    @staticmethod
+    def _apply_failure_updates(failures, updates):
+        for url, failure in updates.items():
+            if failure is None:
+                failures.pop(url, None)
+            else:
+                failures[url] = failure
+
+
+def link_ground_image(cache, digest, ground_id):
+    """Expose a cached blob and its variants as static/images/grounds/<id>[_<size>].* files"""
+    os.makedirs(GROUNDS_IMAGE_DIR, exist_ok=True)
+    for size in cache.ensure_variants(digest):
+        _link_file(cache.blob_path(digest, size), ground_image_path(ground_id, size))
+    return _link_file(cache.blob_path(digest), ground_image_path(ground_id))
+
+
+def _link_file(src, dst):
+    """Hard link src to dst, replacing dst; copies when hard links are not supported"""
+    if os.path.exists(dst):
+        try:
+            if os.path.samefile(src, dst):
+                return dst
+        except OSError:
+            pass
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+
+# ============================================================================
+# CONCURRENT FETCHER
+# ============================================================================
+
+class ImageFetcher:
+    """Downloads ground images with a bounded thread pool and a shared HTTP session.
+
+    Jobs are (plot_data, ground_id) pairs as produced by the scrapers. Plots
+    that point at the same source URL are downloaded once and linked to every
+    ground; URLs already in the cache are not downloaded again.
+    """
+
+    def __init__(self, cache=None, max_workers=FETCH_WORKERS, timeout=FETCH_TIMEOUT):
+        self.cache = cache or ImageCache()
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.session = None
+        if requests is not None:
+            self.session = requests.Session()
+            self.session.headers['User-Agent'] = USER_AGENT
+            # Keep one pooled connection per worker so hosts are not re-dialled per image
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    @staticmethod
+    def source_url(plot_data):
+        """URL identifying the image source of a scraped plot"""
+        return plot_data.get('image_url') or plot_data.get('detail_url')
+
+    def resolve_url(self, plot_data):
+        """Return the real image URL, looking it up on the detail page for placeholder images"""
+        img_url = self.source_url(plot_data)
+        if img_url and 'pixel' in img_url and plot_data.get('detail_url') and BeautifulSoup is not None:
+            try:
+                resp = self.session.get(plot_data['detail_url'], timeout=self.timeout)
+                resp.raise_for_status()
+                soup = BeautifulSoup(resp.text, 'html.parser')
+                candidates = [img.get('src') for img in soup.find_all('img') if img.get('src')]
+                for c in candidates:
+                    if c.startswith('http') and ('.jpg' in c or '.png' in c):
+                        return c
+            except Exception:
+                pass
+        return img_url
+
+    def _fetch_source(self, source, plot_data, ground_ids):
+        """Download one source URL and link it to all grounds that use it"""
+        digest = self.cache.lookup(source)
+        if not digest:
+            img_url = self.resolve_url(plot_data)
+            digest = self.cache.lookup(img_url) if img_url != source else None
+            if not digest:
+                try:
+                    resp = self.session.get(img_url, timeout=self.timeout)
+                    resp.raise_for_status()
+                    digest = self.cache.store(resp.content, source, img_url)
+                except Exception as e:
+                    self.cache.record_failure(source, ground_ids, plot_data, e)
+                    return []
+        saved = []
+        for ground_id in ground_ids:
+            try:
+                link_ground_image(self.cache, digest, ground_id)
+                saved.append(ground_id)
+            except OSError as e:
+                self.cache.record_failure(source, [ground_id], plot_data, e)
+        return saved
+
+    def fetch_all(self, jobs):
+        """Fetch images for (plot_data, ground_id) jobs. Returns (saved, failed) counts."""
+        if self.session is None:
+            return 0, len(jobs)
+
+        # Group grounds by source so duplicate URLs are only downloaded once
+        by_source = {}
+        failed = 0
+        for plot_data, ground_id in jobs:
+            source = self.source_url(plot_data)
+            if not source:
+                failed += 1
+                continue
+            entry = by_source.setdefault(source, (plot_data, []))
+            entry[1].append(ground_id)
+
+        saved = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._fetch_source, source, plot_data, ground_ids)
+                       for source, (plot_data, ground_ids) in by_source.items()]
+            for future, (_, ground_ids) in zip(futures, by_source.values()):
+                done = future.result()
+                saved += len(done)
+                failed += len(ground_ids) - len(done)
+
+        self.cache.save()
+        return saved, failed
+
+    def retry_failures(self, ground_ids, limit=RETRY_BATCH, skip_ground_ids=()):
+        """Retry the failed downloads that are due (see ImageCache.due_failures), at most limit sources.
+        Failures of grounds not in ground_ids (deleted since) are dropped first. Returns (saved, failed) counts.
+        """
+        self.cache.prune_failures(ground_ids)
+        jobs = []
+        for _, failure in self.cache.due_failures()[:limit]:
+            for ground_id in failure.get('ground_ids', []):
+                if ground_id not in skip_ground_ids:
+                    jobs.append((failure.get('plot') or {}, ground_id))
+        if not jobs:
+            self.cache.save()
+            return 0, 0
+        return self.fetch_all(jobs)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+def fetch_ground_images(jobs, max_workers=FETCH_WORKERS, existing_ground_ids=None):
+    """Convenience wrapper: fetch (plot_data, ground_id) jobs, then, when existing_ground_ids is given,
+    retry the earlier failures that are due (of grounds that still exist).
+
+    Returns ((saved, failed) for the given jobs, (saved, failed) for the retried ones).
+    """
+    fetcher = ImageFetcher(max_workers=max_workers)
+    try:
+        counts = fetcher.fetch_all(jobs)
+        retried = (0, 0)
+        if existing_ground_ids is not None:
+            retried = fetcher.retry_failures(existing_ground_ids,
+                                             skip_ground_ids={ground_id for _, ground_id in jobs})
+        return counts, retried
+    finally:
+        fetcher.close()
+
+
+def download_ground_image(plot_data, ground_id):
+    """Download image for a ground from scraped plot data. Returns True if successful.
+    Gracefully no-ops if optional deps (requests, bs4) are unavailable.
+    """
+    (saved, _), _ = fetch_ground_images([(plot_data, ground_id)], max_workers=1)
+    return saved > 0
@@ -0,0 +1,308 @@
+"""
+Bulk import of grounds and clients from CSV or JSON uploads
+Rows are read one at a time, validated like the add forms (subdivision types through normalize_subdivision_type,
+locations resolved to location_id and lat/lng at import time) and loaded in batches with the synthetic data
+BulkLoader: COPY on PostgreSQL, executemany elsewhere. Invalid rows are reported by row number and skipped;
+the rest of the file is still imported.
+"""
+
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import re
+
+from sqlalchemy import select
+
+from . import geo
+from .helpers import normalize_subdivision_type
+from .locations import resolve_location
+from .models import Client, Ground
+from .synthetic import BulkLoader
+
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+BATCH_SIZE = 1000
+# Characters read at a time from a JSON array file
+JSON_CHUNK_SIZE = 64 * 1024
+
+# Columns written per kind (ids come from the table's identity / sequence)
+GROUND_COLUMNS = ('location', 'address', 'm2', 'budget', 'subdivision_type', 'owner', 'provider', 'image_url',
+                  'location_id', 'lat', 'lng')
+CLIENT_COLUMNS = ('company_id', 'name', 'email', 'location', 'address', 'location_id', 'lat', 'lng')
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message is shown next to its row number"""
+
+
+class ImportResult:
+    """Rows imported and (row number, message) for every row that was skipped"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.imported = 0
+        self.errors = []
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+
+def detect_format(filename):
+    """'csv', 'json' (an array of objects) or 'jsonl' (one object per line) from the file extension"""
+    fmt = FORMATS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt is None:
+        raise ValueError(f'Unsupported file type; use {", ".join(sorted(FORMATS))}')
+    return fmt
+
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def read_records(stream, fmt):
+    """Yield (row number, record) from a binary stream. Field names are matched case-insensitively.
+    CSV rows are numbered like spreadsheet rows (the header is row 1); a JSON Lines row that is not an
+    object is yielded as a RowError.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, _normalize_keys(record)
+        elif fmt == 'jsonl':
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield number, RowError(f'invalid JSON: {e}')
+                    continue
+                yield number, _normalize_keys(record) if isinstance(record, dict) else RowError('not a JSON object')
+        else:
+            for number, record in enumerate(iter_json_array(text), start=1):
+                yield number, _normalize_keys(record) if isinstance(record, dict) else RowError('not a JSON object')
+    finally:
+        # Leave the caller's stream open
+        text.detach()
+
+
+_JSON_SPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(text, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the elements of the JSON array in a text stream, read chunk by chunk: only the current
+    element and one chunk are held in memory, however large the file. Raises ValueError for anything else.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = '' if eof else text.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+        return not eof
+
+    def peek():
+        """The next character after any whitespace ('' at the end of the stream), not consumed"""
+        nonlocal pos
+        while True:
+            pos = _JSON_SPACE.match(buffer, pos).end()
+            if pos < len(buffer) or not read_more():
+                return buffer[pos:pos + 1]
+
+    if peek() != '[':
+        raise ValueError('A JSON import must be an array of objects')
+    pos += 1
+    if peek() == ']':
+        pos += 1
+    else:
+        for number in itertools.count(1):
+            peek()
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if read_more():
+                        continue
+                    raise ValueError(f'invalid JSON in array element {number}: {e.msg}') from None
+                # A number at the end of the buffer may go on in the next chunk
+                if end == len(buffer) and read_more():
+                    continue
+                break
+            pos = end
+            yield element
+            separator = peek()
+            pos += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ValueError(f'invalid JSON after array element {number}: '
+                                 + (f'expected "," or "]", got {separator!r}' if separator else 'the file ends early'))
+    if peek():
+        raise ValueError('invalid JSON: extra data after the array')
+
+
+def _normalize_keys(record):
+    return {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+
+
+# ============================================================================
+# VALIDATION - one row tuple in *_COLUMNS order, or RowError
+# ============================================================================
+
+def _text(record, model, name, required=False):
+    value = record.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'{name} is required')
+    length = model.__table__.c[name].type.length
+    if length and len(value) > length:
+        raise RowError(f'{name} is longer than {length} characters')
+    return value
+
+
+def _positive(record, name, integer=False):
+    try:
+        number = float(record.get(name))
+    except (TypeError, ValueError):
+        raise RowError(f'{name} must be a number') from None
+    if not math.isfinite(number) or number <= 0:
+        raise RowError(f'{name} must be positive')
+    if integer:
+        if not number.is_integer():
+            raise RowError(f'{name} must be a whole number')
+        return int(number)
+    return number
+
+
+def _location_fields(record, location):
+    """location_id plus the given lat/lng, or coordinates derived from the location like the ORM does"""
+    lat, lng = record.get('lat'), record.get('lng')
+    if lat not in (None, '') and lng not in (None, ''):
+        try:
+            coords = (float(lat), float(lng))
+        except ValueError:
+            raise RowError('lat and lng must be numbers') from None
+    else:
+        coords = geo.geocode(location) or (None, None)
+    return (resolve_location(location),) + coords
+
+
+def validate_ground(record, context):
+    location = _text(record, Ground, 'location', required=True)
+    raw_type = _text(record, Ground, 'subdivision_type')
+    subdivision_type = normalize_subdivision_type(raw_type) if raw_type else 'development_plot'
+    if subdivision_type is None:
+        raise RowError(f"unknown subdivision_type '{raw_type}'")
+    return (
+        location,
+        _text(record, Ground, 'address'),
+        _positive(record, 'm2', integer=True),
+        _positive(record, 'budget'),
+        subdivision_type,
+        _text(record, Ground, 'owner', required=True),
+        context['provider'],
+        _text(record, Ground, 'image_url'),
+    ) + _location_fields(record, location)
+
+
+def validate_client(record, context):
+    name = _text(record, Client, 'name', required=True)
+    email = _text(record, Client, 'email', required=True)
+    if '@' not in email:
+        raise RowError(f"invalid email '{email}'")
+    # Same rule as client_add, also within the file
+    if email in context['emails']:
+        raise RowError(f"email '{email}' already exists")
+    location = _text(record, Client, 'location')
+    row = (context['company_id'], name, email, location, _text(record, Client, 'address')) + \
+        _location_fields(record, location)
+    context['emails'].add(email)
+    return row
+
+
+KINDS = {
+    'grounds': (Ground, GROUND_COLUMNS, validate_ground),
+    'clients': (Client, CLIENT_COLUMNS, validate_client),
+}
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def import_records(connection, kind, records, context, batch_size=BATCH_SIZE, loader=None):
+    """Validate and load (row number, record) pairs on connection. Returns an ImportResult.
+    A batch the database rejects (e.g. a concurrent duplicate) is retried row by row,
+    so only the offending rows are reported.
+    """
+    model, columns, validate = KINDS[kind]
+    loader = loader or BulkLoader(connection)
+    result = ImportResult(kind)
+    batch = []
+
+    def flush():
+        try:
+            with connection.begin_nested():
+                loader.load(model, [row for _, row in batch], columns)
+        except Exception:
+            for number, row in batch:
+                try:
+                    with connection.begin_nested():
+                        loader.load(model, [row], columns)
+                except Exception as e:
+                    result.errors.append((number, str(e).strip().splitlines()[0]))
+        batch.clear()
+
+    for number, record in records:
+        try:
+            if isinstance(record, RowError):
+                raise record
+            batch.append((number, validate(record, context)))
+        except RowError as e:
+            result.errors.append((number, str(e)))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    result.imported = loader.counts[model.__tablename__]
+    result.errors.sort()
+    return result
+
+
+def import_file(engine, kind, stream, fmt, company, batch_size=BATCH_SIZE):
+    """Import grounds (provided by company) or clients (of company) from an uploaded file in one transaction.
+    Raises ValueError when the file as a whole cannot be read.
+    """
+    from .invalidation import bus
+
+    if kind not in KINDS:
+        raise ValueError(f'Unknown import kind {kind!r}')
+    model = KINDS[kind][0]
+    with engine.begin() as connection:
+        context = {'company_id': company.id, 'provider': company.name}
+        if kind == 'clients':
+            context['emails'] = set(connection.execute(select(Client.__table__.c.email)).scalars())
+        loader = BulkLoader(connection)
+        # On PostgreSQL the COPY batches skip the NOTIFY triggers; one RESYNC is sent at commit instead
+        triggers_disabled = loader.disable_invalidation_triggers([model])
+        try:
+            result = import_records(connection, kind, read_records(stream, fmt), context, batch_size, loader)
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ValueError(f'Could not read the file: {e}') from e
+        if triggers_disabled:
+            loader.enable_invalidation_triggers([model])
+            if result.imported:
+                loader.notify_resync([model])
+
+    if result.imported:
+        # Core inserts bypass the ORM events; on PostgreSQL every worker is notified instead
+        if bus.local_delivery:
+            bus.publish(model.__tablename__, 'RESYNC', None)
+    return result
@@ -0,0 +1,295 @@
+"""
+Cross-worker cache invalidation
+Writes to ground, preferences, client and match are broadcast to every worker process so in-memory
+caches can evict what changed. The writing process always delivers its own writes after commit from
+ORM events; PostgreSQL delivers them to the other workers through statement-level triggers + LISTEN/NOTIFY
+(see docs/DDL_schema.sql). Each notification carries the writing transaction's id, so a worker's listener
+skips the notifications of transactions it already delivered itself.
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .models import db, Client, Ground, Match, Preferences
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'groundmatch_invalidate'
+TRACKED_MODELS = (Ground, Preferences, Client, Match)
+TRIGGER_FUNCTION = 'notify_cache_invalidation'
+TRIGGER_EVENTS = ('insert', 'update', 'delete')
+_PENDING_KEY = 'invalidation_pending'
+_TXID_KEY = 'invalidation_txid'
+# How long a committed transaction of this process is remembered; its NOTIFYs arrive right after commit
+OWN_TRANSACTION_TTL = 60.0
+
+
+class InvalidationBus:
+    """Dispatches (table, op, row_id) events to the handlers subscribed to that table.
+
+    op is 'INSERT', 'UPDATE', 'DELETE' or 'RESYNC' (anything may have changed);
+    row_id may be None when unknown.
+    Handlers run on the publishing thread (the listener thread for NOTIFY
+    events, inside an app context), so they should only drop cache entries.
+    """
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        self.local_delivery = True
+
+    def subscribe(self, table, handler):
+        with self._lock:
+            self._handlers[table].append(handler)
+
+    def unsubscribe(self, table, handler):
+        with self._lock:
+            if handler in self._handlers.get(table, ()):
+                self._handlers[table].remove(handler)
+
+    def publish(self, table, op, row_id=None):
+        with self._lock:
+            handlers = list(self._handlers.get(table, ()))
+        for handler in handlers:
+            try:
+                handler(table, op, row_id)
+            except Exception:
+                logger.exception('Cache invalidation handler %r failed for %s %s', handler, table, op)
+
+
+bus = InvalidationBus()
+
+
+def subscribe(tables, handler):
+    """Call handler(table, op, row_id) after committed writes to any of tables (in every worker)"""
+    for table in ([tables] if isinstance(tables, str) else tables):
+        bus.subscribe(table, handler)
+
+
+def trigger_names(table):
+    """The notify_cache_invalidation() triggers of a tracked table (one per event, see docs/DDL_schema.sql)"""
+    return [f'trg_{table}_invalidate_{event_name}' for event_name in TRIGGER_EVENTS]
+
+
+# ============================================================================
+# LOCAL DELIVERY - ORM writes are published in the writing process after commit
+# ============================================================================
+
+# Set by init_invalidation when NOTIFYs are listened to, so writing sessions remember their transaction id
+_track_transactions = False
+# txid -> expiry (monotonic) of transactions committed and delivered by this process
+_own_transactions = {}
+_own_lock = threading.Lock()
+
+
+def transaction_id(connection):
+    """txid_current() of the connection's transaction"""
+    return connection.exec_driver_sql('SELECT txid_current()').scalar()
+
+
+def remember_own_transaction(txid):
+    """Mark a committed transaction as delivered locally, so the listener skips its NOTIFYs"""
+    now = time.monotonic()
+    with _own_lock:
+        for expired in [t for t, expiry in _own_transactions.items() if expiry <= now]:
+            del _own_transactions[expired]
+        _own_transactions[txid] = now + OWN_TRANSACTION_TTL
+
+
+def is_own_transaction(txid):
+    with _own_lock:
+        expiry = _own_transactions.get(txid)
+    return expiry is not None and expiry > time.monotonic()
+
+
+def _remember_transaction(session, connection):
+    # One round trip per writing transaction; read-only requests never pay it
+    if _track_transactions and _TXID_KEY not in session.info:
+        session.info[_TXID_KEY] = transaction_id(connection)
+
+
+def _record(op):
+    def handler(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            _remember_transaction(session, connection)
+            session.info.setdefault(_PENDING_KEY, set()).add((mapper.local_table.name, op, target.id))
+    return handler
+
+
+def _publish_pending(session):
+    txid = session.info.pop(_TXID_KEY, None)
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending and bus.local_delivery:
+        if txid is not None:
+            remember_own_transaction(txid)
+        for table, op, row_id in sorted(pending, key=str):
+            bus.publish(table, op, row_id)
+
+
+def _discard_pending(session, *_args):
+    session.info.pop(_TXID_KEY, None)
+    session.info.pop(_PENDING_KEY, None)
+
+
+def record_bulk_write(session, table, op, row_ids):
+    """Queue events for a bulk statement (Query.delete/update) that bypasses the ORM events.
+    Published after the session commits, like ORM writes; rows changed by ON DELETE CASCADE are covered
+    by the event of their parent table.
+    """
+    _remember_transaction(session, session.connection())
+    session.info.setdefault(_PENDING_KEY, set()).update((table, op, row_id) for row_id in row_ids)
+
+
+for _model in TRACKED_MODELS:
+    event.listen(_model, 'after_insert', _record('INSERT'))
+    event.listen(_model, 'after_update', _record('UPDATE'))
+    event.listen(_model, 'after_delete', _record('DELETE'))
+event.listen(Session, 'after_commit', _publish_pending)
+event.listen(Session, 'after_soft_rollback', _discard_pending)
+
+
+# ============================================================================
+# POSTGRESQL LISTENER
+# ============================================================================
+
+def missing_triggers(connection):
+    """Tracked tables without all of their enabled notify_cache_invalidation() triggers"""
+    present = set(connection.exec_driver_sql(
+        "SELECT t.tgname FROM pg_trigger t "
+        "JOIN pg_class c ON c.oid = t.tgrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "JOIN pg_proc p ON p.oid = t.tgfoid "
+        "WHERE n.nspname = 'public' AND p.proname = %(function)s AND NOT t.tgisinternal AND t.tgenabled <> 'D'",
+        {'function': TRIGGER_FUNCTION},
+    ).scalars())
+    return [model.__tablename__ for model in TRACKED_MODELS
+            if not set(trigger_names(model.__tablename__)) <= present]
+
+
+def parse_payload(payload):
+    """(table, op, row ids, txid) from a NOTIFY payload written by notify_cache_invalidation().
+    The ids are [None] when the statement changed too many rows to list them (op is then RESYNC).
+    """
+    data = json.loads(payload)
+    return data.get('table'), data.get('op'), data.get('ids') or [data.get('id')], data.get('txid')
+
+
+class PostgresListener(threading.Thread):
+    """Daemon thread that LISTENs on CHANNEL and publishes each notification on the bus.
+    Reconnects with backoff; after a reconnect every table is treated as changed,
+    because notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, app, poll_timeout=5.0):
+        super().__init__(name='cache-invalidation', daemon=True)
+        self.app = app
+        self.poll_timeout = poll_timeout
+        self.pid = os.getpid()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 1
+        first = True
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    conn = db.engine.raw_connection()
+                try:
+                    dbapi_conn = conn.driver_connection
+                    dbapi_conn.autocommit = True
+                    with dbapi_conn.cursor() as cur:
+                        cur.execute(f'LISTEN {CHANNEL}')
+                    if not first:
+                        for model in TRACKED_MODELS:
+                            self._publish(model.__tablename__, 'RESYNC', None)
+                    first = False
+                    backoff = 1
+                    self._listen(dbapi_conn)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.exception('Cache invalidation listener lost its connection; retrying in %ss', backoff)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _listen(self, dbapi_conn):
+        while not self._stop_event.is_set():
+            if select.select([dbapi_conn], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            dbapi_conn.poll()
+            while dbapi_conn.notifies:
+                notify = dbapi_conn.notifies.pop(0)
+                try:
+                    table, op, row_ids, txid = parse_payload(notify.payload)
+                except (ValueError, AttributeError):
+                    logger.warning('Ignoring malformed invalidation payload: %r', notify.payload)
+                    continue
+                if txid is not None and is_own_transaction(txid):
+                    continue
+                for row_id in row_ids:
+                    self._publish(table, op, row_id)
+
+    def _publish(self, table, op, row_id):
+        # Handlers may read the app config, like they do when called from a request
+        with self.app.app_context():
+            bus.publish(table, op, row_id)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def init_invalidation(app):
+    """Choose the delivery backend (INVALIDATION_BACKEND: auto, postgres, local or off).
+    With postgres, each worker process starts its listener on its first request,
+    so it also works when gunicorn forks workers from a preloaded app. When the
+    triggers are missing the other workers would never hear of a write, so the
+    backend falls back to local (with a warning).
+    """
+    backend = (app.config.get('INVALIDATION_BACKEND') or 'auto').strip().lower()
+    if backend == 'auto':
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        backend = 'postgres' if uri.startswith(('postgres://', 'postgresql')) else 'local'
+    if backend == 'postgres':
+        with app.app_context():
+            engine = db.engine
+            try:
+                with engine.connect() as connection:
+                    missing = missing_triggers(connection)
+            except Exception:
+                logger.exception('Could not check the cache invalidation triggers; using local invalidation')
+                backend = 'local'
+            else:
+                if missing:
+                    logger.warning('Cache invalidation triggers missing on %s (see docs/DDL_schema.sql); '
+                                   'using local invalidation, other workers will serve stale caches',
+                                   ', '.join(missing))
+                    backend = 'local'
+    app.config['INVALIDATION_BACKEND'] = backend
+    bus.local_delivery = backend != 'off'
+    if backend != 'postgres':
+        return
+
+    global _track_transactions
+    _track_transactions = True
+    @app.before_request
+    def _ensure_invalidation_listener():
+        global _listener
+        if _listener is not None and _listener.pid == os.getpid() and _listener.is_alive():
+            return
+        with _listener_lock:
+            if _listener is None or _listener.pid != os.getpid() or not _listener.is_alive():
+                _listener = PostgresListener(app)
+                _listener.start()
@@ -0,0 +1,124 @@
+"""
+Canonical Belgian locations
+Resolves free-text locations (postcodes, Dutch/French names, deelgemeenten) to municipality ids.
+The bundled CSV files cover about half of the municipalities (Brussels and Flanders, hardly any
+of Wallonia) and a third of the postcodes; other locations keep location_id NULL and are matched
+on their text.
+"""
+
+import csv
+import os
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+MUNICIPALITIES_CSV = os.path.join(DATA_DIR, 'be_municipalities.csv')
+POSTCODES_CSV = os.path.join(DATA_DIR, 'be_postcodes.csv')
+
+# A municipality is identified by its main postcode (e.g. 9000 for Gent and all its deelgemeenten)
+Municipality = namedtuple('Municipality', 'id name_nl name_fr lat lng')
+# A postcode area: its own coordinates plus the municipality it belongs to
+Place = namedtuple('Place', 'postcode municipality_id name lat lng')
+
+_POSTCODE_RE = re.compile(r'\b([1-9]\d{3})\b')
+_SEPARATOR_RE = re.compile(r'[(),;/]')
+# Words that qualify a place without naming another one ('Gent centrum', 'Namur ville')
+QUALIFIERS = frozenset({'centrum', 'center', 'centre', 'stad', 'ville'})
+
+
+def normalize_place(text):
+    """Lower-case, accent-free place name with punctuation collapsed to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+
+
+# ============================================================================
+# DICTIONARY - loaded once from the bundled CSV files
+# ============================================================================
+
+class LocationDictionary:
+    """Municipalities, their postcode areas and a precomputed alias -> place map.
+
+    Aliases are the normalized Dutch and French municipality names plus the
+    names of the postcode areas (deelgemeenten), so 'Gand', 'gent' and
+    'Drongen' all resolve without any substring search.
+    """
+
+    def __init__(self, municipalities_csv=MUNICIPALITIES_CSV, postcodes_csv=POSTCODES_CSV):
+        self.places = {}
+        with open(postcodes_csv, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                self.places[row['postcode']] = Place(row['postcode'], int(row['municipality']), row['name'],
+                                                     float(row['lat']), float(row['lng']))
+
+        self.municipalities = {}
+        self.aliases = {}
+        with open(municipalities_csv, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                main = self.places[row['id']]
+                municipality = Municipality(int(row['id']), row['name_nl'], row['name_fr'], main.lat, main.lng)
+                self.municipalities[municipality.id] = municipality
+                # Official names point at the municipality's main postcode area
+                for name in (row['name_nl'], row['name_fr']):
+                    self.aliases[normalize_place(name)] = main
+        for place in self.places.values():
+            # The first (main) postcode of a name wins; official names are never overridden
+            self.aliases.setdefault(normalize_place(place.name), place)
+
+    def lookup(self, text):
+        """Return the Place for a location string, or None if unknown.
+        Tries a 4-digit postcode first, then the full name, then each part of it between separators
+        ('Mol (Achterbos)') and the name without qualifier words ('Gent centrum'). Single words of a
+        longer name are never matched on their own: 'Oud-Heverlee' is not Heverlee.
+        """
+        if not text:
+            return None
+        match = _POSTCODE_RE.search(text)
+        if match and match.group(1) in self.places:
+            return self.places[match.group(1)]
+        name = normalize_place(_POSTCODE_RE.sub(' ', text))
+        if not name:
+            return None
+        if name in self.aliases:
+            return self.aliases[name]
+        for part in _SEPARATOR_RE.split(_POSTCODE_RE.sub(' ', text)):
+            part = normalize_place(part)
+            if part in self.aliases:
+                return self.aliases[part]
+        unqualified = ' '.join(word for word in name.split() if word not in QUALIFIERS)
+        return self.aliases.get(unqualified)
+
+
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+
+def get_location_dictionary():
+    """Return the shared LocationDictionary, loading the CSV files on first use"""
+    global _dictionary
+    if _dictionary is None:
+        with _dictionary_lock:
+            if _dictionary is None:
+                _dictionary = LocationDictionary()
+    return _dictionary
+
+
+def lookup_place(text):
+    """Place (postcode area) for a location string, or None"""
+    return get_location_dictionary().lookup(text)
+
+
+def resolve_location(text):
+    """Canonical municipality id for a location string, or None if unknown"""
+    place = lookup_place(text)
+    return place.municipality_id if place else None
+
+
+def municipality_name(location_id, lang='nl'):
+    """Display name of a municipality id in 'nl' or 'fr', or None"""
+    municipality = get_location_dictionary().municipalities.get(location_id)
+    if municipality is None:
+        return None
+    return municipality.name_fr if lang == 'fr' else municipality.name_nl
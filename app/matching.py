@@ -1,3 +1,6 @@
+from .geo import coords_of, distance_score
+
+
 def compute_match_scores(ground, preferences):
     """Scoring: budget + m2 + location + type. Returns dict with scores (0-100 each)."""
     
@@ -19,9 +22,17 @@ def compute_match_scores(ground, preferences):
     else:
         m2_score = 50
     
-    # Location score
+    # Location score: same municipality, else distance bands when both sides are
+    # geocoded, else text comparison for locations missing from the dictionary
     location_score = 50  # default
-    if preferences.location and ground.location:
+    ground_location_id = getattr(ground, 'location_id', None)
+    ground_coords = coords_of(ground)
+    preference_coords = coords_of(preferences)
+    if ground_location_id is not None and ground_location_id == getattr(preferences, 'location_id', None):
+        location_score = 100
+    elif ground_coords and preference_coords:
+        location_score = distance_score(ground_coords, preference_coords)
+    elif preferences.location and ground.location:
         if preferences.location.lower() in ground.location.lower():
             location_score = 100
         elif ground.location.lower() in preferences.location.lower():
@@ -43,3 +54,54 @@ def compute_match_scores(ground, preferences):
         'location_score': location_score,
         'type_score': type_score
     }
+
+
+def score_pair(client_id, ground_id, ground, preferences):
+    """Score one client/ground pair into the dict stored for match review."""
+    scores = compute_match_scores(ground, preferences)
+    return {
+        'client_id': client_id,
+        'ground_id': ground_id,
+        'budget_score': scores['budget_score'],
+        'm2_score': scores['m2_score'],
+        'location_score': scores.get('location_score', 0),
+        'type_score': scores.get('type_score', 0),
+    }
+
+
+def compute_company_matches(company_id, stats=None):
+    """Python engine: score every ground against every client (with preferences) of a company.
+    Pairs that are already approved are skipped. Returns a list of score dicts.
+    Stage timings and counts are recorded on stats (a RunStats) when given.
+    """
+    from sqlalchemy.orm import joinedload
+    from .models import db, Client, Match
+    from .run_stats import RunStats
+    from .snapshot import ground_rows
+
+    stats = stats if stats is not None else RunStats('python')
+    with stats.stage('load_clients'):
+        clients = Client.query.options(joinedload(Client.preferences)).filter_by(company_id=company_id).all()
+        clients = [client for client in clients if client.preferences]
+    with stats.stage('load_grounds'):
+        grounds = ground_rows()
+    with stats.stage('load_approved'):
+        # One query for all approved pairs instead of one per client/ground pair
+        approved = set(
+            db.session.query(Match.client_id, Match.ground_id)
+            .join(Client, Client.id == Match.client_id)
+            .filter(Client.company_id == company_id, Match.status == 'approved')
+            .all()
+        )
+
+    computed_matches = []
+    with stats.stage('scoring'):
+        for client in clients:
+            for ground in grounds:
+                if (client.id, ground.id) in approved:
+                    continue
+                computed_matches.append(score_pair(client.id, ground.id, ground, client.preferences))
+
+    stats.count(clients=len(clients), grounds=len(grounds), pairs=len(clients) * len(grounds),
+                approved=len(approved), candidates=len(computed_matches))
+    return computed_matches
@@ -0,0 +1,194 @@
+"""
+Process-pool matching engine for large companies
+Shards clients across worker processes that share one read-only copy of the ground catalog.
+The pool is started once per server process (forkserver, or spawn where unavailable, so workers never
+inherit the request thread's locks or database connections) and reused by every match run.
+Workers import the main module like spawn does, so entry scripts need the `if __name__ == '__main__':` guard.
+"""
+
+import heapq
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .matching import compute_match_scores
+from .snapshot import GroundRow, GroundSnapshot, current_snapshot
+
+# Plain rows carrying exactly the attributes compute_match_scores reads
+PreferenceRow = namedtuple('PreferenceRow', 'client_id min_budget max_budget min_m2 max_m2 '
+                                            'location location_id lat lng subdivision_type')
+
+SCORE_FIELDS = ('budget_score', 'm2_score', 'location_score', 'type_score')
+
+
+def total_score(scores):
+    """Average of the four component scores, like Match.total_score"""
+    return sum(scores[f] for f in SCORE_FIELDS) / 4.0
+
+
+# ============================================================================
+# WORKER SIDE
+# ============================================================================
+
+# (snapshot path, rows) of the snapshot a worker process read last; a path names one immutable generation
+_loaded_snapshot = (None, ())
+
+
+def _load_grounds(grounds):
+    """grounds is either a list of GroundRow or the path of a ground snapshot to map"""
+    global _loaded_snapshot
+    if isinstance(grounds, str):
+        if _loaded_snapshot[0] != grounds:
+            _loaded_snapshot = (grounds, list(GroundSnapshot(grounds).rows()))
+        return _loaded_snapshot[1]
+    return grounds
+
+
+def score_shard(preferences, approved=frozenset(), top_k=None, grounds=()):
+    """Score a shard of preferences against all grounds (a list of GroundRow or a snapshot path).
+
+    Returns score dicts sorted by total score (best first), keeping only the
+    top_k grounds per client when top_k is set. Pairs in approved
+    ({(client_id, ground_id)}) are skipped.
+    """
+    grounds = _load_grounds(grounds)
+    results = []
+    for pref in preferences:
+        scored = []
+        for ground in grounds:
+            if (pref.client_id, ground.id) in approved:
+                continue
+            scores = compute_match_scores(ground, pref)
+            scored.append((total_score(scores), -ground.id, scores))
+        best = heapq.nlargest(top_k, scored) if top_k else scored
+        for total, neg_ground_id, scores in best:
+            results.append({'client_id': pref.client_id, 'ground_id': -neg_ground_id, **scores})
+    results.sort(key=lambda m: (-total_score(m), m['client_id'], m['ground_id']))
+    return results
+
+
+# ============================================================================
+# COORDINATOR SIDE
+# ============================================================================
+
+def shard(items, count):
+    """Split items round-robin into at most count non-empty shards"""
+    count = max(1, min(count, len(items)))
+    return [items[i::count] for i in range(count)]
+
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # The fork server imports this module once, so every worker forks from it with the app already loaded
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def get_pool(workers):
+    """The process pool of this server process, started on first use.
+    A process forked from the one that started it (a gunicorn worker of a preloaded app) starts its own.
+    """
+    global _pool, _pool_key
+    key = (os.getpid(), workers)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None and _pool_key[0] == os.getpid():
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context())
+            _pool_key = key
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died, so the next run starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def match_in_processes(grounds, preferences, approved=frozenset(), workers=None, top_k=None):
+    """Score preferences x grounds on a process pool and merge the per-shard results.
+
+    preferences is a list of PreferenceRow; grounds a list of GroundRow or the
+    path of a ground snapshot file, which every worker then maps itself (once per
+    snapshot generation). A list is sent along with every task, so prefer the snapshot.
+    Returns score dicts ordered by total score, best first.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(preferences) < 2:
+        return score_shard(preferences, approved, top_k, grounds=grounds)
+
+    # A few shards per worker keeps all cores busy when shards finish unevenly
+    shards = shard(preferences, workers * 2)
+    pool = get_pool(workers)
+    try:
+        futures = []
+        for part in shards:
+            client_ids = {p.client_id for p in part}
+            part_approved = frozenset(pair for pair in approved if pair[0] in client_ids)
+            futures.append(pool.submit(score_shard, part, part_approved, top_k, grounds))
+        shard_results = [future.result() for future in futures]
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    # Shards are already sorted, so merging is a linear k-way merge
+    return list(heapq.merge(*shard_results,
+                            key=lambda m: (-total_score(m), m['client_id'], m['ground_id'])))
+
+
+def compute_company_matches_parallel(company_id, workers=None, top_k=None, min_clients=0, stats=None):
+    """Parallel engine: same results as compute_company_matches (optionally cut to top_k per client).
+    Workers map the shared ground snapshot when it is enabled; otherwise plain column tuples
+    (not ORM objects) are loaded and handed to them.
+    Companies with fewer than min_clients clients are scored in-process (no pool start-up cost).
+    Stage timings and counts are recorded on stats (a RunStats) when given.
+    """
+    from .models import db, Client, Ground, Match, Preferences
+    from .run_stats import RunStats
+
+    stats = stats if stats is not None else RunStats('parallel')
+    with stats.stage('load_grounds'):
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            grounds = snapshot.path
+            ground_count = len(snapshot)
+        else:
+            grounds = [GroundRow(*row) for row in db.session.query(
+                Ground.id, Ground.budget, Ground.m2, Ground.location, Ground.location_id,
+                Ground.lat, Ground.lng, Ground.subdivision_type,
+            ).order_by(Ground.id).all()]
+            ground_count = len(grounds)
+    with stats.stage('load_clients'):
+        preferences = [PreferenceRow(*row) for row in db.session.query(
+            Preferences.client_id, Preferences.min_budget, Preferences.max_budget, Preferences.min_m2,
+            Preferences.max_m2, Preferences.location, Preferences.location_id, Preferences.lat,
+            Preferences.lng, Preferences.subdivision_type,
+        ).join(Client, Client.id == Preferences.client_id).filter(Client.company_id == company_id)
+            .order_by(Preferences.client_id).all()]
+    with stats.stage('load_approved'):
+        approved = frozenset(
+            tuple(pair) for pair in db.session.query(Match.client_id, Match.ground_id)
+            .join(Client, Client.id == Match.client_id)
+            .filter(Client.company_id == company_id, Match.status == 'approved')
+            .all()
+        )
+    if len(preferences) < min_clients:
+        workers = 1
+    workers = workers or os.cpu_count() or 1
+    with stats.stage('scoring'):
+        results = match_in_processes(grounds, preferences, approved, workers=workers, top_k=top_k)
+    stats.count(clients=len(preferences), grounds=ground_count, pairs=len(preferences) * ground_count,
+                approved=len(approved), candidates=len(results), workers=workers, top_k=top_k)
+    return results
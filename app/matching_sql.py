@@ -0,0 +1,176 @@
+"""
+In-database matching engine
+Expresses the compute_match_scores rules as SQL CASE expressions and scores all pairs in one INSERT ... SELECT
+"""
+
+import uuid
+
+from sqlalchemy import and_, case, exists, func, insert, literal, select, true
+
+from .geo import KM_PER_DEG_LAT, KM_PER_DEG_LNG, LOCATION_DISTANCE_BANDS
+from .models import db, Client, Ground, Match, MatchCandidate, Preferences
+from .run_stats import RunStats
+
+
+def _is_set(column):
+    """SQL equivalent of Python truthiness for a nullable numeric column"""
+    return func.coalesce(column, 0) != 0
+
+
+def _has_text(column):
+    """SQL equivalent of Python truthiness for a nullable string column"""
+    return func.coalesce(column, '') != ''
+
+
+def _contains(haystack, needle, dialect_name):
+    """Case-insensitive substring test (needle in haystack) without LIKE wildcards"""
+    find = func.strpos if dialect_name == 'postgresql' else func.instr
+    return find(func.lower(haystack), func.lower(needle)) > 0
+
+
+def _squared_distance_km():
+    """Same arithmetic as geo.squared_distance_km(ground, preference), so both engines agree"""
+    dy = (Ground.lat - Preferences.lat) * literal(KM_PER_DEG_LAT)
+    dx = (Ground.lng - Preferences.lng) * literal(KM_PER_DEG_LNG)
+    return dx * dx + dy * dy
+
+
+def score_columns(dialect_name):
+    """Return the four component score expressions (budget, m2, location, type).
+    Must stay in line with compute_match_scores in matching.py.
+    """
+    budget_score = case(
+        (and_(_is_set(Preferences.min_budget), _is_set(Preferences.max_budget)),
+         case((Ground.budget.between(Preferences.min_budget, Preferences.max_budget), 100), else_=50)),
+        else_=50,
+    )
+    m2_score = case(
+        (and_(_is_set(Preferences.min_m2), _is_set(Preferences.max_m2)),
+         case((Ground.m2.between(Preferences.min_m2, Preferences.max_m2), 100), else_=50)),
+        else_=50,
+    )
+    d2 = _squared_distance_km()
+    location_score = case(
+        (and_(Ground.location_id.isnot(None), Ground.location_id == Preferences.location_id), 100),
+        (and_(Ground.lat.isnot(None), Ground.lng.isnot(None),
+              Preferences.lat.isnot(None), Preferences.lng.isnot(None)),
+         case(*[(d2 <= max_km * max_km, score) for max_km, score in LOCATION_DISTANCE_BANDS], else_=0)),
+        (and_(_has_text(Preferences.location), _has_text(Ground.location)),
+         case(
+             (_contains(Ground.location, Preferences.location, dialect_name), 100),
+             (_contains(Preferences.location, Ground.location, dialect_name), 70),
+             else_=0,
+         )),
+        else_=50,
+    )
+    type_score = case(
+        (and_(_has_text(Preferences.subdivision_type), _has_text(Ground.subdivision_type)),
+         case((func.lower(Preferences.subdivision_type) == func.lower(Ground.subdivision_type), 100), else_=0)),
+        else_=50,
+    )
+    return budget_score, m2_score, location_score, type_score
+
+
+def run_sql_matching(company_id, run_id=None, stats=None, replace=True):
+    """SQL engine: score all (client, ground) pairs of a company into match_candidate.
+
+    Earlier candidates of the company are replaced unless replace is False. Pairs that are already
+    approved are skipped. Returns (run_id, number of candidates).
+    Stage timings and counts are recorded on stats (a RunStats) when given.
+    """
+    stats = stats if stats is not None else RunStats('sql')
+    run_id = run_id or str(uuid.uuid4())
+    dialect_name = db.engine.dialect.name
+    budget_score, m2_score, location_score, type_score = score_columns(dialect_name)
+
+    already_approved = exists().where(
+        Match.client_id == Client.id,
+        Match.ground_id == Ground.id,
+        Match.status == 'approved',
+    )
+    pairs = (
+        select(
+            literal(run_id),
+            Client.company_id,
+            Client.id,
+            Ground.id,
+            budget_score,
+            m2_score,
+            location_score,
+            type_score,
+        )
+        .select_from(Client)
+        .join(Preferences, Preferences.client_id == Client.id)
+        .join(Ground, true())  # cross join: every ground for every client
+        .where(Client.company_id == company_id, ~already_approved)
+    )
+    table = MatchCandidate.__table__
+    with stats.stage('load_counts'):
+        clients = db.session.query(func.count(Preferences.id)).join(Client, Client.id == Preferences.client_id) \
+            .filter(Client.company_id == company_id).scalar()
+        grounds = db.session.query(func.count(Ground.id)).scalar()
+    if replace:
+        with stats.stage('clear_previous'):
+            db.session.execute(table.delete().where(table.c.company_id == company_id))
+    with stats.stage('scoring'):
+        result = db.session.execute(
+            insert(table).from_select(
+                ['run_id', 'company_id', 'client_id', 'ground_id',
+                 'budget_score', 'm2_score', 'location_score', 'type_score'],
+                pairs,
+            )
+        )
+    with stats.stage('commit'):
+        db.session.commit()
+    stats.count(clients=clients, grounds=grounds, pairs=clients * grounds, candidates=result.rowcount)
+    return run_id, result.rowcount
+
+
+def load_candidates(run_id, company_id):
+    """Return the candidates of a run as score dicts (same shape as the Python engine)"""
+    table = MatchCandidate.__table__
+    rows = db.session.execute(
+        select(table.c.client_id, table.c.ground_id, table.c.budget_score, table.c.m2_score,
+               table.c.location_score, table.c.type_score)
+        .where(table.c.run_id == run_id, table.c.company_id == company_id)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def clear_candidates(company_id, run_id=None):
+    """Remove the pending candidates of a company (only those of run_id when given)"""
+    table = MatchCandidate.__table__
+    condition = table.c.company_id == company_id
+    if run_id is not None:
+        condition = and_(condition, table.c.run_id == run_id)
+    db.session.execute(table.delete().where(condition))
+    db.session.commit()
+
+
+SCORE_FIELDS = ('budget_score', 'm2_score', 'location_score', 'type_score')
+
+
+def check_parity(company_id):
+    """Run both engines for a company and return a list of differences (empty when identical).
+    The candidates written by the SQL run are removed again; a pending run of the company is left alone.
+    """
+    from .matching import compute_company_matches
+
+    expected = {(m['client_id'], m['ground_id']): m for m in compute_company_matches(company_id)}
+    run_id, _ = run_sql_matching(company_id, replace=False)
+    try:
+        actual = {(m['client_id'], m['ground_id']): m for m in load_candidates(run_id, company_id)}
+    finally:
+        clear_candidates(company_id, run_id)
+
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        if key not in actual:
+            differences.append(f'{key}: missing from SQL engine')
+        elif key not in expected:
+            differences.append(f'{key}: only produced by SQL engine')
+        else:
+            for field in SCORE_FIELDS:
+                if float(expected[key][field]) != float(actual[key][field]):
+                    differences.append(f'{key} {field}: python={expected[key][field]} sql={actual[key][field]}')
+    return differences
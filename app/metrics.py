@@ -0,0 +1,236 @@
+"""
+Per-request performance metrics
+Wall time, SQL statement count and time, and template render time are recorded per endpoint and
+exposed in the Prometheus text format at /metrics. Slow requests are logged with their queries.
+Metrics live in the process that served the request; with several gunicorn workers each scrape
+reports the worker that answered it (run one exporter per worker or a single-worker scrape port).
+"""
+
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from blinker import Namespace
+from flask import Response, abort, before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+MAX_LOGGED_QUERIES = 100
+MAX_STATEMENT_LENGTH = 500
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with a single 'endpoint' label"""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * len(buckets), 0.0, 0])  # counts, sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series[endpoint]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((endpoint, list(counts), total, count)
+                            for endpoint, (counts, total, count) in self._series.items())
+        for endpoint, counts, total, count in series:
+            label = _escape(endpoint)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{endpoint="{label}"}} {total:.6f}')
+            lines.append(f'{self.name}_count{{endpoint="{label}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Prometheus counter labelled by endpoint and HTTP status"""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, endpoint, status):
+        with self._lock:
+            self._values[(endpoint, status)] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for (endpoint, status), value in values:
+            lines.append(f'{self.name}{{endpoint="{_escape(endpoint)}",status="{status}"}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUESTS = Counter('groundmatch_requests_total', 'Requests served, by endpoint and status')
+REQUEST_SECONDS = Histogram('groundmatch_request_duration_seconds', 'Wall time per request', SECONDS_BUCKETS)
+SQL_QUERIES = Histogram('groundmatch_request_sql_queries', 'SQL statements executed per request', QUERY_COUNT_BUCKETS)
+SQL_SECONDS = Histogram('groundmatch_request_sql_seconds', 'Time spent in SQL statements per request', SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram('groundmatch_request_template_seconds', 'Time spent rendering templates per request',
+                             SECONDS_BUCKETS)
+METRICS = (REQUESTS, REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, TEMPLATE_SECONDS)
+
+# Sent with endpoint=, budget= and stats= when a view runs more SQL statements than it declared
+query_budget_exceeded = Namespace().signal('query-budget-exceeded')
+
+
+class RequestStats:
+    """What one request spent its time on; kept on flask.g while the request runs"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.queries = []  # (seconds, statement), the first MAX_LOGGED_QUERIES only
+        self.template_seconds = 0.0
+        self._template_starts = []
+
+
+def current_stats():
+    """RequestStats of the request being served on this thread, or None"""
+    if not has_app_context():
+        return None
+    return g.get('request_stats')
+
+
+def query_budget(max_queries):
+    """Declare the most SQL statements a view may run, independent of how many rows it shows.
+    Place it under @app.route; requests over budget are logged and sent on query_budget_exceeded
+    (the tests/query_budget_plugin.py fixtures turn that into a test failure).
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+# ============================================================================
+# SQL AND TEMPLATE HOOKS
+# ============================================================================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = current_stats()
+    if stats is None:
+        return
+    stats.query_count += 1
+    stats.sql_seconds += elapsed
+    if len(stats.queries) < MAX_LOGGED_QUERIES:
+        stats.queries.append((elapsed, ' '.join(statement.split())[:MAX_STATEMENT_LENGTH]))
+
+
+def _before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats._template_starts.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats._template_starts:
+        started = stats._template_starts.pop()
+        # Only the outermost render counts, templates rendered inside it are part of its time
+        if not stats._template_starts:
+            stats.template_seconds += time.perf_counter() - started
+
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def log_slow_request(endpoint, stats, elapsed):
+    queries = '\n'.join(f'  {seconds * 1000:8.1f} ms  {statement}' for seconds, statement in stats.queries)
+    more = stats.query_count - len(stats.queries)
+    if more > 0:
+        queries += f'\n  ... {more} more'
+    logger.warning('Slow request %s %s (%s): %.3fs, %d queries in %.3fs, templates %.3fs\n%s',
+                   request.method, request.path, endpoint, elapsed, stats.query_count,
+                   stats.sql_seconds, stats.template_seconds, queries)
+
+
+def init_metrics(app):
+    """Record every request (METRICS_ENABLED) and serve them at /metrics to holders of METRICS_TOKEN.
+    Requests slower than SLOW_REQUEST_SECONDS are logged with their SQL statements.
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def _start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def _record_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.start
+        endpoint = request.url_rule.endpoint if request.url_rule else '<unmatched>'
+        REQUESTS.inc(endpoint, response.status_code)
+        REQUEST_SECONDS.observe(endpoint, elapsed)
+        SQL_QUERIES.observe(endpoint, stats.query_count)
+        SQL_SECONDS.observe(endpoint, stats.sql_seconds)
+        TEMPLATE_SECONDS.observe(endpoint, stats.template_seconds)
+        slow = app.config.get('SLOW_REQUEST_SECONDS')
+        if slow and elapsed >= slow:
+            log_slow_request(endpoint, stats, elapsed)
+        budget = getattr(app.view_functions.get(endpoint), 'query_budget', None)
+        if budget is not None and stats.query_count > budget:
+            logger.warning('%s ran %d SQL statements, over its budget of %d',
+                           endpoint, stats.query_count, budget)
+            query_budget_exceeded.send(app, endpoint=endpoint, budget=budget, stats=stats)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint; 404 without a METRICS_TOKEN, 401 without the right bearer token"""
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        sent = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode()):
+            abort(401)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -1,8 +1,22 @@
+import sqlite3
 from datetime import datetime
 from flask_login import UserMixin
-from sqlalchemy import func, Numeric, CheckConstraint, Enum
+from sqlalchemy import event, func, inspect, Numeric, CheckConstraint, Enum
+from sqlalchemy.engine import Engine
 
 from . import db
+from . import geo
+from .locations import resolve_location
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_conn, _record):
+    """SQLite only honours ON DELETE CASCADE with foreign keys switched on; the relationships with
+    passive_deletes below leave deleting matches and preferences to the database."""
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        cursor.execute('PRAGMA foreign_keys = ON')
+        cursor.close()
 
 
 # ---------- Company ----------
@@ -31,10 +45,15 @@ class Client(db.Model):
     email = db.Column(db.String(320), nullable=False)
     location = db.Column(db.String(200), nullable=False)  # city
     address = db.Column(db.String(300), nullable=False)   # street + number
+    location_id = db.Column(db.Integer)  # canonical municipality, see locations.py
+    lat = db.Column(db.Float)  # derived from location (bundled postcode table)
+    lng = db.Column(db.Float)
 
     company = db.relationship("Company", back_populates="clients")
-    preferences = db.relationship("Preferences", back_populates="client", uselist=False, cascade="all, delete-orphan")
-    matches = db.relationship("Match", back_populates="client", cascade="all, delete-orphan")
+    # passive_deletes: ON DELETE CASCADE removes these rows, they are not loaded just to be deleted
+    preferences = db.relationship("Preferences", back_populates="client", uselist=False, cascade="all, delete-orphan",
+                                  passive_deletes=True)
+    matches = db.relationship("Match", back_populates="client", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<Client {self.id} {self.name}>"
@@ -58,8 +77,11 @@ class Ground(db.Model):
     owner = db.Column(db.String(200), nullable=False) #owner of the ground
     provider = db.Column(db.String(200), nullable=False)   # company name that added this ground
     image_url = db.Column(db.Text, nullable=False)  # uploaded or scraped image path/url
+    location_id = db.Column(db.Integer, index=True)  # canonical municipality, see locations.py
+    lat = db.Column(db.Float)  # from the scraper feed, or derived from location
+    lng = db.Column(db.Float)
 
-    matches = db.relationship("Match", back_populates="ground", cascade="all, delete-orphan")
+    matches = db.relationship("Match", back_populates="ground", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<Ground {self.id} {self.location} ({self.m2} m2)>"
@@ -82,6 +104,9 @@ class Preferences(db.Model):
     max_m2 = db.Column(db.Integer, nullable=False)
     min_budget = db.Column(db.Numeric(12, 2), nullable=False)
     max_budget = db.Column(db.Numeric(12, 2), nullable=False)
+    location_id = db.Column(db.Integer)  # canonical municipality, see locations.py
+    lat = db.Column(db.Float)  # derived from location (bundled postcode table)
+    lng = db.Column(db.Float)
 
     client = db.relationship("Client", back_populates="preferences")
 
@@ -114,4 +139,66 @@ class Match(db.Model):
     ground = db.relationship("Ground", back_populates="matches")
 
     def __repr__(self):
-        return f"<Match {self.id} client={self.client_id} ground={self.ground_id}>"
\ No newline at end of file
+        return f"<Match {self.id} client={self.client_id} ground={self.ground_id}>"
+
+
+# ---------- MatchCandidate (scores computed by a match run, awaiting review) ----------
+class MatchCandidate(db.Model):
+    __tablename__ = "match_candidate"
+    __table_args__ = {"schema": "public"}
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(36), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("public.company.id", ondelete="CASCADE"), nullable=False, index=True)
+    client_id = db.Column(db.Integer, db.ForeignKey("public.client.id", ondelete="CASCADE"), nullable=False)
+    ground_id = db.Column(db.Integer, db.ForeignKey("public.ground.id", ondelete="CASCADE"), nullable=False)
+
+    m2_score = db.Column(db.Float, nullable=False)
+    budget_score = db.Column(db.Float, nullable=False)
+    location_score = db.Column(db.Float, nullable=False)
+    type_score = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<MatchCandidate run={self.run_id} client={self.client_id} ground={self.ground_id}>"
+
+
+# ---------- MatchRunStats (per-stage telemetry of one match run, see run_stats.py) ----------
+class MatchRunStats(db.Model):
+    __tablename__ = "match_run_stats"
+    __table_args__ = {"schema": "public"}
+
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("public.company.id", ondelete="CASCADE"), nullable=False, index=True)
+    engine = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    total_ms = db.Column(db.Float, nullable=False)
+    clients = db.Column(db.Integer)     # clients with preferences
+    grounds = db.Column(db.Integer)
+    pairs = db.Column(db.BigInteger)    # client x ground pairs considered
+    candidates = db.Column(db.Integer)  # pairs kept for review
+    stages = db.Column(db.JSON, nullable=False)  # stage -> milliseconds, in run order
+    extra = db.Column(db.JSON)  # other counts (approved pairs, parallel workers and top_k)
+
+    def __repr__(self):
+        return f"<MatchRunStats {self.id} company={self.company_id} {self.engine} {self.total_ms:.0f}ms>"
+
+
+# ---------- Derived location fields ----------
+def _geocode_location(mapper, connection, target):
+    """Resolve the location text to a municipality id once, at write time, and fill
+    lat/lng unless coordinates were given explicitly."""
+    state = inspect(target)
+    coords_given = state.attrs.lat.history.has_changes() or state.attrs.lng.history.has_changes()
+    location_changed = state.attrs.location.history.has_changes()
+    if target.location_id is None or location_changed:
+        target.location_id = resolve_location(target.location)
+    if target.lat is None or target.lng is None or (location_changed and not coords_given):
+        coords = geo.geocode(target.location)
+        target.lat, target.lng = coords if coords else (None, None)
+
+
+for _model in (Client, Ground, Preferences):
+    event.listen(_model, "before_insert", _geocode_location)
+    event.listen(_model, "before_update", _geocode_location)
@@ -0,0 +1,198 @@
+"""
+Reverse index from grounds to interested clients
+Answers "which clients match this ground" without scoring every preference
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import event
+
+from .invalidation import subscribe
+from .models import db, Client, Preferences
+
+INF = float('inf')
+
+
+def normalize_location(value):
+    """Lower-case, trimmed location text ('' when missing)"""
+    return (value or '').strip().lower()
+
+
+def location_keys(value, location_id=None):
+    """Keys a ground location is looked up under: its municipality id, the full text and each word.
+    A preference for 'gent' therefore finds grounds in 'Gent' and 'Sint-Martens-Latem Gent'.
+    """
+    keys = {location_id} if location_id is not None else set()
+    loc = normalize_location(value)
+    if not loc:
+        return keys
+    words = loc.replace('-', ' ').replace(',', ' ').replace('/', ' ').split()
+    return keys | {loc, *[w for w in words if not w.isdigit()]}
+
+
+def preference_location_key(location, location_id=None):
+    """Bucket key of a preference location: the municipality id when resolved, the text otherwise"""
+    return location_id if location_id is not None else normalize_location(location)
+
+
+def _as_range(low, high):
+    """Preference range as floats; unset (or zero) bounds mean 'any', like compute_match_scores"""
+    if not low or not high:
+        return -INF, INF
+    return float(low), float(high)
+
+
+# ============================================================================
+# INTERVAL TREE
+# ============================================================================
+
+class IntervalTree:
+    """Static centered interval tree answering stabbing queries ("which intervals contain x").
+
+    Each node keeps the intervals that cross its center twice: sorted by lower
+    bound and by upper bound, so a query only bisects and slices per level.
+    """
+
+    __slots__ = ('center', 'lo_keys', 'lo_ids', 'hi_keys', 'hi_ids', 'left', 'right')
+
+    def __init__(self, intervals):
+        """intervals: list of (low, high, item_id) with low <= high"""
+        points = sorted(p for lo, hi, _ in intervals for p in (lo, hi) if p not in (-INF, INF))
+        self.center = points[len(points) // 2] if points else 0.0
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        by_lo = sorted(here, key=lambda i: i[0])
+        by_hi = sorted(here, key=lambda i: i[1])
+        self.lo_keys = [i[0] for i in by_lo]
+        self.lo_ids = [i[2] for i in by_lo]
+        self.hi_keys = [i[1] for i in by_hi]
+        self.hi_ids = [i[2] for i in by_hi]
+        # The center is an endpoint of some interval, so both sides are strictly smaller
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, x):
+        """Return the set of item ids whose interval contains x"""
+        found = set()
+        node = self
+        while node is not None:
+            if x < node.center:
+                found.update(node.lo_ids[:bisect_right(node.lo_keys, x)])
+                node = node.left
+            elif x > node.center:
+                found.update(node.hi_ids[bisect_left(node.hi_keys, x):])
+                node = node.right
+            else:
+                found.update(node.lo_ids)
+                break
+        return found
+
+
+# ============================================================================
+# PREFERENCE INDEX
+# ============================================================================
+
+class PreferenceIndex:
+    """Preferences bucketed by (subdivision type, location) with budget and m2 interval trees.
+
+    A ground matches a preference when its budget and m2 fall inside the
+    preference ranges, the types are equal and the preference location is the
+    ground municipality (or, for unresolved locations, the ground location text
+    or one of its words). Unset preference fields match anything.
+    """
+
+    def __init__(self, rows):
+        """rows: iterable of (client_id, company_id, location, location_id, subdivision_type,
+        min_m2, max_m2, min_budget, max_budget)"""
+        buckets = {}
+        self.company_of = {}
+        for (client_id, company_id, location, location_id, subdivision_type,
+             min_m2, max_m2, min_budget, max_budget) in rows:
+            key = ((subdivision_type or '').strip().lower(), preference_location_key(location, location_id))
+            budget_range = _as_range(min_budget, max_budget)
+            m2_range = _as_range(min_m2, max_m2)
+            bucket = buckets.setdefault(key, ([], []))
+            bucket[0].append((*budget_range, client_id))
+            bucket[1].append((*m2_range, client_id))
+            self.company_of[client_id] = company_id
+        self.buckets = {key: (IntervalTree(b), IntervalTree(m)) for key, (b, m) in buckets.items()}
+
+    def __len__(self):
+        return len(self.company_of)
+
+    def match(self, ground, company_id=None):
+        """Return the sorted client ids whose preferences fully match ground"""
+        try:
+            budget = float(ground.budget)
+            m2 = float(ground.m2)
+        except (TypeError, ValueError):
+            return []
+        ground_type = (ground.subdivision_type or '').strip().lower()
+        types = {ground_type, ''}
+        locations = location_keys(ground.location, getattr(ground, 'location_id', None)) | {''}
+
+        matched = set()
+        for t in types:
+            for loc in locations:
+                trees = self.buckets.get((t, loc))
+                if trees is None:
+                    continue
+                budget_hits = trees[0].stab(budget)
+                if budget_hits:
+                    matched |= budget_hits & trees[1].stab(m2)
+
+        if company_id is not None:
+            matched = {c for c in matched if self.company_of.get(c) == company_id}
+        return sorted(matched)
+
+
+# ============================================================================
+# SHARED INSTANCE - rebuilt lazily after preference changes
+# ============================================================================
+
+_lock = threading.Lock()
+_index = None
+_dirty = True
+
+
+def invalidate(*_args, **_kwargs):
+    """Mark the shared index stale; the next lookup rebuilds it"""
+    global _dirty
+    _dirty = True
+
+
+def get_preference_index():
+    """Return the shared PreferenceIndex, rebuilding it from the database if stale"""
+    global _index, _dirty
+    if _index is not None and not _dirty:
+        return _index
+    with _lock:
+        if _index is None or _dirty:
+            _dirty = False
+            rows = db.session.query(
+                Preferences.client_id, Client.company_id, Preferences.location, Preferences.location_id,
+                Preferences.subdivision_type,
+                Preferences.min_m2, Preferences.max_m2, Preferences.min_budget, Preferences.max_budget,
+            ).join(Client, Client.id == Preferences.client_id).all()
+            _index = PreferenceIndex(rows)
+    return _index
+
+
+def interested_clients(ground, company_id=None):
+    """Client ids (optionally of one company) whose preferences match ground"""
+    return get_preference_index().match(ground, company_id)
+
+
+# Any write to a preference (or its client) makes the index stale: ORM events cover this
+# process immediately, the invalidation bus covers the other workers
+for _model in (Preferences, Client):
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, invalidate)
+subscribe(('preferences', 'client'), invalidate)
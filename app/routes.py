@@ -1,21 +1,40 @@
-from flask import render_template, request, redirect, url_for, flash, session, Response, send_file
+from flask import render_template, request, redirect, url_for, flash, session, Response, send_file, current_app, g
+import hashlib
+import mimetypes
 import os
-import uuid
-from functools import wraps
-from sqlalchemy.orm import joinedload
-from datetime import datetime
+from functools import lru_cache, wraps
+from markupsafe import escape
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from dotenv import load_dotenv
 
 # Load environment variables before reading them
 load_dotenv()
 
-try:
-    from supabase import create_client
-except Exception:
-    create_client = None
-
 from .models import db, Company, Client, Ground, Preferences, Match
-from .matching import compute_match_scores
+from .matching import compute_company_matches
+from .matching_parallel import compute_company_matches_parallel
+from .matching_sql import clear_candidates, load_candidates, run_sql_matching
+from .importer import FORMATS, detect_format, import_file
+from .images import (
+    GROUND_IMAGES,
+    IMAGE_SIZES,
+    VARIANT_MIMETYPE,
+    fetch_ground_images,
+    ground_image_name,
+    save_local_variants,
+    variant_url,
+)
+from .cache import FragmentCache, TTLCache
+from .geo import DEFAULT_RADIUS_KM, geocode, grounds_within
+from .invalidation import record_bulk_write, subscribe
+from .locations import resolve_location
+from .metrics import query_budget
+from .preference_index import interested_clients
+from .run_stats import RunStats, recent_runs, record_run
+from .snapshot import current_snapshot
+from .storage import StorageError, get_storage
+from .uploads import UploadError, discard_spooled, queue_image_upload, spool_upload
 from .helpers import (
     get_subdivision_types,
     get_subdivision_types_display,
@@ -25,23 +44,6 @@ from .helpers import (
     get_match_score
 )
 
-# ============================================================================
-# CONFIGURATION
-# ============================================================================
-
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_ANON_KEY')
-SUPABASE_BUCKET = os.getenv('SUPABASE_GROUND_BUCKET', 'ground-images')
-
-# ============================================================================
-# UTILITY FUNCTIONS
-# ============================================================================
-
-def allowed_file(filename):
-    """Check if uploaded file has allowed extension"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 # ============================================================================
 # DECORATORS - Access control
 # ============================================================================
@@ -82,42 +84,97 @@ def check_client_ownership(client):
     """Check if current company owns the client. Returns True if authorized."""
     return client.company_id == session['company_id']
 
-def _supabase_upload(file_storage):
-    """Upload a werkzeug FileStorage to Supabase Storage and return public URL, or None on failure."""
-    if not create_client:
-        flash('Image upload failed: Supabase client not available. Install with: pip install supabase', 'warning')
+def limit_request_body(config_key):
+    """Cap the request body of an upload route at app.config[config_key] (plus room for the other form fields).
+    Routes without it are not limited."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            request.max_content_length = current_app.config[config_key] + 1024 * 1024
+            # Parse the form here, so an oversized body is answered with 413 before the view runs
+            request.form
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+# Image upload routes; the bulk import has a cap of its own (MAX_IMPORT_BYTES)
+limit_upload_size = limit_request_body('MAX_UPLOAD_BYTES')
+
+def spool_photo_upload():
+    """Validate the uploaded photo from request.files and spool it to disk.
+    Returns the spooled upload for store_photo_upload, or None (no photo, or invalid: flashed).
+    The file type is checked by sniffing its content, not by its extension.
+    """
+    file = request.files.get('photo')
+    if not file or not file.filename:
         return None
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        flash('Image upload failed: SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY not set in .env', 'warning')
+    try:
+        return spool_upload(file, current_app.config['MAX_UPLOAD_BYTES'])
+    except UploadError as e:
+        flash(f'Image upload failed: {str(e)}', 'warning')
         return None
+
+def image_storage():
+    """The app's upload backend, built once (a remote backend holds its client)"""
+    storage = current_app.extensions.get('image_storage')
+    if storage is None:
+        storage = current_app.extensions['image_storage'] = get_storage(current_app.config)
+    return storage
+
+def store_photo_upload(spooled, ground_id):
+    """Store a spooled photo (in the background unless IMAGE_UPLOAD_ASYNC is off) and point the ground at it
+    once the upload succeeded. Until then the ground keeps its previous image or the placeholder."""
+    app = current_app._get_current_object()
+
+    def on_stored(url):
+        with app.app_context():
+            ground = db.session.get(Ground, ground_id)
+            if ground is not None:
+                ground.image_url = url
+                db.session.commit()
+
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        ext = file_storage.filename.rsplit('.', 1)[1].lower()
-        ts = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        object_name = f"ground_{uuid.uuid4()}_{ts}.{ext}"
-        # Read bytes
-        data = file_storage.read()
-        # Reset pointer (in case reused)
-        file_storage.stream.seek(0)
-        # Upload
-        result = supabase.storage.from_(SUPABASE_BUCKET).upload(object_name, data, file_options={"contentType": f"image/{ext}"})
-        public_url = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(object_name)
-        flash(f'Image uploaded successfully to {SUPABASE_BUCKET}', 'success')
-        return public_url
+        storage = image_storage()
+        queue_image_upload(spooled, storage, on_stored, run_async=app.config['IMAGE_UPLOAD_ASYNC'])
+        flash(f'Image received; uploading to {storage.name} storage', 'success')
+    except (UploadError, StorageError) as e:
+        discard_spooled(spooled[0])
+        flash(f'Image upload failed: {str(e)}', 'warning')
     except Exception as e:
+        discard_spooled(spooled[0])
         flash(f'Image upload failed: {str(e)}', 'danger')
-        return None
 
-def handle_photo_upload():
-    """Handle photo upload from request.files. Returns a public URL or None. Never generates random images."""
-    if 'photo' not in request.files:
-        return None
-    file = request.files['photo']
-    if not file or not file.filename or not allowed_file(file.filename):
-        return None
-    # Try Supabase first
-    url = _supabase_upload(file)
-    return url
+@lru_cache(maxsize=2048)
+def render_placeholder_svg(ground_id, location, m2, budget):
+    """Return (svg, etag) for a ground placeholder image.
+    Memoized on the ground id plus every field shown, so edits produce a new entry.
+    """
+    # Safe text values
+    location = escape(location or 'Unknown')
+    try:
+        m2 = int(m2) if m2 is not None else None
+    except Exception:
+        m2 = None
+    try:
+        budget_val = float(budget) if budget is not None else None
+    except Exception:
+        budget_val = None
+
+    budget_text = f"€{budget_val:,.0f}" if budget_val is not None else ''
+    m2_text = f"{m2} m²" if m2 is not None else ''
+
+    # Simple SVG composition
+    svg = f'''<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="800" height="400" viewBox="0 0 800 400">
+  <rect width="100%" height="100%" fill="#f6fbf8" />
+  <rect x="24" y="24" width="752" height="352" rx="10" ry="10" fill="#ffffff" stroke="#e6f3ed"/>
+  <text x="50%" y="45%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="28" fill="#193127">{location}</text>
+  <text x="50%" y="60%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="20" fill="#1f6f4a">{m2_text} {('•' if m2_text and budget_text else '')} {budget_text}</text>
+  <text x="50%" y="85%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="14" fill="#6b7a71">Provided by local preview</text>
+</svg>
+'''
+    etag = hashlib.sha1(svg.encode('utf-8')).hexdigest()
+    return svg, etag
 
 def get_sorted_matches(matches):
     """Sort matches with approved first, then by score (highest first)."""
@@ -137,17 +194,47 @@ def get_sorted_matches(matches):
 
     return sorted(matches, key=sort_key)
 
+def notify_interested_clients(grounds):
+    """Flash which of the company's clients fully match newly added grounds."""
+    company_id = session.get('company_id')
+    client_ids = set()
+    for ground in grounds:
+        client_ids.update(interested_clients(ground, company_id))
+    if not client_ids:
+        return
+    names = [c.name for c in Client.query.filter(Client.id.in_(client_ids)).order_by(Client.name).all()]
+    flash(f'New plot(s) match the preferences of {len(names)} client(s): {", ".join(names)}. Run matching to review.', 'info')
+
+def get_computed_matches():
+    """Return the matches computed by the last match run (session or match_candidate table)."""
+    run_id = session.get('match_run_id')
+    if run_id:
+        return load_candidates(run_id, session['company_id'])
+    return session.get('computed_matches', [])
+
+def clear_computed_matches():
+    """Forget the matches computed by the last match run."""
+    if session.pop('match_run_id', None):
+        clear_candidates(session['company_id'])
+    session.pop('computed_matches', None)
+
 def get_user_company_name():
     """Get current user's company name if they're a company user."""
     if session.get('role') != 'company':
         return None
     company = Company.query.get(session['company_id'])
+    # Held for the rest of the request, so the template context's lookup of the same company
+    # comes from the session's (weakly referencing) identity map instead of another query
+    g.user_company = company
     return company.name if company else None
 
 def apply_ground_filters(query, filters):
     """Apply search filters to ground query."""
     if filters.get('location'):
-        query = query.filter(Ground.location.ilike(f"%{filters['location']}%"))
+        location_id = resolve_location(filters['location'])
+        text_match = Ground.location.ilike(f"%{filters['location']}%")
+        # A known place also finds grounds listed under another name of the same municipality
+        query = query.filter(db.or_(Ground.location_id == location_id, text_match) if location_id else text_match)
     if filters.get('min_price'):
         query = query.filter(Ground.budget >= float(filters['min_price']))
     if filters.get('max_price'):
@@ -158,66 +245,103 @@ def apply_ground_filters(query, filters):
         query = query.filter(Ground.m2 <= int(filters['max_m2']))
     if filters.get('subdivision_type'):
         query = query.filter(Ground.subdivision_type.ilike(f"%{filters['subdivision_type']}%"))
+    if filters.get('near'):
+        # Radius search through the in-memory grid index instead of a distance scan in SQL
+        ids = grounds_within(filters['near'], float(filters.get('radius_km') or DEFAULT_RADIUS_KM))
+        if ids is not None:  # unknown places are reported by the view and ignored here
+            query = query.filter(Ground.id.in_(ids))
     return query
 
-def download_ground_image(plot_data, ground_id):
-    """Download image for a ground from scraped plot data. Returns True if successful.
-    Gracefully no-ops if optional deps (requests, bs4) are unavailable.
+def ground_filters_key(filters):
+    """Hashable, normalized form of the grounds_list filters (case and number formatting ignored)."""
+    key = []
+    for name in sorted(filters):
+        value = (filters[name] or '').strip()
+        if name in ('min_price', 'max_price', 'min_m2', 'max_m2', 'radius_km') and value:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        elif isinstance(value, str):
+            value = value.lower()
+        key.append((name, value))
+    return tuple(key)
+
+def existing_ground_ids():
+    """Ids of all grounds, so image failures of deleted grounds can be dropped"""
+    return {ground_id for (ground_id,) in db.session.query(Ground.id)}
+
+def flash_retried_images(retried):
+    """Report retried image downloads separately from the current job"""
+    saved, failed = retried
+    if saved or failed:
+        flash(f'Retried earlier image failures: {saved} recovered, {failed} still failing', 'info')
+
+def bulk_delete(model, ids):
+    """Delete the rows with these ids in one statement; ON DELETE CASCADE removes their matches (and preferences).
+    The statement skips the ORM events, so the deletes are queued for the invalidation bus here. Returns the count.
     """
-    try:
-        import requests
-        from urllib.parse import urlparse
-        from bs4 import BeautifulSoup
-    except Exception:
-        return False
-    
-    img_url = plot_data.get('image_url') or plot_data.get('detail_url')
-    if not img_url:
-        return False
-    
-    # If placeholder image, try to get real image from detail page
-    if 'pixel' in img_url and plot_data.get('detail_url'):
-        try:
-            resp = requests.get(plot_data['detail_url'], timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            candidates = [img.get('src') for img in soup.find_all('img') if img.get('src')]
-            for c in candidates:
-                if c.startswith('http') and ('.jpg' in c or '.png' in c):
-                    img_url = c
-                    break
-        except:
-            pass
-    
-    try:
-        resp = requests.get(img_url, timeout=15)
-        resp.raise_for_status()
-        base_dir = os.path.join(os.path.dirname(__file__), 'static', 'images', 'grounds')
-        os.makedirs(base_dir, exist_ok=True)
-        out_path = os.path.join(base_dir, f"{ground_id}.jpg")
-        with open(out_path, 'wb') as f:
-            f.write(resp.content)
-        return True
-    except:
-        return False
+    if not ids:
+        return 0
+    deleted = model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+    record_bulk_write(db.session, model.__tablename__, 'DELETE', ids)
+    return deleted
+
+def pagination_links(endpoint, page, pages):
+    """Page number, page count and prev/next URLs (keeping the other query args) for _pagination.html."""
+    args = request.args.to_dict()
+    return {
+        'page': page,
+        'pages': pages,
+        'prev_url': url_for(endpoint, **dict(args, page=page - 1)) if page > 1 else None,
+        'next_url': url_for(endpoint, **dict(args, page=page + 1)) if page < pages else None,
+    }
+
+def page_bounds(total, per_page):
+    """(page, pages) for the requested ?page=, clamped to the available pages."""
+    pages = max(1, -(-total // per_page))
+    return min(max(request.args.get('page', 1, type=int), 1), pages), pages
 
 def init_routes(app):
     """Initialize all application routes"""
+
+    # Ordered ground ids per (user scope, filters) for grounds_list; any ground write clears it
+    grounds_result_cache = TTLCache(app.config['GROUNDS_CACHE_SIZE'], app.config['GROUNDS_CACHE_TTL'])
+    subscribe('ground', grounds_result_cache.clear)
+
+    # Rendered landing page for anonymous visitors; it lists grounds, so ground writes clear it too
+    home_page_cache = TTLCache(1, app.config['HOME_PAGE_CACHE_TTL'])
+    subscribe('ground', home_page_cache.clear)
+
+    # (location, m2, budget, image_url) per ground id for ground_image (False: no such ground)
+    ground_image_rows = FragmentCache(app.config['GROUND_IMAGE_CACHE_SIZE'], app.config['GROUND_IMAGE_CACHE_TTL'])
+    subscribe('ground', ground_image_rows.invalidate)
     
     # ========================================================================
     # PUBLIC ROUTES - Accessible to all users
     # ========================================================================
     
     @app.route('/')
+    @query_budget(2)
     def home():
         """Landing page showing available building plots"""
+        # Anonymous visitors all see the same page, unless a flash message is waiting to be shown
+        cacheable = not session.get('role') and not session.get('_flashes')
+        if cacheable:
+            html = home_page_cache.get('home')
+            if html is not None:
+                return html
+
         try:
             # Fetch recent grounds for display (order by id descending for most recent)
             grounds = Ground.query.order_by(Ground.id.desc()).limit(6).all()
         except:
             grounds = []
         
-        return render_template('home.html', grounds=grounds)
+        html = render_template('home.html', grounds=grounds)
+        if cacheable:
+            home_page_cache.set('home', html)
+        return html
     
     # ========================================================================
     # AUTHENTICATION ROUTES - Registration and login
@@ -292,19 +416,25 @@ def init_routes(app):
     # ========================================================================
     
     @app.route('/dashboard')
+    @query_budget(7)
     @requires_company
     def dashboard():
         """Company dashboard showing overview of clients, grounds, and matches"""
         company_id = session['company_id']
         clients = Client.query.filter_by(company_id=company_id).all()
-        grounds = Ground.query.all()
+        # Only the six most recent plots are shown; the total comes from the shared snapshot
+        grounds = Ground.query.order_by(Ground.id.desc()).limit(6).all()
+        snapshot = current_snapshot()
+        ground_count = len(snapshot) if snapshot is not None else Ground.query.count()
         # Get all matches for clients of this company
         matches = Match.query.join(Client).filter(Client.company_id == company_id).all()
         user_company = get_user_company_name()
         return render_template('dashboard.html', 
                              clients=clients, 
                              grounds=grounds, 
+                             ground_count=ground_count, 
                              matches=matches,
+                             match_runs=recent_runs(company_id),
                              user_company=user_company)
     
     # ========================================================================
@@ -312,22 +442,30 @@ def init_routes(app):
     # ========================================================================
     
     @app.route('/client/dashboard')
+    @query_budget(6)
     @requires_client
     def client_dashboard():
-        """Client dashboard showing preferences and approved matches"""
+        """Client dashboard showing preferences and the best approved matches"""
         client = Client.query.get(session['client_id'])
-        matches = [m for m in client.matches if m.status == 'approved']
+        # Only approved matches, best first, with their grounds in one extra query
+        query = Match.query.filter_by(client_id=client.id, status='approved')
+        matches = (query.options(selectinload(Match.ground))
+                   .order_by(Match.total_score.desc(), Match.id)
+                   .limit(app.config['CLIENT_DASHBOARD_MATCHES']).all())
+        total_count = query.count() if len(matches) == app.config['CLIENT_DASHBOARD_MATCHES'] else len(matches)
         
         return render_template('client_dashboard.html',
                              client=client,
                              preferences=client.preferences,
-                             matches=get_sorted_matches(matches))
+                             matches=matches,
+                             total_count=total_count)
     
     # ========================================================================
     # CLIENT CRUD ROUTES - Manage clients
     # ========================================================================
     
     @app.route('/clients')
+    @query_budget(2)
     @requires_company
     def clients_list():
         """List all clients with search filtering"""
@@ -421,32 +559,66 @@ def init_routes(app):
         flash('Client deleted!', 'success')
         return redirect(url_for('clients_list'))
     
+    @app.route('/import', methods=['GET', 'POST'])
+    @requires_company
+    @limit_request_body('MAX_IMPORT_BYTES')
+    def bulk_import():
+        """Import grounds or clients of this company from a CSV / JSON file"""
+        kind = request.values.get('kind', 'grounds')
+        result = None
+        if request.method == 'POST':
+            upload = request.files.get('file')
+            if kind not in ('grounds', 'clients') or not upload or not upload.filename:
+                flash('Choose what to import and a file', 'danger')
+            else:
+                try:
+                    company = Company.query.get(session['company_id'])
+                    result = import_file(db.engine, kind, upload.stream, detect_format(upload.filename), company)
+                    flash(f'{result.imported} {kind} imported, {result.rejected} rows skipped',
+                          'success' if not result.rejected else 'warning')
+                except Exception as e:
+                    flash(f'Import failed: {str(e)}', 'danger')
+        
+        return render_template('import_form.html', kind=kind, result=result, formats=sorted(FORMATS))
+    
+    @app.route('/clients/bulk-delete', methods=['POST'])
+    @requires_company
+    def clients_bulk_delete():
+        """Delete the selected clients of this company in one statement"""
+        requested = set(request.form.getlist('client_ids', type=int))
+        owned = [client_id for (client_id,) in db.session.query(Client.id).filter(
+            Client.id.in_(requested), Client.company_id == session['company_id'])] if requested else []
+        
+        try:
+            deleted = bulk_delete(Client, owned)
+            db.session.commit()
+            flash(f'{deleted} client(s) deleted!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Failed to delete clients: {str(e)}', 'danger')
+        if len(owned) < len(requested):
+            flash(f'{len(requested) - len(owned)} client(s) skipped: not found or not yours', 'warning')
+        return redirect(url_for('clients_list'))
+    
     # ========================================================================
     # GROUND CRUD ROUTES - Manage building plots
     # ========================================================================
     
     @app.route('/grounds')
+    @query_budget(5)
     def grounds_list():
         """List all building plots with filtering (location, price, m2, subdivision_type)"""
         # Collect distinct values for quick-select filters
-        available_locations = [row[0] for row in db.session.query(Ground.location).filter(Ground.location != None).distinct().order_by(Ground.location).all()]
-        available_subdivision_types = [row[0] for row in db.session.query(Ground.subdivision_type).filter(Ground.subdivision_type != None).distinct().order_by(Ground.subdivision_type).all()]
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            # The snapshot's string dictionaries already hold the distinct values
+            available_locations = sorted(snapshot.locations)
+            available_subdivision_types = sorted(snapshot.types)
+        else:
+            available_locations = [row[0] for row in db.session.query(Ground.location).filter(Ground.location != None).distinct().order_by(Ground.location).all()]
+            available_subdivision_types = [row[0] for row in db.session.query(Ground.subdivision_type).filter(Ground.subdivision_type != None).distinct().order_by(Ground.subdivision_type).all()]
         merged_subdivision_types = sorted({t for t in (available_subdivision_types + get_subdivision_types()) if t})
 
-        query = Ground.query
-        
-        # Filter grounds for clients: only their company's grounds + scraped grounds
-        if session.get('role') == 'client':
-            client = Client.query.get(session['client_id'])
-            if client and client.company:
-                query = query.filter(
-                    db.or_(
-                        Ground.provider == client.company.name,
-                        Ground.provider == None,
-                        Ground.provider == ''
-                    )
-                )
-        
         # Apply search filters
         filters = {
             'location': request.args.get('location', ''),
@@ -454,24 +626,58 @@ def init_routes(app):
             'max_price': request.args.get('max_price', ''),
             'min_m2': request.args.get('min_m2', ''),
             'max_m2': request.args.get('max_m2', ''),
-            'subdivision_type': request.args.get('subdivision_type', '')
+            'subdivision_type': request.args.get('subdivision_type', ''),
+            'near': request.args.get('near', ''),
+            'radius_km': request.args.get('radius_km', '')
         }
-        query = apply_ground_filters(query, filters)
-        
-        grounds = query.all()
-
-        # Sort: own company's grounds first, then the rest
+        if filters['near'] and geocode(filters['near']) is None:
+            flash(f"Unknown location '{filters['near']}', radius filter ignored.", 'warning')
         user_company = get_user_company_name()
-        if user_company:
-            try:
-                uc_norm = user_company.strip().lower()
-                grounds = sorted(grounds, key=lambda g: (0 if (getattr(g, 'provider', None) or '').strip().lower() == uc_norm else 1, g.id or 0))
-            except Exception:
-                pass
+
+        # The ordered id list of a search is cached per filter combination and user scope
+        role = session.get('role')
+        scope = (role, session.get('company_id') if role == 'company' else session.get('client_id'))
+        cache_key = (scope, ground_filters_key(filters))
+        ground_ids = grounds_result_cache.get(cache_key)
+        if ground_ids is None:
+            query = db.session.query(Ground.id)
+
+            # Filter grounds for clients: only their company's grounds + scraped grounds
+            if role == 'client':
+                client = Client.query.get(session['client_id'])
+                if client and client.company:
+                    query = query.filter(
+                        db.or_(
+                            Ground.provider == client.company.name,
+                            Ground.provider == None,
+                            Ground.provider == ''
+                        )
+                    )
+
+            query = apply_ground_filters(query, filters)
+
+            # Sort: own company's grounds first, then the rest
+            if user_company:
+                own_first = db.case((db.func.lower(db.func.trim(Ground.provider)) == user_company.strip().lower(), 0), else_=1)
+                query = query.order_by(own_first, Ground.id)
+            else:
+                query = query.order_by(Ground.id)
+            ground_ids = [row[0] for row in query.all()]
+            grounds_result_cache.set(cache_key, ground_ids)
+
+        # Only the visible page is loaded as full Ground objects
+        per_page = app.config['GROUNDS_PER_PAGE']
+        page, pages = page_bounds(len(ground_ids), per_page)
+        page_ids = ground_ids[(page - 1) * per_page:page * per_page]
+        by_id = {g.id: g for g in Ground.query.filter(Ground.id.in_(page_ids)).all()} if page_ids else {}
+        grounds = [by_id[i] for i in page_ids if i in by_id]
+        pagination = pagination_links('grounds_list', page, pages)
 
         return render_template(
             'grounds_list.html',
             grounds=grounds,
+            total_count=len(ground_ids),
+            pagination=pagination,
             user_company=user_company,
             subdivision_types=merged_subdivision_types,
             available_locations=available_locations
@@ -483,48 +689,62 @@ def init_routes(app):
 
         This avoids broken <img> icons when no static JPG is available. The
         SVG includes the location and a small caption with m2 and budget.
+        Pass ?size=thumb or ?size=medium to get a resized WebP variant.
         """
-        ground = Ground.query.get(ground_id)
+        size = request.args.get('size')
+        if size not in IMAGE_SIZES:
+            size = None
+
+        max_age = app.config['IMAGE_CACHE_MAX_AGE']
+
+        # If a real JPG exists in static/images/grounds/<id>.jpg, serve it (or its variant).
+        object_name = ground_image_name(ground_id)
+        if GROUND_IMAGES.exists(object_name):
+            mimetype = 'image/jpeg'
+            if size:
+                variant_name = ground_image_name(ground_id, size)
+                if GROUND_IMAGES.exists(variant_name) or size in save_local_variants(ground_id):
+                    object_name, mimetype = variant_name, VARIANT_MIMETYPE
+            return GROUND_IMAGES.serve(object_name, mimetype=mimetype, max_age=max_age)
+
+        # Only the columns the placeholder needs, cached until the ground changes: a listing page's
+        # conditional requests are answered with 304 without touching the database
+        ground = ground_image_rows.get_or_render(ground_id, lambda: db.session.query(
+            Ground.location, Ground.m2, Ground.budget, Ground.image_url).filter(Ground.id == ground_id).first() or False)
         if not ground:
             # return a 404 transparent SVG
             svg = """<svg xmlns='http://www.w3.org/2000/svg' width='800' height='400'></svg>"""
             return Response(svg, mimetype='image/svg+xml')
-        # If a real JPG exists in static/images/grounds/<id>.jpg, serve it.
-        static_path = os.path.join(os.path.dirname(__file__), 'static', 'images', 'grounds', f"{ground_id}.jpg")
-        if os.path.exists(static_path):
-            return send_file(static_path, mimetype='image/jpeg')
-
-        # Safe text values
-        location = (ground.location or 'Unknown')
-        try:
-            m2 = int(ground.m2) if ground.m2 is not None else None
-        except Exception:
-            m2 = None
-        try:
-            budget_val = float(ground.budget) if ground.budget is not None else None
-        except Exception:
-            budget_val = None
-
-        budget_text = f"€{budget_val:,.0f}" if budget_val is not None else ''
-        m2_text = f"{m2} m²" if m2 is not None else ''
-
-        # Simple SVG composition
-        svg = f'''<?xml version="1.0" encoding="UTF-8"?>
-<svg xmlns="http://www.w3.org/2000/svg" width="800" height="400" viewBox="0 0 800 400">
-  <rect width="100%" height="100%" fill="#f6fbf8" />
-  <rect x="24" y="24" width="752" height="352" rx="10" ry="10" fill="#ffffff" stroke="#e6f3ed"/>
-  <text x="50%" y="45%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="28" fill="#193127">{location}</text>
-  <text x="50%" y="60%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="20" fill="#1f6f4a">{m2_text} {('•' if m2_text and budget_text else '')} {budget_text}</text>
-  <text x="50%" y="85%" text-anchor="middle" font-family="Arial, Helvetica, sans-serif" font-size="14" fill="#6b7a71">Provided by local preview</text>
-</svg>
-'''
+        if ground.image_url:
+            url = variant_url(ground.image_url, size)
+            # Uploads kept on local disk are served directly; remote ones are redirected to without a lookup
+            try:
+                storage = image_storage()
+                stored_name = storage.owns_url(url)
+                path = storage.local_path(stored_name) if stored_name else None
+                if path and os.path.isfile(path):
+                    return storage.serve(stored_name, mimetype=mimetypes.guess_type(stored_name)[0], max_age=max_age)
+            except StorageError:
+                pass
+            response = redirect(url)
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['PLACEHOLDER_CACHE_MAX_AGE']
+            return response
 
-        return Response(svg, mimetype='image/svg+xml')
+        svg, etag = render_placeholder_svg(ground_id, ground.location, ground.m2, ground.budget)
+        response = Response(svg, mimetype='image/svg+xml')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['PLACEHOLDER_CACHE_MAX_AGE']
+        # Turns the response into a 304 when If-None-Match matches
+        return response.make_conditional(request)
     
     @app.route('/grounds/add', methods=['GET', 'POST'])
     @requires_company
+    @limit_upload_size
     def ground_add():
         if request.method == 'POST':
+            photo = None
             try:
                 location = request.form.get('location', '').strip()
                 address = request.form.get('address', '').strip()
@@ -546,8 +766,8 @@ def init_routes(app):
                     flash('Size and budget must be positive', 'danger')
                     return render_template('ground_form.html', ground=None, subdivision_types=get_subdivision_types(), is_edit=False)
                 
-                # Handle image upload
-                image_url = handle_photo_upload()
+                # Validate the photo now; its URL is set once the upload succeeded
+                photo = spool_photo_upload()
                 
                 ground = Ground(
                     location=location,
@@ -557,30 +777,37 @@ def init_routes(app):
                     subdivision_type=subdivision_type,
                     owner=owner,
                     provider=provider,
-                    image_url=image_url
+                    image_url=''
                 )
                 db.session.add(ground)
                 db.session.commit()
+                if photo:
+                    store_photo_upload(photo, ground.id)
                 
                 flash('Ground added!', 'success')
+                notify_interested_clients([ground])
                 return redirect(url_for('grounds_list'))
             except ValueError:
                 flash('Invalid number format', 'danger')
                 return render_template('ground_form.html', ground=None, subdivision_types=get_subdivision_types(), is_edit=False)
             except Exception as e:
                 db.session.rollback()
+                if photo:
+                    discard_spooled(photo[0])
                 flash(f'Failed to add ground: {str(e)}', 'danger')
                 return render_template('ground_form.html', ground=None, subdivision_types=get_subdivision_types(), is_edit=False)
         
         return render_template('ground_form.html', ground=None, subdivision_types=get_subdivision_types(), is_edit=False)
     
     @app.route('/grounds/<int:ground_id>')
+    @query_budget(3)
     def ground_detail(ground_id):
         ground = Ground.query.get_or_404(ground_id)
         return render_template('ground_detail.html', ground=ground, user_company=get_user_company_name())
     
     @app.route('/grounds/<int:ground_id>/edit', methods=['GET', 'POST'])
     @requires_company
+    @limit_upload_size
     def ground_edit(ground_id):
         ground = Ground.query.get_or_404(ground_id)
         
@@ -596,16 +823,18 @@ def init_routes(app):
             ground.subdivision_type = normalize_subdivision_type(request.form.get('subdivision_type')) or ground.subdivision_type
             ground.owner = request.form.get('owner')
             
-            # Handle image upload
-            image_url = handle_photo_upload()
-            if image_url:
-                ground.image_url = image_url
+            # The current photo stays until a new upload succeeded
+            photo = spool_photo_upload()
             
             try:
                 db.session.commit()
+                if photo:
+                    store_photo_upload(photo, ground.id)
                 flash('Ground updated!', 'success')
             except Exception as e:
                 db.session.rollback()
+                if photo:
+                    discard_spooled(photo[0])
                 flash(f'Failed to update ground: {str(e)}', 'danger')
                 return render_template('ground_form.html', ground=ground, subdivision_types=get_subdivision_types(), is_edit=True)
             return redirect(url_for('grounds_list'))
@@ -630,11 +859,34 @@ def init_routes(app):
             flash(f'Failed to delete ground: {str(e)}', 'danger')
         return redirect(url_for('grounds_list'))
     
+    @app.route('/grounds/bulk-delete', methods=['POST'])
+    @requires_company
+    def grounds_bulk_delete():
+        """Delete the selected grounds added by this company in one statement"""
+        requested = set(request.form.getlist('ground_ids', type=int))
+        company = Company.query.get(session['company_id'])
+        owned = [ground_id for (ground_id,) in db.session.query(Ground.id).filter(
+            Ground.id.in_(requested),
+            db.func.lower(db.func.trim(Ground.provider)) == (company.name or '').strip().lower(),
+        )] if requested and company else []
+        
+        try:
+            deleted = bulk_delete(Ground, owned)
+            db.session.commit()
+            flash(f'{deleted} ground(s) deleted!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Failed to delete grounds: {str(e)}', 'danger')
+        if len(owned) < len(requested):
+            flash(f'{len(requested) - len(owned)} ground(s) skipped: you can only delete grounds added by your company', 'warning')
+        return redirect(url_for('grounds_list'))
+    
     # ========================================================================
     # PREFERENCES ROUTES - Manage client search criteria
     # ========================================================================
     
     @app.route('/preferences')
+    @query_budget(3)
     def preferences_list():
         """List all client preferences (company view) or redirect to client preferences"""
         if session.get('role') == 'company':
@@ -653,6 +905,7 @@ def init_routes(app):
         return redirect(url_for('home'))
     
     @app.route('/preferences/<int:client_id>')
+    @query_budget(3)
     @requires_company
     def preferences_view(client_id):
         """View-only preferences for companies. Clients must edit their own preferences."""
@@ -671,6 +924,7 @@ def init_routes(app):
         return render_template('preferences_view.html', client=client, pref=pref, subdivision_types=get_subdivision_types())
     
     @app.route('/client/preferences')
+    @query_budget(3)
     @requires_client
     def client_preferences_view():
         client = Client.query.get(session['client_id'])
@@ -734,6 +988,7 @@ def init_routes(app):
     # ========================================================================
     
     @app.route('/match/review', methods=['GET', 'POST'])
+    @query_budget(5)
     @requires_company
     def match_review():
         """Review and approve computed matches (in-memory); save only approved to DB"""
@@ -742,7 +997,7 @@ def init_routes(app):
             approved_keys = request.form.getlist('approved_matches')
             
             # Retrieve computed matches from session
-            computed = session.get('computed_matches', [])
+            computed = get_computed_matches()
             if not computed:
                 flash('No computed matches in session. Please run matching again.', 'warning')
                 return redirect(url_for('dashboard'))
@@ -750,19 +1005,20 @@ def init_routes(app):
             # Build dict for quick lookup
             match_dict = {f"{m['client_id']}:{m['ground_id']}": m for m in computed}
             
+            approved = [match_dict[key] for key in dict.fromkeys(approved_keys) if key in match_dict]
+            
+            # Pairs already stored, in one query instead of one per approved match
+            stored = {}
+            if approved:
+                stored = {(m.client_id, m.ground_id): m for m in Match.query.filter(
+                    Match.client_id.in_({m['client_id'] for m in approved}),
+                    Match.ground_id.in_({m['ground_id'] for m in approved}))}
+            
             # Save only approved matches to DB
             saved_count = 0
-            for key in approved_keys:
-                match_data = match_dict.get(key)
-                if not match_data:
-                    continue
-                
-                # Check if already exists
-                existing = Match.query.filter_by(
-                    client_id=match_data['client_id'],
-                    ground_id=match_data['ground_id']
-                ).first()
-                
+            new_matches = []
+            for match_data in approved:
+                existing = stored.get((match_data['client_id'], match_data['ground_id']))
                 if existing:
                     # Update to approved if was pending (shouldn't happen now, but safeguard)
                     existing.status = 'approved'
@@ -772,22 +1028,25 @@ def init_routes(app):
                     existing.type_score = match_data['type_score']
                 else:
                     # Insert new approved match
-                    new_match = Match(
-                        client_id=match_data['client_id'],
-                        ground_id=match_data['ground_id'],
-                        budget_score=match_data['budget_score'],
-                        m2_score=match_data['m2_score'],
-                        location_score=match_data['location_score'],
-                        type_score=match_data['type_score'],
-                        status='approved'
-                    )
-                    db.session.add(new_match)
+                    new_matches.append({
+                        'client_id': match_data['client_id'],
+                        'ground_id': match_data['ground_id'],
+                        'budget_score': match_data['budget_score'],
+                        'm2_score': match_data['m2_score'],
+                        'location_score': match_data['location_score'],
+                        'type_score': match_data['type_score'],
+                        'status': 'approved'
+                    })
                 saved_count += 1
             
             try:
+                if new_matches:
+                    # One executemany instead of an INSERT ... RETURNING per match
+                    db.session.execute(insert(Match), new_matches)
+                    record_bulk_write(db.session, Match.__tablename__, 'INSERT', [None])
                 db.session.commit()
                 # Clear session matches
-                session.pop('computed_matches', None)
+                clear_computed_matches()
                 flash(f'{saved_count} matches approved and saved!', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -796,28 +1055,39 @@ def init_routes(app):
             return redirect(url_for('matches_list'))
         
         # GET: Build preview from session-stored computed matches
-        computed = session.get('computed_matches', [])
+        computed = get_computed_matches()
         if not computed:
             flash('No matches to review. Run the matching algorithm first.', 'info')
             return redirect(url_for('dashboard'))
         
-        clients = Client.query.options(
-            joinedload(Client.preferences)
-        ).filter_by(company_id=session['company_id']).all()
+        def total_score(mc):
+            return (mc['budget_score'] + mc['m2_score'] + mc['location_score'] + mc['type_score']) / 4.0
+        
+        # Top 10 per client, best scores first
+        top_computed = {}
+        for mc in computed:
+            top_computed.setdefault(mc['client_id'], []).append(mc)
+        for client_id, client_computed in top_computed.items():
+            top_computed[client_id] = sorted(client_computed, key=total_score, reverse=True)[:10]
+        
+        # Their grounds in one query instead of one lookup per candidate
+        ground_ids = {mc['ground_id'] for client_computed in top_computed.values() for mc in client_computed}
+        grounds = {ground.id: ground for ground in Ground.query.filter(Ground.id.in_(ground_ids))} if ground_ids else {}
+        
+        clients = Client.query.filter_by(company_id=session['company_id']).all()
         client_matches = {}
         
         for client in clients:
-            # Filter computed matches for this client
-            client_computed = [m for m in computed if m['client_id'] == client.id]
+            client_computed = top_computed.get(client.id)
             if not client_computed:
                 continue
             
-            # Build pseudo-Match objects with score for sorting
+            # Build pseudo-Match objects for the template
             pseudo_matches = []
             for mc in client_computed:
-                ground = Ground.query.get(mc['ground_id'])
+                ground = grounds.get(mc['ground_id'])
                 if not ground:
-                    continue
+                    continue  # deleted since the run
                 # Create a dict resembling Match attributes
                 pm = type('obj', (object,), {
                     'client_id': mc['client_id'],
@@ -828,29 +1098,25 @@ def init_routes(app):
                     'm2_score': mc['m2_score'],
                     'location_score': mc['location_score'],
                     'type_score': mc['type_score'],
-                    'total_score': (mc['budget_score'] + mc['m2_score'] + mc['location_score'] + mc['type_score']) / 4.0,
+                    'total_score': total_score(mc),
                     'status': 'computed',  # not in DB yet
                     'match_key': f"{mc['client_id']}:{mc['ground_id']}"
                 })()
                 pseudo_matches.append(pm)
             
-            # Sort and take top 10
-            pseudo_matches = get_sorted_matches(pseudo_matches)[:10]
             if pseudo_matches:
                 client_matches[client] = pseudo_matches
         
         return render_template('match_review.html', client_matches=client_matches, is_preview=True)
     
     @app.route('/matches')
+    @query_budget(7)
     def matches_list():
         client_filter = request.args.get('client_id', '')
         
         if session.get('role') == 'company':
             # Show only approved matches
-            query = Match.query.options(
-                joinedload(Match.client),
-                joinedload(Match.ground)
-            ).join(Client).filter(Client.company_id == session['company_id'], Match.status == 'approved')
+            query = Match.query.join(Client).filter(Client.company_id == session['company_id'], Match.status == 'approved')
             
             if client_filter:
                 # Explicitly filter on Match.client_id to avoid namespace ambiguity
@@ -859,16 +1125,26 @@ def init_routes(app):
             clients = Client.query.filter_by(company_id=session['company_id']).order_by(Client.name).all()
             client = None
         elif session.get('role') == 'client':
-            query = Match.query.options(
-                joinedload(Match.client),
-                joinedload(Match.ground)
-            ).filter_by(client_id=session['client_id'], status='approved')
+            query = Match.query.filter_by(client_id=session['client_id'], status='approved')
             clients = []
             client = Client.query.get(session['client_id'])
         else:
             return redirect(url_for('home'))
-        
-        return render_template('matches_list.html', matches=get_sorted_matches(query.all()), client_filter=client_filter, clients=clients, client=client)
+
+        # Best matches first, ranked and paged in SQL; only the visible page is loaded
+        total_count = query.order_by(None).count()
+        per_page = app.config['MATCHES_PER_PAGE']
+        page, pages = page_bounds(total_count, per_page)
+        matches = (query.options(selectinload(Match.client), selectinload(Match.ground))
+                   .order_by(Match.total_score.desc(), Match.id)
+                   .offset((page - 1) * per_page).limit(per_page).all())
+        # Per-client totals for the group headers (a client's matches may span several pages)
+        client_totals = dict(query.with_entities(Match.client_id, db.func.count(Match.id))
+                             .group_by(Match.client_id).all()) if matches else {}
+
+        return render_template('matches_list.html', matches=matches, client_filter=client_filter, clients=clients, client=client,
+                               total_count=total_count, client_totals=client_totals,
+                               pagination=pagination_links('matches_list', page, pages))
 
     @app.route('/matches/<int:match_id>/delete', methods=['POST'])
     @requires_company
@@ -896,36 +1172,37 @@ def init_routes(app):
     # Note: Status updates are managed via Match Review only; per-match status route removed
     
     @app.route('/match/run', methods=['POST'])
+    @query_budget(6)
     @requires_company
     def match_run():
-        clients = Client.query.filter_by(company_id=session['company_id']).all()
-        grounds = Ground.query.all()
-        
-        # Compute matches in-memory; store in session for review
-        computed_matches = []
-        
-        for client in clients:
-            if not client.preferences:
-                continue
-            
-            for ground in grounds:
-                # Skip if already approved
-                if Match.query.filter_by(client_id=client.id, ground_id=ground.id, status='approved').first():
-                    continue
-                
-                scores = compute_match_scores(ground, client.preferences)
-                computed_matches.append({
-                    'client_id': client.id,
-                    'ground_id': ground.id,
-                    'budget_score': scores['budget_score'],
-                    'm2_score': scores['m2_score'],
-                    'location_score': scores.get('location_score', 0),
-                    'type_score': scores.get('type_score', 0),
-                })
-        
-        # Store computed matches in session
-        session['computed_matches'] = computed_matches
-        flash(f'{len(computed_matches)} potential matches computed. Review and approve below.', 'success')
+        company_id = session['company_id']
+        engine = (request.form.get('engine') or app.config['MATCHING_ENGINE']).strip().lower()
+        stats = RunStats(engine if engine in ('sql', 'parallel') else 'python')
+
+        if engine == 'sql':
+            # Scores are computed and kept in the database; the session only holds the run id
+            run_id, count = run_sql_matching(company_id, stats=stats)
+            session.pop('computed_matches', None)
+            session['match_run_id'] = run_id
+        else:
+            if engine == 'parallel':
+                # Clients are sharded over worker processes; results come back best first
+                computed_matches = compute_company_matches_parallel(
+                    company_id,
+                    workers=app.config['MATCHING_WORKERS'] or None,
+                    top_k=app.config['MATCHING_TOP_K'] or None,
+                    min_clients=app.config['MATCHING_PARALLEL_MIN_CLIENTS'],
+                    stats=stats,
+                )
+            else:
+                # Compute matches in-memory; store in session for review
+                computed_matches = compute_company_matches(company_id, stats=stats)
+            session.pop('match_run_id', None)
+            session['computed_matches'] = computed_matches
+            count = len(computed_matches)
+
+        record_run(company_id, stats)
+        flash(f'{count} potential matches computed. Review and approve below.', 'success')
         return redirect(url_for('match_review'))
     
     @app.route('/scrape', methods=['POST'])
@@ -944,27 +1221,30 @@ def init_routes(app):
             plots = scrape_vansweevelt()
 
             count = 0
+            added = []
             for plot in plots:
                 ground = Ground(
                     location=plot.get('location', 'Unknown'),
                     m2=plot.get('m2', 0),
                     budget=plot.get('budget', 0),
                     subdivision_type=normalize_subdivision_type(plot.get('subdivision_type')) or 'development_plot',
-                    owner='Vansweevelt'
+                    owner='Vansweevelt',
+                    lat=plot.get('lat'),
+                    lng=plot.get('lng')
                 )
                 db.session.add(ground)
+                added.append((plot, ground))
                 count += 1
 
             db.session.commit()
 
-            # Download images for scraped grounds
-            saved = 0
-            for p in plots:
-                q = Ground.query.filter_by(location=p['location'], m2=p['m2'], budget=p['budget']).first()
-                if q and download_ground_image(p, q.id):
-                    saved += 1
+            # Download images for scraped grounds concurrently, then retry earlier failures that are due
+            (saved, _), retried = fetch_ground_images([(p, g.id) for p, g in added],
+                                                      existing_ground_ids=existing_ground_ids())
 
             flash(f'Scraper ran! {count} grounds added. {saved} images downloaded.', 'success')
+            flash_retried_images(retried)
+            notify_interested_clients([g for _, g in added])
         except Exception as e:
             flash(f'Scraper error: {str(e)}', 'danger')
         
@@ -983,8 +1263,7 @@ def init_routes(app):
                 raise ImportError('scraper_vansweevelt not found. Ensure scraper_vansweevelt.py exists and is importable.')
 
             plots = scrape_vansweevelt()
-            saved = 0
-            failed = 0
+            jobs = []
 
             for p in plots:
                 # Match by location + m2 + budget, or fallback to location + m2
@@ -993,12 +1272,13 @@ def init_routes(app):
                     q = Ground.query.filter_by(location=p['location'], m2=p['m2']).first()
                 
                 if q:
-                    if download_ground_image(p, q.id):
-                        saved += 1
-                    else:
-                        failed += 1
+                    jobs.append((p, q.id))
+
+            # Already-cached URLs are only re-linked; earlier failures are retried when due
+            (saved, failed), retried = fetch_ground_images(jobs, existing_ground_ids=existing_ground_ids())
 
             flash(f'Image fetch complete: {saved} saved, {failed} failed', 'success')
+            flash_retried_images(retried)
         except Exception as e:
             flash(f'Failed to fetch images: {str(e)}', 'danger')
 
@@ -0,0 +1,71 @@
+"""
+Per-stage telemetry for match runs
+Engines time their stages (loading clients, grounds and approved pairs, scoring, storing) on a RunStats;
+match_run stores one match_run_stats row per run and logs it, and the company dashboard shows the latest runs.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from .models import db, MatchRunStats
+
+logger = logging.getLogger(__name__)
+
+# Counts that get their own column; everything else goes to MatchRunStats.extra
+COLUMN_COUNTS = ('clients', 'grounds', 'pairs', 'candidates')
+
+
+class RunStats:
+    """Stage timings (ms, in run order) and counts of one match run"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.stages = {}
+        self.counts = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_dict(self):
+        return {'engine': self.engine, 'total_ms': round(self.total_ms, 1),
+                'stages': {name: round(ms, 1) for name, ms in self.stages.items()}, **self.counts}
+
+
+def record_run(company_id, stats):
+    """Store and log the telemetry of a finished run. Never fails the run itself."""
+    logger.info('match run %s', json.dumps({'company_id': company_id, **stats.as_dict()}))
+    try:
+        db.session.add(MatchRunStats(
+            company_id=company_id,
+            engine=stats.engine,
+            total_ms=stats.total_ms,
+            stages={name: round(ms, 1) for name, ms in stats.stages.items()},
+            extra={k: v for k, v in stats.counts.items() if k not in COLUMN_COUNTS} or None,
+            **{k: stats.counts.get(k) for k in COLUMN_COUNTS},
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception('Could not store match run stats for company %s', company_id)
+
+
+def recent_runs(company_id, limit=5):
+    """The company's latest runs, newest first"""
+    return (MatchRunStats.query.filter_by(company_id=company_id)
+            .order_by(MatchRunStats.created_at.desc(), MatchRunStats.id.desc())
+            .limit(limit).all())
@@ -0,0 +1,336 @@
+"""
+Memory-mapped columnar snapshot of the ground catalog
+One process writes the ground table as fixed-width columns to a file; every worker maps it read-only.
+A generation pointer file makes refreshes atomic: readers switch to a new file only once it is complete.
+"""
+
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+
+from flask import current_app
+
+from .geo import invalidate_ground_grid
+from .invalidation import subscribe
+from .models import db, Ground
+from .storage import write_atomic
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are not serialized between processes
+    fcntl = None
+
+MAGIC = b'GMSNAP01'
+HEADER = struct.Struct('<8sQQQ')  # magic, generation, row count, metadata length
+POINTER_FILE = 'CURRENT'
+STALE_FILE = 'STALE'
+LOCK_FILE = 'refresh.lock'
+
+# (column, array typecode). Strings are dictionary-encoded (code -1 = NULL),
+# budgets are stored in cents so they convert back to exact Decimals, NaN marks missing coordinates.
+COLUMNS = (
+    ('id', 'q'),
+    ('budget_cents', 'q'),
+    ('m2', 'q'),
+    ('type_code', 'i'),
+    ('location_code', 'i'),
+    ('location_id', 'i'),
+    ('provider_code', 'i'),
+    ('lat', 'd'),
+    ('lng', 'd'),
+)
+DICTIONARIES = {'type_code': 'types', 'location_code': 'locations', 'provider_code': 'providers'}
+
+# A ground as seen by the matching engines (the attributes compute_match_scores reads)
+GroundRow = namedtuple('GroundRow', 'id budget m2 location location_id lat lng subdivision_type')
+
+
+def _align(offset, boundary=8):
+    return (offset + boundary - 1) // boundary * boundary
+
+
+def snapshot_path(directory, generation):
+    return os.path.join(directory, f'grounds.{generation}.snap')
+
+
+# ============================================================================
+# WRITER
+# ============================================================================
+
+def write_snapshot(directory, rows, generation):
+    """Write rows as snapshot `generation` and point CURRENT at it.
+
+    rows: iterable of (id, budget, m2, subdivision_type, location, location_id, provider, lat, lng)
+    Older generations except the previous one are removed; processes that still
+    map them keep a valid mapping until they switch.
+    """
+    os.makedirs(directory, exist_ok=True)
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    codes = {key: {} for key in DICTIONARIES.values()}
+
+    def encode(table, value):
+        if value is None:
+            return -1
+        return codes[table].setdefault(value, len(codes[table]))
+
+    for ground_id, budget, m2, subdivision_type, location, location_id, provider, lat, lng in rows:
+        columns['id'].append(ground_id)
+        columns['budget_cents'].append(int((Decimal(str(budget or 0)) * 100).to_integral_value()))
+        columns['m2'].append(int(m2 or 0))
+        columns['type_code'].append(encode('types', subdivision_type))
+        columns['location_code'].append(encode('locations', location))
+        columns['location_id'].append(-1 if location_id is None else location_id)
+        columns['provider_code'].append(encode('providers', provider))
+        columns['lat'].append(math.nan if lat is None else float(lat))
+        columns['lng'].append(math.nan if lng is None else float(lng))
+
+    count = len(columns['id'])
+    layout, offset = {}, 0
+    for name, _ in COLUMNS:
+        layout[name] = offset
+        offset = _align(offset + len(columns[name]) * columns[name].itemsize)
+    meta = json.dumps({
+        'columns': layout,
+        **{table: list(values) for table, values in codes.items()},  # insertion order == code
+    }).encode('utf-8')
+
+    path = snapshot_path(directory, generation)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    data_start = _align(HEADER.size + len(meta))
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, generation, count, len(meta)))
+        f.write(meta)
+        for name, _ in COLUMNS:
+            f.seek(data_start + layout[name])
+            columns[name].tofile(f)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    write_atomic(os.path.join(directory, POINTER_FILE), str(generation).encode('ascii'))
+
+    for filename in os.listdir(directory):
+        parts = filename.split('.')
+        if len(parts) == 3 and parts[0] == 'grounds' and parts[2] == 'snap' and parts[1].isdigit():
+            if int(parts[1]) < generation - 1:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError:
+                    pass
+    return path
+
+
+def read_generation(directory):
+    """Generation CURRENT points at, or None when no snapshot was written yet"""
+    try:
+        with open(os.path.join(directory, POINTER_FILE), 'rb') as f:
+            return int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+
+# ============================================================================
+# READER
+# ============================================================================
+
+class GroundSnapshot:
+    """Read-only view over a snapshot file; columns are memoryviews into the mapping (no copies)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, self.count, meta_len = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'Not a ground snapshot: {path}')
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_len])
+        data_start = _align(HEADER.size + meta_len)
+        view = memoryview(self._mmap)
+        self.columns = {}
+        for name, typecode in COLUMNS:
+            start = data_start + meta['columns'][name]
+            size = array(typecode).itemsize * self.count
+            self.columns[name] = view[start:start + size].cast(typecode)
+        self.types = meta['types']
+        self.locations = meta['locations']
+        self.providers = meta['providers']
+
+    def __len__(self):
+        return self.count
+
+    def _decode(self, table, code):
+        return table[code] if code >= 0 else None
+
+    def rows(self):
+        """Yield every ground as a GroundRow"""
+        c = self.columns
+        for i in range(self.count):
+            lat, lng = c['lat'][i], c['lng'][i]
+            location_id = c['location_id'][i]
+            yield GroundRow(
+                c['id'][i],
+                Decimal(c['budget_cents'][i]) / 100,
+                c['m2'][i],
+                self._decode(self.locations, c['location_code'][i]),
+                None if location_id < 0 else location_id,
+                None if math.isnan(lat) else lat,
+                None if math.isnan(lng) else lng,
+                self._decode(self.types, c['type_code'][i]),
+            )
+
+
+# ============================================================================
+# SHARED INSTANCE - one mapping per directory and process, rewritten when stale
+# ============================================================================
+
+_lock = threading.Lock()
+_current = {}  # directory -> GroundSnapshot
+_refreshing = {}  # directory -> refresh thread
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def is_stale(directory, max_age=None):
+    """True when no snapshot exists, grounds changed after it was started, or it is older than max_age"""
+    written = _mtime(os.path.join(directory, POINTER_FILE))
+    if written is None:
+        return True
+    changed = _mtime(os.path.join(directory, STALE_FILE))
+    if changed is not None and changed >= written:
+        return True
+    return bool(max_age) and time.time() - written > max_age
+
+
+def mark_stale(directory):
+    """Tell every process sharing directory that the ground table changed"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, STALE_FILE)
+    with open(path, 'a'):
+        os.utime(path)
+
+
+def _ground_rows_from_db():
+    return db.session.query(
+        Ground.id, Ground.budget, Ground.m2, Ground.subdivision_type, Ground.location,
+        Ground.location_id, Ground.provider, Ground.lat, Ground.lng,
+    ).order_by(Ground.id).yield_per(5000)
+
+
+def refresh_snapshot(directory, max_age=None, force=False):
+    """Write a new generation from the database if still stale (one writer at a time).
+    Returns the current generation number.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Another worker may have refreshed while we waited for the lock
+            if not force and not is_stale(directory, max_age):
+                return read_generation(directory)
+            started = time.time()
+            generation = (read_generation(directory) or 0) + 1
+            write_snapshot(directory, _ground_rows_from_db(), generation)
+            # Date the pointer to the start of the read, so changes committed meanwhile still count as newer
+            os.utime(os.path.join(directory, POINTER_FILE), (started, started))
+            return generation
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_ground_snapshot(directory, max_age=None):
+    """Return the current GroundSnapshot, writing a new generation first when it is stale"""
+    with _lock:
+        if is_stale(directory, max_age):
+            refresh_snapshot(directory, max_age)
+        return _mapped(directory)
+
+
+def _mapped(directory):
+    generation = read_generation(directory)
+    current = _current.get(directory)
+    if current is None or current.generation != generation:
+        # The previous mapping is released once nothing references it any more
+        current = _current[directory] = GroundSnapshot(snapshot_path(directory, generation))
+    return current
+
+
+def _refresh_in_background(app, directory, max_age):
+    """Start one refresh thread per directory (no-op while one is running)"""
+    def run():
+        try:
+            with app.app_context():
+                refresh_snapshot(directory, max_age)
+        except Exception:
+            logger.exception('Ground snapshot refresh in %s failed', directory)
+        finally:
+            with _lock:
+                _refreshing.pop(directory, None)
+
+    with _lock:
+        if directory in _refreshing:
+            return
+        thread = _refreshing[directory] = threading.Thread(target=run, name='ground-snapshot', daemon=True)
+    thread.start()
+
+
+def wait_for_refreshes(timeout=None):
+    """Block until running background refreshes finished (used by tests and shutdown)"""
+    with _lock:
+        threads = list(_refreshing.values())
+    for thread in threads:
+        thread.join(timeout)
+
+
+def current_snapshot():
+    """The app's snapshot per GROUND_SNAPSHOT_DIR / GROUND_SNAPSHOT_MAX_AGE, or None when disabled or stale.
+    A stale snapshot is rewritten on a background thread; meanwhile callers read the database, so requests
+    neither wait for the refresh nor see grounds that were changed or deleted since.
+    """
+    directory = current_app.config.get('GROUND_SNAPSHOT_DIR')
+    if not directory:
+        return None
+    max_age = current_app.config.get('GROUND_SNAPSHOT_MAX_AGE')
+    if is_stale(directory, max_age):
+        _refresh_in_background(current_app._get_current_object(), directory, max_age)
+        return None
+    with _lock:
+        return _mapped(directory)
+
+
+def ground_rows():
+    """All grounds as GroundRow tuples, from the snapshot when enabled, else straight from the database"""
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return list(snapshot.rows())
+    return [GroundRow(g_id, budget, m2, location, location_id, lat, lng, subdivision_type)
+            for g_id, budget, m2, subdivision_type, location, location_id, _, lat, lng in _ground_rows_from_db()]
+
+
+# ============================================================================
+# CHANGE TRACKING - committed ground writes (from any worker) mark the snapshot and the ground grid stale
+# ============================================================================
+
+def _on_ground_change(*_args):
+    directory = current_app.config.get('GROUND_SNAPSHOT_DIR')
+    if directory:
+        mark_stale(directory)
+
+
+subscribe('ground', _on_ground_change)
+# geo is imported by the models, so it cannot subscribe itself
+subscribe('ground', invalidate_ground_grid)
@@ -0,0 +1,299 @@
+"""
+Storage backends for ground images
+One interface for local disk (plain or memory-mapped reads), Supabase Storage and S3-compatible buckets
+"""
+
+import mmap
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, redirect, request, send_file, Response
+
+try:
+    from supabase import create_client
+except Exception:
+    create_client = None
+
+try:
+    import boto3
+except Exception:
+    boto3 = None
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+UPLOADS_DIR = os.path.join(STATIC_DIR, 'images', 'uploads')
+UPLOADS_URL = '/static/images/uploads'
+
+
+class StorageError(Exception):
+    """Raised when a storage backend is misconfigured or an upload fails"""
+
+
+def write_atomic(path, data):
+    """Write bytes via a temp file + rename so readers never see partial files"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# INTERFACE
+# ============================================================================
+
+class ImageStorage:
+    """Base class for image storage backends.
+
+    Backends store objects by name (e.g. 'grounds/ground_<uuid>.jpg') and know
+    how to hand them to the browser: local backends serve the file, remote
+    backends redirect to a public URL.
+    """
+
+    name = 'base'
+
+    def save_file(self, object_name, src_path, content_type):
+        """Store the contents of a local file under object_name"""
+        raise NotImplementedError
+
+    def save_bytes(self, object_name, data, content_type):
+        """Store bytes under object_name"""
+        raise NotImplementedError
+
+    def read(self, object_name):
+        """Return the stored bytes of object_name"""
+        raise NotImplementedError
+
+    def exists(self, object_name):
+        raise NotImplementedError
+
+    def public_url(self, object_name):
+        """URL the browser can load object_name from"""
+        raise NotImplementedError
+
+    def local_path(self, object_name):
+        """Filesystem path of object_name, or None for remote backends"""
+        return None
+
+    def owns_url(self, url):
+        """Return the object name if url points into this storage, else None"""
+        base = self.public_url('')
+        if url and base and url.startswith(base):
+            return url[len(base):].split('?', 1)[0] or None
+        return None
+
+    def serve(self, object_name, mimetype=None, max_age=None):
+        """Flask response delivering object_name to the browser"""
+        response = redirect(self.public_url(object_name))
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response
+
+
+# ============================================================================
+# LOCAL DISK
+# ============================================================================
+
+class LocalStorage(ImageStorage):
+    """Stores objects as files below a directory served as static files.
+
+    serve() never copies the file through Python when the front-end server can
+    do it: it emits X-Accel-Redirect (nginx) when IMAGE_ACCEL_REDIRECT_PREFIX is
+    set, X-Sendfile when USE_X_SENDFILE is on, and otherwise lets send_file use
+    the WSGI server's file wrapper (sendfile under gunicorn).
+    """
+
+    name = 'local'
+
+    def __init__(self, root=UPLOADS_DIR, base_url=UPLOADS_URL):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def path(self, object_name):
+        path = os.path.abspath(os.path.join(self.root, object_name))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise StorageError(f'Invalid object name: {object_name}')
+        return path
+
+    def local_path(self, object_name):
+        return self.path(object_name)
+
+    def save_file(self, object_name, src_path, content_type):
+        dst = self.path(object_name)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_path = f"{dst}.{os.getpid()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def save_bytes(self, object_name, data, content_type):
+        dst = self.path(object_name)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        write_atomic(dst, data)
+
+    def read(self, object_name):
+        with open(self.path(object_name), 'rb') as f:
+            return f.read()
+
+    def exists(self, object_name):
+        try:
+            return os.path.isfile(self.path(object_name))
+        except StorageError:
+            return False
+
+    def public_url(self, object_name):
+        return f"{self.base_url}/{object_name}"
+
+    def serve(self, object_name, mimetype=None, max_age=None):
+        path = self.path(object_name)
+        accel_prefix = current_app.config.get('IMAGE_ACCEL_REDIRECT_PREFIX')
+        if accel_prefix and path.startswith(os.path.abspath(STATIC_DIR) + os.sep):
+            # nginx serves the file from an internal location aliased to app/static
+            rel_path = os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+            stat = os.stat(path)
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{rel_path}"
+            response.set_etag(f"{int(stat.st_mtime)}-{stat.st_size}")
+            if max_age is not None:
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+            return response.make_conditional(request)
+        # send_file honours USE_X_SENDFILE and answers If-None-Match with 304
+        return send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=max_age)
+
+
+class MmapLocalStorage(LocalStorage):
+    """Local storage whose reads are memory-mapped instead of copied into Python buffers"""
+
+    name = 'local-mmap'
+
+    @contextmanager
+    def open_buffer(self, object_name):
+        """Yield a read-only memoryview over the mapped file (valid inside the block)"""
+        with open(self.path(object_name), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def read(self, object_name):
+        with self.open_buffer(object_name) as view:
+            return view.tobytes()
+
+
+# ============================================================================
+# REMOTE BUCKETS
+# ============================================================================
+
+class SupabaseStorage(ImageStorage):
+    """Stores objects in a Supabase Storage bucket"""
+
+    name = 'supabase'
+
+    def __init__(self, url, key, bucket):
+        if not create_client:
+            raise StorageError('Supabase client not available. Install with: pip install supabase')
+        if not url or not key:
+            raise StorageError('SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY not set in .env')
+        self.url = url
+        self.key = key
+        self.bucket_name = bucket
+        self._client = None
+
+    @property
+    def bucket(self):
+        # Created lazily so constructing the backend never opens a connection
+        if self._client is None:
+            self._client = create_client(self.url, self.key)
+        return self._client.storage.from_(self.bucket_name)
+
+    def save_file(self, object_name, src_path, content_type):
+        """Upload a local file; the client streams it from disk"""
+        self.bucket.upload(object_name, src_path, file_options={"contentType": content_type})
+
+    def save_bytes(self, object_name, data, content_type):
+        self.bucket.upload(object_name, data, file_options={"contentType": content_type})
+
+    def read(self, object_name):
+        return self.bucket.download(object_name)
+
+    def exists(self, object_name):
+        folder, _, filename = object_name.rpartition('/')
+        try:
+            return any(item.get('name') == filename for item in self.bucket.list(folder, {"search": filename}))
+        except Exception:
+            return False
+
+    def public_url(self, object_name):
+        # Public URLs are deterministic, so they can be handed out before the upload finishes
+        return f"{self.url.rstrip('/')}/storage/v1/object/public/{self.bucket_name}/{object_name}"
+
+
+class S3Storage(ImageStorage):
+    """Stores objects in an S3-compatible bucket (AWS, MinIO, Supabase S3 endpoint)"""
+
+    name = 's3'
+
+    def __init__(self, bucket, public_base_url, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None):
+        if boto3 is None:
+            raise StorageError('boto3 not available. Install with: pip install boto3')
+        if not bucket or not public_base_url:
+            raise StorageError('S3_BUCKET or S3_PUBLIC_URL not set in .env')
+        self.bucket_name = bucket
+        self.public_base_url = public_base_url.rstrip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url or None, region_name=region or None,
+                                   aws_access_key_id=access_key or None,
+                                   aws_secret_access_key=secret_key or None)
+
+    def save_file(self, object_name, src_path, content_type):
+        # upload_file streams from disk and switches to multipart for large files
+        self.client.upload_file(src_path, self.bucket_name, object_name,
+                                ExtraArgs={'ContentType': content_type})
+
+    def save_bytes(self, object_name, data, content_type):
+        self.client.put_object(Bucket=self.bucket_name, Key=object_name, Body=data, ContentType=content_type)
+
+    def read(self, object_name):
+        return self.client.get_object(Bucket=self.bucket_name, Key=object_name)['Body'].read()
+
+    def exists(self, object_name):
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=object_name)
+            return True
+        except Exception:
+            return False
+
+    def public_url(self, object_name):
+        return f"{self.public_base_url}/{object_name}"
+
+
+# ============================================================================
+# BACKEND SELECTION
+# ============================================================================
+
+def get_storage(config):
+    """Return the upload backend selected by IMAGE_STORAGE ('supabase', 's3', 'local' or 'mmap').
+    Without an explicit choice Supabase is used when configured, local files otherwise.
+    """
+    backend = (config.get('IMAGE_STORAGE') or '').strip().lower()
+    url = config.get('SUPABASE_URL')
+    key = config.get('SUPABASE_KEY')
+    if not backend:
+        backend = 'supabase' if (url and key and create_client) else 'local'
+    if backend == 'supabase':
+        return SupabaseStorage(url, key, config.get('SUPABASE_BUCKET'))
+    if backend == 's3':
+        return S3Storage(config.get('S3_BUCKET'), config.get('S3_PUBLIC_URL'),
+                         endpoint_url=config.get('S3_ENDPOINT_URL'), region=config.get('S3_REGION'),
+                         access_key=config.get('S3_ACCESS_KEY_ID'), secret_key=config.get('S3_SECRET_ACCESS_KEY'))
+    if backend == 'local':
+        return LocalStorage(config.get('LOCAL_STORAGE_ROOT') or UPLOADS_DIR)
+    if backend == 'mmap':
+        return MmapLocalStorage(config.get('LOCAL_STORAGE_ROOT') or UPLOADS_DIR)
+    raise StorageError(f'Unknown IMAGE_STORAGE backend: {backend}')
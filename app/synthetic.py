@@ -0,0 +1,319 @@
+"""
+Synthetic data for scale testing
+Generates companies, clients with preferences, grounds and matches at any scale, with Belgian locations
+from the bundled postcode table and plausible surfaces and prices per subdivision type.
+Rows are bulk-loaded with COPY on PostgreSQL and with executemany batches on other databases.
+"""
+
+import csv
+import io
+import json
+import math
+import random
+from collections import defaultdict
+
+from sqlalchemy import func, select, text
+
+from .helpers import SUBDIVISION_TYPE_VALUES
+from .invalidation import CHANNEL, trigger_names
+from .locations import get_location_dictionary
+from .matching import compute_match_scores
+from .matching_parallel import PreferenceRow
+from .models import Client, Company, Ground, Match, Preferences
+from .snapshot import GroundRow
+
+FIRST_NAMES = (
+    'Lucas', 'Noah', 'Arthur', 'Louis', 'Liam', 'Jules', 'Victor', 'Adam', 'Mathis', 'Finn', 'Wout', 'Lars',
+    'Emma', 'Olivia', 'Louise', 'Mila', 'Alice', 'Juliette', 'Elena', 'Marie', 'Lena', 'Nora', 'Fien', 'Ines',
+)
+LAST_NAMES = (
+    'Peeters', 'Janssens', 'Maes', 'Jacobs', 'Mertens', 'Willems', 'Claes', 'Goossens', 'Wouters', 'De Smet',
+    'Dubois', 'Lambert', 'Dupont', 'Martin', 'Vermeulen', 'Van den Broeck', 'Hermans', 'Desmet', 'Leroy', 'Michiels',
+)
+STREETS = (
+    'Kerkstraat', 'Stationsstraat', 'Dorpsstraat', 'Molenstraat', 'Nieuwstraat', 'Schoolstraat', 'Veldstraat',
+    'Kapelstraat', 'Beekstraat', 'Rue de la Station', "Rue de l'Eglise", 'Rue du Moulin', 'Chaussee de Bruxelles',
+)
+COMPANY_WORDS = ('Bouw', 'Woningbouw', 'Projecten', 'Construct', 'Immo', 'Habitat', 'Vastgoed', 'Bati')
+SCRAPED_PROVIDERS = ('Vansweevelt', 'Hillewaere')
+
+# subdivision type -> (weight, median m2, spread of log(m2), median EUR per m2)
+TYPE_PROFILES = {
+    'detached': (35, 800, 0.45, 260),
+    'semi_detached': (20, 500, 0.40, 300),
+    'terraced': (15, 250, 0.40, 380),
+    'apartment': (15, 95, 0.30, 2800),
+    'development_plot': (15, 3000, 0.70, 120),
+}
+MATCH_STATUSES = (('pending', 60), ('approved', 25), ('rejected', 15))
+# Grounds kept in memory to draw match candidates from
+MATCH_POOL_SIZE = 200_000
+NULL = '\\N'
+
+
+# ============================================================================
+# GENERATOR
+# ============================================================================
+
+class SyntheticData:
+    """Deterministic (per seed) row generator; ids continue after start_ids[table]"""
+
+    def __init__(self, seed=1, start_ids=None):
+        self.rng = random.Random(seed)
+        self.places = list(get_location_dictionary().places.values())
+        self.next_id = defaultdict(lambda: 1, {table: last + 1 for table, last in (start_ids or {}).items()})
+        self.types = [t for t in SUBDIVISION_TYPE_VALUES if t in TYPE_PROFILES]
+        self.type_weights = [TYPE_PROFILES[t][0] for t in self.types]
+        # Land is dearer in some municipalities than others; fixed per municipality for a given seed
+        self.price_factor = {m: math.exp(self.rng.gauss(0, 0.3))
+                             for m in sorted({p.municipality_id for p in self.places})}
+        self.ground_pool = []
+        self.pool_by_location = defaultdict(list)
+        self.grounds_seen = 0
+
+    def _id(self, table):
+        value = self.next_id[table]
+        self.next_id[table] = value + 1
+        return value
+
+    def _person(self):
+        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+        return f'{first} {last}', f"{first}.{last.replace(' ', '')}{self.rng.randrange(1000)}".lower()
+
+    def _address(self):
+        return f'{self.rng.choice(STREETS)} {self.rng.randrange(1, 250)}'
+
+    def _type(self):
+        return self.rng.choices(self.types, self.type_weights)[0]
+
+    def _plot(self, subdivision_type, place):
+        """(m2, budget) drawn from the type's log-normal surface and the local price level"""
+        _, median_m2, spread, price_m2 = TYPE_PROFILES[subdivision_type]
+        m2 = max(40, int(median_m2 * math.exp(self.rng.gauss(0, spread))))
+        budget = m2 * price_m2 * self.price_factor[place.municipality_id] * math.exp(self.rng.gauss(0, 0.15))
+        return m2, max(10_000, round(budget, -3))
+
+    def companies(self, count):
+        """(id, name, email) rows; names carry the id so they stay unique"""
+        for _ in range(count):
+            company_id = self._id('company')
+            name = f'{self.rng.choice(COMPANY_WORDS)} {self.rng.choice(LAST_NAMES)} {company_id}'
+            yield company_id, name, f"info@{name.lower().replace(' ', '')}.be"
+
+    def ground(self, providers):
+        """One ground row, provided by one of providers (company or scraper names)"""
+        place = self.rng.choice(self.places)
+        subdivision_type = self._type()
+        m2, budget = self._plot(subdivision_type, place)
+        provider = self.rng.choice(providers)
+        lat = round(place.lat + self.rng.uniform(-0.01, 0.01), 6)
+        lng = round(place.lng + self.rng.uniform(-0.015, 0.015), 6)
+        row = (self._id('ground'), place.name, self._address(), m2, budget, subdivision_type,
+               provider, provider, '', place.municipality_id, lat, lng)
+        self._remember(GroundRow(row[0], budget, m2, place.name, place.municipality_id, lat, lng, subdivision_type))
+        return row
+
+    def _remember(self, ground):
+        # Reservoir sample, so match candidates come from the whole catalog even beyond MATCH_POOL_SIZE
+        self.grounds_seen += 1
+        if len(self.ground_pool) < MATCH_POOL_SIZE:
+            index = len(self.ground_pool)
+            self.ground_pool.append(ground)
+        else:
+            index = self.rng.randrange(self.grounds_seen)
+            if index >= MATCH_POOL_SIZE:
+                return
+            self.ground_pool[index] = ground
+        self.pool_by_location[ground.location_id].append(index)
+
+    def client(self, company_id):
+        """(client row, preferences row, PreferenceRow); most clients look for a plot near where they live"""
+        client_id = self._id('client')
+        name, handle = self._person()
+        home = self.rng.choice(self.places)
+        client = (client_id, company_id, name, f'{handle}@example.be', home.name, self._address(),
+                  home.municipality_id, home.lat, home.lng)
+
+        place = home if self.rng.random() < 0.7 else self.rng.choice(self.places)
+        subdivision_type = self._type()
+        m2, budget = self._plot(subdivision_type, place)
+        min_m2, max_m2 = int(m2 * 0.7), int(m2 * 1.4)
+        min_budget, max_budget = round(budget * 0.8, -3), round(budget * 1.2, -3)
+        preferences = (self._id('preferences'), client_id, place.name, subdivision_type, min_m2, max_m2,
+                       min_budget, max_budget, place.municipality_id, place.lat, place.lng)
+        pref = PreferenceRow(client_id, min_budget, max_budget, min_m2, max_m2, place.name,
+                             place.municipality_id, place.lat, place.lng, subdivision_type)
+        return client, preferences, pref
+
+    def matches(self, pref, count):
+        """Scored match rows for count distinct grounds, mostly from the preferred municipality"""
+        if not self.ground_pool:
+            return []
+        local = self.pool_by_location.get(pref.location_id, ())
+        chosen = {}
+        for _ in range(count * 3):
+            if len(chosen) >= count:
+                break
+            if local and self.rng.random() < 0.7:
+                ground = self.ground_pool[self.rng.choice(local)]
+            else:
+                ground = self.rng.choice(self.ground_pool)
+            chosen.setdefault(ground.id, ground)
+        statuses, weights = zip(*MATCH_STATUSES)
+        rows = []
+        for ground_id, ground in sorted(chosen.items()):
+            scores = compute_match_scores(ground, pref)
+            rows.append((self._id('match'), pref.client_id, ground_id, self.rng.choices(statuses, weights)[0],
+                         scores['m2_score'], scores['budget_score'], scores['location_score'], scores['type_score']))
+        return rows
+
+
+# ============================================================================
+# BULK LOADER
+# ============================================================================
+
+COLUMNS = {
+    Company: ('id', 'name', 'email'),
+    Client: ('id', 'company_id', 'name', 'email', 'location', 'address', 'location_id', 'lat', 'lng'),
+    Preferences: ('id', 'client_id', 'location', 'subdivision_type', 'min_m2', 'max_m2', 'min_budget',
+                  'max_budget', 'location_id', 'lat', 'lng'),
+    Ground: ('id', 'location', 'address', 'm2', 'budget', 'subdivision_type', 'owner', 'provider', 'image_url',
+             'location_id', 'lat', 'lng'),
+    Match: ('id', 'client_id', 'ground_id', 'status', 'm2_score', 'budget_score', 'location_score', 'type_score'),
+}
+INVALIDATION_TRIGGERS = {model: trigger_names(model.__tablename__) for model in (Client, Preferences, Ground, Match)}
+
+
+class BulkLoader:
+    """Inserts row tuples (in COLUMNS order, or the given columns) on one connection: COPY on PostgreSQL,
+    executemany elsewhere"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.use_copy = connection.dialect.name == 'postgresql'
+        self.counts = defaultdict(int)
+        if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+            # sqlite3 commits by itself around SAVEPOINTs when it has not begun a transaction yet,
+            # which would make a load that fails halfway keep its first batches
+            connection.exec_driver_sql('BEGIN')
+
+    def load(self, model, rows, columns=None):
+        if not rows:
+            return
+        table = model.__table__
+        columns = columns or COLUMNS[model]
+        if self.use_copy:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([NULL if value is None else value for value in row])
+            buffer.seek(0)
+            quoted = ', '.join(columns)
+            with self.connection.connection.driver_connection.cursor() as cursor:
+                cursor.copy_expert(f'COPY {table.schema}."{table.name}" ({quoted}) '
+                                   f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')", buffer)
+        else:
+            self.connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+        self.counts[table.name] += len(rows)
+
+    def max_id(self, model):
+        return self.connection.execute(select(func.max(model.__table__.c.id))).scalar() or 0
+
+    def disable_invalidation_triggers(self, models=tuple(INVALIDATION_TRIGGERS)):
+        """Skip the NOTIFY triggers of these tables for this transaction (needs table ownership); send
+        notify_resync() after the load instead. Returns False when they stay enabled.
+        """
+        if not self.use_copy:
+            return False
+        try:
+            with self.connection.begin_nested():
+                for model in models:
+                    table = model.__table__
+                    for trigger in INVALIDATION_TRIGGERS[model]:
+                        self.connection.execute(
+                            text(f'ALTER TABLE {table.schema}."{table.name}" DISABLE TRIGGER {trigger}'))
+            return True
+        except Exception:
+            return False
+
+    def enable_invalidation_triggers(self, models=tuple(INVALIDATION_TRIGGERS)):
+        for model in models:
+            table = model.__table__
+            for trigger in INVALIDATION_TRIGGERS[model]:
+                self.connection.execute(text(f'ALTER TABLE {table.schema}."{table.name}" ENABLE TRIGGER {trigger}'))
+
+    def notify_resync(self, models=tuple(INVALIDATION_TRIGGERS)):
+        """Queue one RESYNC notification per table, delivered to every worker on commit"""
+        for model in models:
+            payload = json.dumps({'table': model.__tablename__, 'op': 'RESYNC', 'ids': None})
+            self.connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                                    {'channel': CHANNEL, 'payload': payload})
+
+    def reset_sequences(self):
+        """Move the id sequences past the explicitly inserted ids (PostgreSQL only)"""
+        if not self.use_copy:
+            return
+        for model in COLUMNS:
+            table = model.__table__
+            name = f'{table.schema}."{table.name}"'
+            self.connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT max(id) FROM {name}))"))
+
+
+def generate_dataset(engine, companies=5, clients_per_company=200, grounds=10_000, matches_per_client=5,
+                     seed=1, batch_size=5_000, progress=None):
+    """Generate and load a dataset in one transaction. Returns {table: rows inserted}.
+
+    About half of the grounds are provided by the generated companies, the rest by the scrapers.
+    progress(table, rows so far) is called after every batch.
+    """
+    from .invalidation import bus
+
+    with engine.begin() as connection:
+        loader = BulkLoader(connection)
+        generator = SyntheticData(seed, {model.__tablename__: loader.max_id(model) for model in COLUMNS})
+        triggers_disabled = loader.disable_invalidation_triggers()
+
+        def flush(model, rows):
+            loader.load(model, rows)
+            if progress:
+                progress(model.__tablename__, loader.counts[model.__tablename__])
+            rows.clear()
+
+        company_rows = list(generator.companies(companies))
+        flush(Company, company_rows[:])
+        company_names = [name for _, name, _ in company_rows]
+        providers = company_names + list(SCRAPED_PROVIDERS) * max(1, len(company_names) // 2)
+
+        ground_rows = []
+        for _ in range(grounds):
+            ground_rows.append(generator.ground(providers))
+            if len(ground_rows) >= batch_size:
+                flush(Ground, ground_rows)
+        flush(Ground, ground_rows)
+
+        client_rows, preference_rows, match_rows = [], [], []
+        for company_id, _, _ in company_rows:
+            for _ in range(clients_per_company):
+                client, preferences, pref = generator.client(company_id)
+                client_rows.append(client)
+                preference_rows.append(preferences)
+                match_rows.extend(generator.matches(pref, matches_per_client))
+                if len(client_rows) >= batch_size or len(match_rows) >= batch_size:
+                    # Parents before children, so foreign keys hold batch by batch
+                    flush(Client, client_rows)
+                    flush(Preferences, preference_rows)
+                    flush(Match, match_rows)
+        flush(Client, client_rows)
+        flush(Preferences, preference_rows)
+        flush(Match, match_rows)
+
+        loader.reset_sequences()
+        if triggers_disabled:
+            loader.enable_invalidation_triggers()
+            loader.notify_resync()
+
+    # Core inserts bypass the ORM events, so caches in this process are told directly
+    for model in INVALIDATION_TRIGGERS:
+        bus.publish(model.__tablename__, 'RESYNC', None)
+    return dict(loader.counts)
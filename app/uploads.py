@@ -0,0 +1,154 @@
+"""
+Streaming image uploads
+Spools uploads to disk in chunks, validates them by content and hands them to a background worker.
+The caller learns the public URL only once the image is stored, so a failed upload never leaves a
+broken URL on a ground (it keeps its previous image, or the placeholder).
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .images import VARIANT_MIMETYPE, VARIANT_PREFIX, make_variants, variant_object_name
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Magic numbers of the image formats we accept -> (extension, content type)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'GIF87a', ('gif', 'image/gif')),
+    (b'GIF89a', ('gif', 'image/gif')),
+]
+
+
+class UploadError(Exception):
+    """Raised when an upload is too large or not a supported image"""
+
+
+def sniff_image_type(head):
+    """Return (extension, content type) for the first bytes of an image, or None"""
+    for signature, kind in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if len(head) >= 12 and head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return ('webp', 'image/webp')
+    return None
+
+
+def spool_upload(file_storage, max_bytes, chunk_size=CHUNK_SIZE):
+    """Copy an upload stream to a temp file chunk by chunk.
+
+    Returns (temp_path, extension, content_type). Raises UploadError when the
+    upload exceeds max_bytes or its first bytes are not a known image format.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='upload_', suffix='.part')
+    size = 0
+    kind = None
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(chunk_size)
+                if not chunk:
+                    break
+                if kind is None:
+                    kind = sniff_image_type(chunk)
+                    if kind is None:
+                        raise UploadError('File is not a supported image (jpg, png, gif or webp)')
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f'Image is larger than {max_bytes // (1024 * 1024)} MB')
+                out.write(chunk)
+        if kind is None:
+            raise UploadError('Uploaded file is empty')
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, kind[0], kind[1]
+
+
+def new_object_name(ext):
+    """Unique object name for an uploaded ground image, stored under VARIANT_PREFIX"""
+    ts = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return f"{VARIANT_PREFIX}ground_{uuid.uuid4()}_{ts}.{ext}"
+
+
+def discard_spooled(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+def store_image(storage, tmp_path, object_name, content_type):
+    """Upload a spooled image plus its variants, then remove the temp file"""
+    try:
+        storage.save_file(object_name, tmp_path, content_type)
+        with open(tmp_path, 'rb') as f:
+            data = f.read()
+        for size, variant in make_variants(data).items():
+            storage.save_bytes(variant_object_name(object_name, size), variant, VARIANT_MIMETYPE)
+    finally:
+        discard_spooled(tmp_path)
+
+
+class UploadWorker:
+    """Runs upload jobs on a small thread pool so requests return immediately"""
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    def submit(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        error = future.exception()
+        if error is not None:
+            logger.error('Background image upload failed: %s', error)
+
+    def wait(self, timeout=None):
+        """Block until all queued uploads have finished (used by tests and shutdown)"""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+
+upload_worker = UploadWorker()
+
+
+def _store_and_report(storage, tmp_path, object_name, content_type, on_stored):
+    store_image(storage, tmp_path, object_name, content_type)
+    on_stored(storage.public_url(object_name))
+
+
+def queue_image_upload(spooled, storage, on_stored, run_async=True):
+    """Store an image spooled by spool_upload, in the background unless run_async is False.
+
+    on_stored(url) is called once the image and its variants are stored (on the worker thread when
+    run_async); it is not called when the upload fails, which is only logged. Storage errors surface
+    immediately when run_async is False.
+    """
+    tmp_path, ext, content_type = spooled
+    args = (storage, tmp_path, new_object_name(ext), content_type, on_stored)
+    if run_async:
+        upload_worker.submit(_store_and_report, *args)
+    else:
+        _store_and_report(*args)
@@ -0,0 +1,275 @@
+"""
+End-to-end load benchmark for the web app
+Serves the app on a local threaded HTTP server, seeds it with synthetic data and lets concurrent virtual
+users log in and browse (grounds with filters, matches, match run + review, ground images). Reports
+p50/p95/p99 latency and throughput per endpoint and stores them as JSON for comparison between releases.
+
+Uses DATABASE_URL when it points at PostgreSQL (schema from docs/DDL_schema.sql); otherwise a temporary
+SQLite database. SQLite serializes writers, so concurrent match runs there can fail with "database is
+locked" (counted as errors); compare releases on PostgreSQL. Match runs use the SQL engine: the other engines
+keep the results in the session cookie, which at this data size is far beyond what a client sends back.
+
+Usage: python benchmarks/load_test.py [--users 8] [--duration 30] [--grounds 20000] [--out results.json]
+                                      [--compare previous.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (scenario, weight): what a logged-in company user does between think times
+SCENARIOS = (
+    ('grounds_list', 30),
+    ('grounds_filtered', 25),
+    ('ground_image', 20),
+    ('dashboard', 10),
+    ('matches_list', 10),
+    ('match_run_review', 5),
+)
+FILTER_LOCATIONS = ('Gent', 'Antwerpen', 'Leuven', 'Brugge', 'Namur', 'Hasselt', 'Mol')
+SUBDIVISION_FILTERS = ('', 'detached', 'semi_detached', 'terraced', 'apartment', 'development_plot')
+
+
+def configure_database(args):
+    """Point the app at PostgreSQL from DATABASE_URL or at a throw-away SQLite database"""
+    url = os.getenv('DATABASE_URL', '')
+    if url.startswith(('postgres://', 'postgresql')) and not args.sqlite:
+        return 'postgresql'
+    directory = tempfile.mkdtemp(prefix='groundmatch-load-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{directory}/main.db'
+    os.environ['GROUND_SNAPSHOT_DIR'] = os.path.join(directory, 'snapshot')
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'connect')
+    def attach_public_schema(dbapi_conn, _record):
+        # The models live in schema "public"; SQLite provides it as an attached database
+        dbapi_conn.execute(f"ATTACH DATABASE '{directory}/public.db' AS public")
+        # Let readers proceed while a match run writes; concurrent writers still queue up
+        dbapi_conn.execute('PRAGMA public.journal_mode = WAL')
+        dbapi_conn.execute('PRAGMA busy_timeout = 30000')
+    return 'sqlite'
+
+
+def seed(app, args, backend):
+    from app.models import db, Company, Ground
+    from app.synthetic import generate_dataset
+
+    with app.app_context():
+        if backend == 'sqlite':
+            db.create_all()
+        if args.reseed or Ground.query.count() == 0:
+            counts = generate_dataset(db.engine, args.companies, args.clients, args.grounds, args.matches,
+                                      seed=args.seed)
+            print('seeded ' + ', '.join(f'{table} {rows:,}' for table, rows in counts.items()))
+        companies = [email for (email,) in db.session.query(Company.email).order_by(Company.id)]
+        ground_ids = [ground_id for (ground_id,) in db.session.query(Ground.id)]
+        sizes = {'grounds': len(ground_ids), 'companies': len(companies)}
+    return companies, ground_ids, sizes
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+# ============================================================================
+# VIRTUAL USERS
+# ============================================================================
+
+class Recorder:
+    """Latencies (seconds) and error counts per endpoint, shared by all users"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, name, session, method, url, expect=None, **kwargs):
+        """Time one request; it counts as an error on status >= 400, or any status other than expect when given"""
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=120, **kwargs)
+            ok = response.status_code == expect if expect else response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+        return ok
+
+
+def virtual_user(base, email, ground_ids, recorder, deadline, think, rng):
+    session = requests.Session()
+    recorder.timed('login', session, 'POST', f'{base}/company/login', data={'email': email})
+    names, weights = zip(*SCENARIOS)
+    while time.monotonic() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        if scenario == 'grounds_list':
+            recorder.timed('grounds_list', session, 'GET', f'{base}/grounds',
+                           params={'page': rng.randint(1, 5)})
+        elif scenario == 'grounds_filtered':
+            params = {'location': rng.choice(FILTER_LOCATIONS), 'subdivision_type': rng.choice(SUBDIVISION_FILTERS),
+                      'min_m2': rng.choice(('', '200', '500')), 'max_price': rng.choice(('', '300000', '600000'))}
+            recorder.timed('grounds_filtered', session, 'GET', f'{base}/grounds', params=params)
+        elif scenario == 'ground_image':
+            recorder.timed('ground_image', session, 'GET', f'{base}/grounds/{rng.choice(ground_ids)}/image',
+                           params={'size': 'thumb'})
+        elif scenario == 'dashboard':
+            recorder.timed('dashboard', session, 'GET', f'{base}/dashboard')
+        elif scenario == 'matches_list':
+            recorder.timed('matches_list', session, 'GET', f'{base}/matches')
+        else:
+            if recorder.timed('match_run', session, 'POST', f'{base}/match/run', allow_redirects=False):
+                # Without the run in the session the review redirects away, which is a failure here
+                recorder.timed('match_review', session, 'GET', f'{base}/match/review', expect=200,
+                               allow_redirects=False)
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for name, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': recorder.errors[name],
+            'throughput_rps': len(values) / elapsed,
+            'mean_ms': sum(values) / len(values) * 1000,
+            **{f'p{q}_ms': percentile(values, q) * 1000 for q in (50, 95, 99)},
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return endpoints, {'requests': total, 'errors': sum(recorder.errors.values()), 'throughput_rps': total / elapsed}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, previous=None):
+    before = (previous or {}).get('endpoints', {})
+    print(f'{"endpoint":<18} {"reqs":>6} {"err":>4} {"req/s":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}'
+          + (f' {"p95 vs prev":>12}' if previous else ''))
+    for name, e in result['endpoints'].items():
+        line = (f'{name:<18} {e["requests"]:>6} {e["errors"]:>4} {e["throughput_rps"]:>7.1f} '
+                f'{e["p50_ms"]:>8.1f} {e["p95_ms"]:>8.1f} {e["p99_ms"]:>8.1f}')
+        if previous:
+            old = before.get(name)
+            line += f' {(e["p95_ms"] / old["p95_ms"] - 1):>+11.0%}' if old and old['p95_ms'] else f' {"-":>12}'
+        print(line)
+    total = result['total']
+    print(f'{"total":<18} {total["requests"]:>6} {total["errors"]:>4} {total["throughput_rps"]:>7.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after login')
+    parser.add_argument('--think', type=float, default=0.0, help='mean think time between requests (s)')
+    parser.add_argument('--companies', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=200, help='clients per company')
+    parser.add_argument('--grounds', type=int, default=20000)
+    parser.add_argument('--matches', type=int, default=5, help='matches per client')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reseed', action='store_true', help='add a dataset even when grounds exist')
+    parser.add_argument('--sqlite', action='store_true', help='use a temporary SQLite database even if DATABASE_URL is set')
+    parser.add_argument('--out', default=None, help='JSON result file (default: benchmarks/results/load-<time>.json)')
+    parser.add_argument('--compare', default=None, help='previous JSON result to compare p95 latencies with')
+    args = parser.parse_args()
+
+    backend = configure_database(args)
+    os.environ.setdefault('SLOW_REQUEST_SECONDS', '0')
+    os.environ['MATCHING_ENGINE'] = 'sql'
+
+    from app import create_app
+
+    app = create_app()
+    companies, ground_ids, sizes = seed(app, args, backend)
+    if not companies or not ground_ids:
+        raise SystemExit('No companies or grounds to test with')
+    server, base = start_server(app)
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    deadline = started + args.duration
+    users = [threading.Thread(target=virtual_user,
+                              args=(base, companies[i % len(companies)], ground_ids, recorder, deadline, args.think,
+                                    random.Random(rng.random())))
+             for i in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    endpoints, total = summarize(recorder, elapsed)
+    result = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'database': backend,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'users': args.users,
+            'duration_s': round(elapsed, 2),
+            'think_s': args.think,
+            'matching_engine': app.config.get('MATCHING_ENGINE'),
+            **sizes,
+        },
+        'endpoints': endpoints,
+        'total': total,
+    }
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(result, previous)
+
+    out = args.out or os.path.join(ROOT, 'benchmarks', 'results',
+                                   f'load-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f'results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
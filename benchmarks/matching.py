@@ -0,0 +1,152 @@
+"""
+Micro-benchmark for the matching engine
+Times the pieces of a match run in isolation on synthetic in-memory data (no database): pair scoring
+(compute_match_scores), the match_run loop (score_pair dicts with approved pairs skipped), top-K selection
+per client and get_sorted_matches. Reports pairs/second and, with --memory, peak traced memory per stage.
+
+Sizes above --max-pairs are run on a sample of the clients and extrapolated (marked with ~).
+New engines are compared by adding a function to STAGES.
+
+Usage: python benchmarks/matching.py [--sizes 100x100,1000x1000,10000x100000] [--top-k 10] [--memory]
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.matching import compute_match_scores, score_pair  # noqa: E402
+from app.matching_parallel import total_score  # noqa: E402
+from app.routes import get_sorted_matches  # noqa: E402
+from app.snapshot import GroundRow  # noqa: E402
+from app.synthetic import SCRAPED_PROVIDERS, SyntheticData  # noqa: E402
+
+DEFAULT_SIZES = '100x100,1000x1000,1000x10000,10000x100000'
+
+
+def make_data(n_clients, n_grounds, seed=7):
+    """Synthetic preferences and grounds from the scale-test generator"""
+    generator = SyntheticData(seed)
+    grounds = []
+    for _ in range(n_grounds):
+        g_id, location, _, m2, budget, subdivision_type, _, _, _, location_id, lat, lng = \
+            generator.ground(SCRAPED_PROVIDERS)
+        grounds.append(GroundRow(g_id, budget, m2, location, location_id, lat, lng, subdivision_type))
+    preferences = [generator.client(1)[2] for _ in range(n_clients)]
+    # A few approved pairs, like a company that already reviewed some matches
+    approved = {(p.client_id, grounds[i % len(grounds)].id) for i, p in enumerate(preferences[::10])}
+    return grounds, preferences, approved
+
+
+# ============================================================================
+# STAGES - each returns the number of pairs it handled
+# ============================================================================
+
+def stage_scoring(grounds, preferences, approved, top_k):
+    """compute_match_scores for every pair"""
+    for pref in preferences:
+        for ground in grounds:
+            compute_match_scores(ground, pref)
+    return len(preferences) * len(grounds)
+
+
+def stage_match_run(grounds, preferences, approved, top_k):
+    """The compute_company_matches loop: skip approved pairs, build a score dict per pair"""
+    computed = []
+    for pref in preferences:
+        for ground in grounds:
+            if (pref.client_id, ground.id) in approved:
+                continue
+            computed.append(score_pair(pref.client_id, ground.id, ground, pref))
+    return len(preferences) * len(grounds)
+
+
+def stage_top_k(grounds, preferences, approved, top_k):
+    """Score and keep the top_k grounds per client with a bounded heap"""
+    for pref in preferences:
+        scored = ((total_score(compute_match_scores(ground, pref)), -ground.id) for ground in grounds)
+        heapq.nlargest(top_k, scored)
+    return len(preferences) * len(grounds)
+
+
+def stage_sorting(grounds, preferences, approved, top_k):
+    """get_sorted_matches over top_k match objects per client (approved first, then best score)"""
+    matches = []
+    for i, pref in enumerate(preferences):
+        for j in range(min(top_k, len(grounds))):
+            ground = grounds[(i * top_k + j) % len(grounds)]
+            scores = compute_match_scores(ground, pref)
+            matches.append(SimpleNamespace(status='approved' if j % 4 == 0 else 'pending',
+                                           total_score=total_score(scores), **scores))
+    started = time.perf_counter()
+    get_sorted_matches(matches)
+    # Only the sort is timed; building the match objects is setup
+    return len(matches), time.perf_counter() - started
+
+
+STAGES = {
+    'scoring': stage_scoring,
+    'match_run': stage_match_run,
+    'top_k': stage_top_k,
+    'sorting': stage_sorting,
+}
+# Stages whose memory grows with the number of clients (extrapolated like their time when sampling)
+MEMORY_PER_CLIENT = {'match_run', 'sorting'}
+
+
+def run_stage(stage, grounds, preferences, approved, top_k, memory):
+    started = time.perf_counter()
+    result = stage(grounds, preferences, approved, top_k)
+    elapsed = time.perf_counter() - started
+    count, elapsed = result if isinstance(result, tuple) else (result, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        stage(grounds, preferences, approved, top_k)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated CLIENTSxGROUNDS')
+    parser.add_argument('--stages', default=','.join(STAGES), help='comma separated subset of ' + ', '.join(STAGES))
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--max-pairs', type=int, default=5_000_000, help='sample clients above this many pairs')
+    parser.add_argument('--memory', action='store_true', help='also trace peak memory (runs each stage twice)')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',')]
+    results = []
+    print(f'{"size":>14}  {"stage":<10} {"pairs":>14} {"seconds":>9} {"pairs/s":>12} {"peak MiB":>9}')
+    for size in args.sizes.split(','):
+        n_clients, n_grounds = (int(part) for part in size.lower().split('x'))
+        sample = max(1, min(n_clients, args.max_pairs // n_grounds))
+        grounds, preferences, approved = make_data(sample, n_grounds)
+        scale = n_clients / sample
+        for name in stages:
+            count, elapsed, peak = run_stage(STAGES[name], grounds, preferences, approved, args.top_k, args.memory)
+            pairs, seconds = count * scale, elapsed * scale
+            if peak is not None and name in MEMORY_PER_CLIENT:
+                peak *= scale
+            mark = '~' if scale > 1 else ' '
+            print(f'{size:>14}  {name:<10} {pairs:>14,.0f} {mark}{seconds:>8.2f} {pairs / seconds:>12,.0f} '
+                  + (f'{peak:>9.1f}' if peak is not None else f'{"-":>9}'))
+            results.append({'clients': n_clients, 'grounds': n_grounds, 'stage': name, 'pairs': pairs,
+                            'seconds': seconds, 'pairs_per_second': pairs / seconds, 'peak_mib': peak,
+                            'sampled_clients': sample if scale > 1 else None})
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'top_k': args.top_k, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
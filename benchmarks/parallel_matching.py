@@ -0,0 +1,81 @@
+"""
+Benchmark for the process-pool matching engine
+Scores synthetic clients against a synthetic ground catalog with 1..N worker processes
+and reports the speedup over a single process. No database is needed.
+
+Usage: python benchmarks/parallel_matching.py [--clients 2000] [--grounds 5000] [--workers 1,2,4,8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.locations import get_location_dictionary  # noqa: E402
+from app.matching_parallel import GroundRow, PreferenceRow, match_in_processes  # noqa: E402
+
+TYPES = ['detached', 'semi_detached', 'terraced', 'development_plot']
+
+
+def make_data(n_clients, n_grounds, seed=12):
+    """Synthetic grounds and preferences spread over the bundled Belgian places"""
+    rng = random.Random(seed)
+    places = list(get_location_dictionary().places.values())
+    grounds = []
+    for ground_id in range(1, n_grounds + 1):
+        place = rng.choice(places)
+        grounds.append(GroundRow(ground_id, Decimal(rng.randrange(80_000, 600_000, 1_000)),
+                                 rng.randrange(150, 2_000), place.name, place.municipality_id,
+                                 place.lat, place.lng, rng.choice(TYPES)))
+    preferences = []
+    for client_id in range(1, n_clients + 1):
+        place = rng.choice(places)
+        min_budget = rng.randrange(80_000, 400_000, 5_000)
+        min_m2 = rng.randrange(150, 1_000, 10)
+        preferences.append(PreferenceRow(client_id, Decimal(min_budget), Decimal(min_budget + 150_000),
+                                         min_m2, min_m2 + 500, place.name, place.municipality_id,
+                                         place.lat, place.lng, rng.choice(TYPES)))
+    return grounds, preferences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--grounds', type=int, default=5000)
+    parser.add_argument('--top-k', type=int, default=10, help='grounds kept per client (0 = all)')
+    parser.add_argument('--workers', default=None, help='comma separated worker counts (default: 1,2,4.. up to CPU count)')
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(',')]
+    else:
+        counts = sorted({1, cpus} | {2 ** i for i in range(1, 8) if 2 ** i < cpus})
+
+    grounds, preferences = make_data(args.clients, args.grounds)
+    print(f'{args.clients} clients x {args.grounds} grounds = {args.clients * args.grounds:,} pairs, '
+          f'top_k={args.top_k or "all"}, {cpus} CPU(s)')
+    print(f'{"workers":>7}  {"seconds":>8}  {"pairs/s":>12}  {"speedup":>7}  {"efficiency":>10}')
+
+    baseline = reference = None
+    for workers in counts:
+        # The server keeps its pool running between match runs, so start the workers before timing
+        match_in_processes(grounds[:1], preferences[:workers * 2], workers=workers)
+        start = time.perf_counter()
+        results = match_in_processes(grounds, preferences, workers=workers, top_k=args.top_k or None)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference, baseline = results, elapsed
+        elif results != reference:
+            raise SystemExit(f'{workers} workers returned different results than {counts[0]}')
+        speedup = baseline / elapsed
+        print(f'{workers:>7}  {elapsed:>8.2f}  {args.clients * args.grounds / elapsed:>12,.0f}  '
+              f'{speedup:>6.2f}x  {speedup / workers:>9.0%}')
+
+
+if __name__ == '__main__':
+    main()
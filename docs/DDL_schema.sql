@@ -33,7 +33,10 @@ CREATE TABLE IF NOT EXISTS public.client (
   name       VARCHAR(200) NOT NULL,
   email      VARCHAR(320) NOT NULL,
   address    VARCHAR(300) NOT NULL,
-  location   VARCHAR(200) NOT NULL
+  location   VARCHAR(200) NOT NULL,
+  location_id INT,
+  lat        DOUBLE PRECISION,
+  lng        DOUBLE PRECISION
 );
 
 CREATE INDEX IF NOT EXISTS idx_client_company_id ON public.client(company_id);
@@ -51,6 +54,9 @@ CREATE TABLE IF NOT EXISTS public.ground (
   owner            VARCHAR(200) NOT NULL,
   provider         VARCHAR(200) NOT NULL,
   image_url        TEXT NOT NULL,
+  location_id      INT,
+  lat              DOUBLE PRECISION,
+  lng              DOUBLE PRECISION,
 
   CONSTRAINT ck_ground_m2_nonnegative     CHECK (m2 >= 0),
   CONSTRAINT ck_ground_budget_nonnegative CHECK (budget >= 0)
@@ -68,6 +74,9 @@ CREATE TABLE IF NOT EXISTS public.preferences (
   max_m2           INT NOT NULL,
   min_budget       NUMERIC(12,2) NOT NULL,
   max_budget       NUMERIC(12,2) NOT NULL,
+  location_id      INT,
+  lat              DOUBLE PRECISION,
+  lng              DOUBLE PRECISION,
 
   CONSTRAINT ck_preferences_m2_range
       CHECK (min_m2 <= max_m2),
@@ -94,4 +103,156 @@ CREATE INDEX IF NOT EXISTS idx_match_client_id ON public.match(client_id);
 CREATE INDEX IF NOT EXISTS idx_match_ground_id ON public.match(ground_id);
 CREATE INDEX IF NOT EXISTS idx_match_status    ON public.match(status);
 
+-- =========================================
+-- MATCH_CANDIDATE (output of the SQL matching engine, awaiting review)
+-- =========================================
+CREATE TABLE IF NOT EXISTS public.match_candidate (
+  id             INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  run_id         VARCHAR(36) NOT NULL,
+  company_id     INT NOT NULL REFERENCES public.company(id) ON DELETE CASCADE,
+  client_id      INT NOT NULL REFERENCES public.client(id) ON DELETE CASCADE,
+  ground_id      INT NOT NULL REFERENCES public.ground(id) ON DELETE CASCADE,
+
+  m2_score       DOUBLE PRECISION NOT NULL,
+  budget_score   DOUBLE PRECISION NOT NULL,
+  location_score DOUBLE PRECISION NOT NULL,
+  type_score     DOUBLE PRECISION NOT NULL,
+  created_at     TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_match_candidate_run_id     ON public.match_candidate(run_id);
+CREATE INDEX IF NOT EXISTS idx_match_candidate_company_id ON public.match_candidate(company_id);
+
+-- The score cache of earlier versions is gone: scoring a pair is cheaper than looking it up
+DROP TABLE IF EXISTS public.score_cache;
+
+-- =========================================
+-- MATCH_RUN_STATS (per-stage timings and pair counts of each match run, shown on the dashboard)
+-- =========================================
+CREATE TABLE IF NOT EXISTS public.match_run_stats (
+  id          INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  company_id  INT NOT NULL REFERENCES public.company(id) ON DELETE CASCADE,
+  engine      VARCHAR(20) NOT NULL,
+  created_at  TIMESTAMP NOT NULL DEFAULT now(),
+
+  total_ms    DOUBLE PRECISION NOT NULL,
+  clients     INT,
+  grounds     INT,
+  pairs       BIGINT,
+  candidates  INT,
+  stages      JSONB NOT NULL,
+  extra       JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_match_run_stats_company_created ON public.match_run_stats(company_id, created_at DESC);
+
+-- =========================================
+-- COORDINATES (lat/lng derived from location, used for distance-based location scores)
+-- Upgrades databases created before these columns existed
+-- =========================================
+ALTER TABLE public.client      ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION;
+ALTER TABLE public.client      ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION;
+ALTER TABLE public.ground      ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION;
+ALTER TABLE public.ground      ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION;
+ALTER TABLE public.preferences ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION;
+ALTER TABLE public.preferences ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION;
+
+-- =========================================
+-- LOCATION IDS (canonical municipality = its main postcode, resolved at write time;
+-- fill existing rows with: flask --app run resolve-locations)
+-- =========================================
+ALTER TABLE public.client      ADD COLUMN IF NOT EXISTS location_id INT;
+ALTER TABLE public.ground      ADD COLUMN IF NOT EXISTS location_id INT;
+ALTER TABLE public.preferences ADD COLUMN IF NOT EXISTS location_id INT;
+
+CREATE INDEX IF NOT EXISTS idx_ground_location_id ON public.ground(location_id);
+
+-- =========================================
+-- CACHE INVALIDATION (workers LISTEN on groundmatch_invalidate, see app/invalidation.py)
+-- =========================================
+-- One NOTIFY per statement (not per row), so cascades, bulk deletes and COPY loads stay cheap.
+-- The payload lists up to 100 changed ids (more become a RESYNC of the table) and the writing
+-- transaction's id, which lets the writing worker skip what it already delivered itself.
+-- A trigger with transition tables handles a single event, hence three triggers per table.
+CREATE OR REPLACE FUNCTION public.notify_cache_invalidation() RETURNS trigger AS $$
+DECLARE
+  ids INT[];
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    SELECT array_agg(id) INTO ids FROM (SELECT id FROM old_rows LIMIT 101) AS changed;
+  ELSE
+    SELECT array_agg(id) INTO ids FROM (SELECT id FROM new_rows LIMIT 101) AS changed;
+  END IF;
+  IF ids IS NULL THEN
+    RETURN NULL;  -- the statement changed no rows
+  END IF;
+  PERFORM pg_notify(
+    'groundmatch_invalidate',
+    json_build_object(
+      'table', TG_TABLE_NAME,
+      'op',    CASE WHEN cardinality(ids) > 100 THEN 'RESYNC' ELSE TG_OP END,
+      'ids',   CASE WHEN cardinality(ids) > 100 THEN NULL ELSE ids END,
+      'txid',  txid_current()
+    )::text
+  );
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ground_invalidate ON public.ground;
+DROP TRIGGER IF EXISTS trg_ground_invalidate_insert ON public.ground;
+CREATE TRIGGER trg_ground_invalidate_insert
+  AFTER INSERT ON public.ground REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_ground_invalidate_update ON public.ground;
+CREATE TRIGGER trg_ground_invalidate_update
+  AFTER UPDATE ON public.ground REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_ground_invalidate_delete ON public.ground;
+CREATE TRIGGER trg_ground_invalidate_delete
+  AFTER DELETE ON public.ground REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_preferences_invalidate ON public.preferences;
+DROP TRIGGER IF EXISTS trg_preferences_invalidate_insert ON public.preferences;
+CREATE TRIGGER trg_preferences_invalidate_insert
+  AFTER INSERT ON public.preferences REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_preferences_invalidate_update ON public.preferences;
+CREATE TRIGGER trg_preferences_invalidate_update
+  AFTER UPDATE ON public.preferences REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_preferences_invalidate_delete ON public.preferences;
+CREATE TRIGGER trg_preferences_invalidate_delete
+  AFTER DELETE ON public.preferences REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_client_invalidate ON public.client;
+DROP TRIGGER IF EXISTS trg_client_invalidate_insert ON public.client;
+CREATE TRIGGER trg_client_invalidate_insert
+  AFTER INSERT ON public.client REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_client_invalidate_update ON public.client;
+CREATE TRIGGER trg_client_invalidate_update
+  AFTER UPDATE ON public.client REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_client_invalidate_delete ON public.client;
+CREATE TRIGGER trg_client_invalidate_delete
+  AFTER DELETE ON public.client REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+
+DROP TRIGGER IF EXISTS trg_match_invalidate ON public.match;
+DROP TRIGGER IF EXISTS trg_match_invalidate_insert ON public.match;
+CREATE TRIGGER trg_match_invalidate_insert
+  AFTER INSERT ON public.match REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_match_invalidate_update ON public.match;
+CREATE TRIGGER trg_match_invalidate_update
+  AFTER UPDATE ON public.match REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+DROP TRIGGER IF EXISTS trg_match_invalidate_delete ON public.match;
+CREATE TRIGGER trg_match_invalidate_delete
+  AFTER DELETE ON public.match REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.notify_cache_invalidation();
+
 COMMIT;
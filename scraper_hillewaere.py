@@ -122,6 +122,14 @@ def parse_address_and_city_from_description(desc_html: Optional[str]):
     return address, city
 
 
+def parse_coordinate(value) -> Optional[float]:
+    """Coördinaat uit de feed als float, of None als die ontbreekt of ongeldig is."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
 # -----------------------------
 # Normalisatie van 1 item
 # -----------------------------
@@ -169,10 +177,8 @@ def normalize_hillewaere_item(item: Dict) -> Optional[Dict]:
         "provider": "Hillewaere",
         #"detail_url": url,
         "image_url": item.get("img"),
-        "image_url": item.get("img"),
-        # Als je ook lat/lng kolommen hebt in DB, kun je die hier toevoegen:
-        # "lat": float(item["lat"]),
-        # "lng": float(item["lng"]),
+        "lat": parse_coordinate(item.get("lat")),
+        "lng": parse_coordinate(item.get("lng")),
     }
 
     return record
@@ -0,0 +1,57 @@
+"""
+Test setup: every test gets a fresh SQLite database. The models live in schema "public",
+which SQLite provides as an attached database file.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Config is read when the app package is imported
+_scratch = tempfile.mkdtemp(prefix='groundmatch-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_scratch}/main.db'
+os.environ['GROUND_SNAPSHOT_DIR'] = os.path.join(_scratch, 'snapshot')
+os.environ['INVALIDATION_BACKEND'] = 'local'
+os.environ['METRICS_ENABLED'] = '1'
+os.environ['SLOW_REQUEST_SECONDS'] = '0'
+
+_public_db = os.path.join(_scratch, 'public.db')
+
+pytest_plugins = ['query_budget_plugin']
+
+
+@event.listens_for(Engine, 'connect')
+def _attach_public_schema(dbapi_conn, _record):
+    if type(dbapi_conn).__module__.startswith('sqlite3'):
+        dbapi_conn.execute(f"ATTACH DATABASE '{_public_db}' AS public")
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on an empty database of its own (each app gets its own engine and connections)"""
+    global _public_db
+    _public_db = str(tmp_path / 'public.db')
+
+    from app import create_app, db
+    from app.snapshot import wait_for_refreshes
+
+    app = create_app()
+    app.config.update(TESTING=True, GROUND_SNAPSHOT_DIR=str(tmp_path / 'snapshot'))
+    with app.app_context():
+        db.create_all()
+        yield app
+        wait_for_refreshes()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
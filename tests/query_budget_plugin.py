@@ -0,0 +1,72 @@
+"""
+pytest plugin that enforces the SQL query budgets declared with @query_budget
+Enabled from tests/conftest.py with `pytest_plugins = ['query_budget_plugin']`. Every request a test makes
+through the Flask test client is then checked against its view's budget (METRICS_ENABLED must be on),
+and the test fails listing the statements of each request that went over.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import query_budget_exceeded
+
+
+class QueryLog(list):
+    """Statements executed inside count_queries(), in order"""
+
+    @property
+    def count(self):
+        return len(self)
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement executed in the block (any thread, any engine)"""
+    log = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        log.append(' '.join(statement.split()))
+
+    event.listen(Engine, 'after_cursor_execute', record)
+    try:
+        yield log
+    finally:
+        event.remove(Engine, 'after_cursor_execute', record)
+
+
+def format_violation(endpoint, budget, stats):
+    statements = '\n'.join(f'    {statement}' for _, statement in stats.queries)
+    return f'{endpoint}: {stats.query_count} SQL statements, budget {budget}\n{statements}'
+
+
+@pytest.fixture(autouse=True)
+def query_budgets():
+    """Fail the test when a request ran more statements than its view's @query_budget.
+    Yields the list of violations so a test can inspect (or clear) it.
+    """
+    violations = []
+
+    def record(sender, endpoint, budget, stats, **extra):
+        violations.append(format_violation(endpoint, budget, stats))
+
+    query_budget_exceeded.connect(record)
+    try:
+        yield violations
+    finally:
+        query_budget_exceeded.disconnect(record)
+    if violations:
+        pytest.fail('Query budget exceeded:\n' + '\n'.join(violations), pytrace=False)
+
+
+@pytest.fixture(name='count_queries')
+def count_queries_fixture():
+    """The count_queries context manager, for budgets on code paths outside a request:
+
+        with count_queries() as queries:
+            compute_company_matches(company.id)
+        assert queries.count <= 5
+    """
+    return count_queries
@@ -0,0 +1,87 @@
+"""Deleting grounds and clients: the database cascades to matches and preferences, bulk deletes reach the caches"""
+
+import pytest
+
+from app.invalidation import bus, subscribe
+from app.models import db, Client, Company, Ground, Match, Preferences
+
+
+@pytest.fixture
+def events():
+    """(table, op, row_id) of every ground and client event published during the test"""
+    published = []
+
+    def record(table, op, row_id):
+        published.append((table, op, row_id))
+
+    subscribe(('ground', 'client'), record)
+    yield published
+    for table in ('ground', 'client'):
+        bus.unsubscribe(table, record)
+
+
+@pytest.fixture
+def data(app, client):
+    """Two companies with a client each (with preferences) and a ground each, every client matched to every ground.
+    Logged in as the first company."""
+    companies = [Company(name='Acme', email='acme@example.be'), Company(name='Other', email='other@example.be')]
+    db.session.add_all(companies)
+    db.session.flush()
+    clients = [Client(company_id=c.id, name=f'Client of {c.name}', email=f'client@{c.name.lower()}.be',
+                      location='Gent', address='Kerkstraat 1') for c in companies]
+    grounds = [Ground(location='Gent', address='Dorpsstraat 1', m2=500, budget=200000, subdivision_type='detached',
+                      owner='Owner', provider=c.name, image_url='') for c in companies]
+    db.session.add_all(clients + grounds)
+    db.session.flush()
+    for c in clients:
+        db.session.add(Preferences(client_id=c.id, location='Gent', subdivision_type='detached',
+                                   min_m2=100, max_m2=900, min_budget=100000, max_budget=300000))
+        for g in grounds:
+            db.session.add(Match(client_id=c.id, ground_id=g.id, status='approved',
+                                 m2_score=100, budget_score=100, location_score=100, type_score=100))
+    db.session.commit()
+    with client.session_transaction() as session:
+        session['role'] = 'company'
+        session['company_id'] = companies[0].id
+    return [c.id for c in clients], [g.id for g in grounds]
+
+
+def matches_of(column, row_id):
+    return Match.query.filter(column == row_id).count()
+
+
+def test_deleting_a_ground_cascades_to_its_matches(client, data):
+    _, (own, other) = data
+    client.post(f'/grounds/{own}/delete')
+    assert db.session.get(Ground, own) is None
+    assert matches_of(Match.ground_id, own) == 0
+    assert matches_of(Match.ground_id, other) == 2
+
+
+def test_deleting_a_client_cascades_to_preferences_and_matches(client, data):
+    (own, other), _ = data
+    client.post(f'/clients/{own}/delete')
+    assert db.session.get(Client, own) is None
+    assert Preferences.query.filter_by(client_id=own).count() == 0
+    assert matches_of(Match.client_id, own) == 0
+    assert matches_of(Match.client_id, other) == 2
+
+
+def test_bulk_delete_of_grounds_skips_other_providers_and_notifies(client, data, events):
+    _, (own, other) = data
+    response = client.post('/grounds/bulk-delete', data={'ground_ids': [own, other]}, follow_redirects=True)
+    assert b'1 ground(s) deleted' in response.data
+    assert b'1 ground(s) skipped' in response.data
+    assert [ground_id for (ground_id,) in db.session.query(Ground.id)] == [other]
+    assert matches_of(Match.ground_id, own) == 0
+    assert ('ground', 'DELETE', own) in events
+    assert ('ground', 'DELETE', other) not in events
+
+
+def test_bulk_delete_of_clients_skips_other_companies_and_notifies(client, data, events):
+    (own, other), _ = data
+    client.post('/clients/bulk-delete', data={'client_ids': [own, other]})
+    assert [client_id for (client_id,) in db.session.query(Client.id)] == [other]
+    assert Preferences.query.filter_by(client_id=own).count() == 0
+    assert matches_of(Match.client_id, own) == 0
+    assert events == [('client', 'DELETE', own)]
@@ -0,0 +1,55 @@
+"""Placeholder images of grounds without a photo: cached columns, ETag and 304 responses"""
+
+from app.models import db, Ground
+
+
+def add_ground(**fields):
+    ground = Ground(**{'location': 'Gent', 'address': 'Dorpsstraat 1', 'm2': 500, 'budget': 200000,
+                       'subdivision_type': 'detached', 'owner': 'Owner', 'provider': 'Acme', 'image_url': '',
+                       **fields})
+    db.session.add(ground)
+    db.session.commit()
+    return ground.id
+
+
+def test_conditional_request_is_answered_without_a_query(app, client, count_queries):
+    ground_id = add_ground()
+    first = client.get(f'/grounds/{ground_id}/image')
+    assert first.status_code == 200
+    assert first.mimetype == 'image/svg+xml'
+    assert b'Gent' in first.data
+    etag = first.headers['ETag']
+
+    with count_queries() as queries:
+        again = client.get(f'/grounds/{ground_id}/image', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert queries.count == 0
+
+
+def test_a_changed_ground_gets_a_new_placeholder(app, client):
+    ground_id = add_ground()
+    etag = client.get(f'/grounds/{ground_id}/image').headers['ETag']
+
+    db.session.get(Ground, ground_id).location = 'Antwerpen'
+    db.session.commit()
+    response = client.get(f'/grounds/{ground_id}/image', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Antwerpen' in response.data
+    assert response.headers['ETag'] != etag
+
+
+def test_unknown_ground_gets_an_empty_image(app, client):
+    response = client.get('/grounds/999/image')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+
+
+def test_cards_link_scraped_images_through_the_route(app):
+    from app import ground_image_src
+    scraped = Ground(id=1, image_url='https://example.be/photos/1.jpg')
+    bare = Ground(id=2, image_url='')
+    uploaded = Ground(id=3, image_url='/static/uploads/grounds/abc.jpg')
+    with app.test_request_context():
+        assert ground_image_src(scraped, 'thumb') == '/grounds/1/image?size=thumb'
+        assert ground_image_src(bare, 'thumb') == '/grounds/2/image?size=thumb'
+        assert ground_image_src(uploaded, 'thumb') == '/static/uploads/grounds/abc_thumb.webp'
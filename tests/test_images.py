@@ -0,0 +1,111 @@
+"""Content-addressed image cache shared by several processes, and the fetcher's dedup and retry paths"""
+
+from datetime import datetime, timedelta
+from functools import partial
+
+import pytest
+import requests
+
+from app import images
+from app.images import ImageCache, ImageFetcher
+from app.storage import MmapLocalStorage
+
+JPEG = b'\xff\xd8\xff\xe0 not really a jpeg'
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    """Serves the bytes in pages; other URLs fail like an unreachable host"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, timeout=None):
+        self.requested.append(url)
+        if url not in self.pages:
+            raise requests.ConnectionError(f'cannot reach {url}')
+        return FakeResponse(self.pages[url])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def ground_images(tmp_path, monkeypatch):
+    """Scraped ground images go to a scratch directory instead of app/static"""
+    directory = tmp_path / 'grounds'
+    monkeypatch.setattr(images, 'GROUNDS_IMAGE_DIR', str(directory))
+    monkeypatch.setattr(images, 'GROUND_IMAGES', MmapLocalStorage(str(directory), '/static/images/grounds'))
+    return directory
+
+
+def fetcher_for(cache, pages):
+    fetcher = ImageFetcher(cache=cache, max_workers=2)
+    fetcher.session = FakeSession(pages)
+    return fetcher
+
+
+def test_saves_of_two_processes_are_merged(tmp_path):
+    first, second = ImageCache(str(tmp_path)), ImageCache(str(tmp_path))
+    first.store(b'one', 'https://example.be/1.jpg')
+    first.record_failure('https://example.be/broken.jpg', [7], {}, 'timeout')
+    second.store(b'two', 'https://example.be/2.jpg')
+    first.save()
+    second.save()
+
+    on_disk = ImageCache(str(tmp_path))
+    assert on_disk.lookup('https://example.be/1.jpg')
+    assert on_disk.lookup('https://example.be/2.jpg')
+    assert set(on_disk.failures()) == {'https://example.be/broken.jpg'}
+    # A save also picks up what the other process saved
+    assert second.lookup('https://example.be/1.jpg')
+
+
+def test_a_download_in_another_process_clears_the_failure(tmp_path):
+    first, second = ImageCache(str(tmp_path)), ImageCache(str(tmp_path))
+    first.record_failure('https://example.be/3.jpg', [3], {}, 'timeout')
+    first.save()
+    second.store(b'three', 'https://example.be/3.jpg')
+    second.save()
+    assert ImageCache(str(tmp_path)).failures() == {}
+
+
+def test_one_download_per_source_url(tmp_path, ground_images):
+    cache = ImageCache(str(tmp_path / 'cache'))
+    plot = {'image_url': 'https://example.be/plot.jpg'}
+    fetcher = fetcher_for(cache, {'https://example.be/plot.jpg': JPEG})
+
+    assert fetcher.fetch_all([(plot, 1), (plot, 2)]) == (2, 0)
+    assert fetcher.fetch_all([(plot, 3)]) == (1, 0)
+    assert fetcher.session.requested == ['https://example.be/plot.jpg']
+    for ground_id in (1, 2, 3):
+        assert (ground_images / f'{ground_id}.jpg').read_bytes() == JPEG
+
+
+def test_failed_downloads_are_retried_after_their_backoff(tmp_path, ground_images, monkeypatch):
+    cache = ImageCache(str(tmp_path / 'cache'))
+    plot = {'image_url': 'https://example.be/late.jpg'}
+    fetcher = fetcher_for(cache, {})
+    assert fetcher.fetch_all([(plot, 1), (plot, 2)]) == (0, 2)
+    failure = cache.failures()['https://example.be/late.jpg']
+    assert failure['ground_ids'] == [1, 2] and failure['attempts'] == 1
+
+    # Not due yet
+    assert fetcher.retry_failures([1, 2]) == (0, 0)
+
+    # Once due, ground 2 (deleted meanwhile) is dropped and ground 1 gets its image
+    later = datetime.utcnow() + timedelta(seconds=images.RETRY_BACKOFF + 1)
+    monkeypatch.setattr(cache, 'due_failures', partial(cache.due_failures, now=later))
+    fetcher.session.pages['https://example.be/late.jpg'] = JPEG
+    assert fetcher.retry_failures([1]) == (1, 0)
+    assert (ground_images / '1.jpg').read_bytes() == JPEG
+    assert not (ground_images / '2.jpg').exists()
+    assert ImageCache(str(tmp_path / 'cache')).failures() == {}
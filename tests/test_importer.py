@@ -0,0 +1,79 @@
+"""Bulk import: per-row error reporting, the row-by-row retry of a rejected batch and streamed JSON arrays"""
+
+import io
+import json
+
+import pytest
+
+from app.importer import import_file, iter_json_array
+from app.models import db, Company, Ground
+
+HEADER = 'location,owner,m2,budget,subdivision_type\n'
+
+
+@pytest.fixture
+def company(app):
+    company = Company(name='Acme', email='acme@example.be')
+    db.session.add(company)
+    db.session.commit()
+    return company
+
+
+def import_grounds(company, content, fmt='csv', batch_size=10):
+    return import_file(db.engine, 'grounds', io.BytesIO(content.encode('utf-8')), fmt, company, batch_size)
+
+
+def test_invalid_rows_are_reported_by_row_number(company):
+    result = import_grounds(company, HEADER +
+                            'Gent,Owner,500,200000,detached\n'
+                            'Gent,,500,200000,detached\n'
+                            'Gent,Owner,-5,200000,detached\n'
+                            'Gent,Owner,500,200000,castle\n'
+                            'Mol,Owner,700,150000,\n')
+    assert result.imported == 2
+    assert result.errors == [(3, 'owner is required'), (4, 'm2 must be positive'),
+                             (5, "unknown subdivision_type 'castle'")]
+    assert sorted(location for (location,) in db.session.query(Ground.location)) == ['Gent', 'Mol']
+
+
+def test_a_batch_the_database_rejects_is_retried_row_by_row(company):
+    # Passes validation, but does not fit the integer column
+    result = import_grounds(company, HEADER +
+                            'Gent,Owner,500,200000,detached\n'
+                            'Gent,Owner,1e30,200000,detached\n'
+                            'Mol,Owner,700,150000,detached\n')
+    assert result.imported == 2
+    assert [number for number, _ in result.errors] == [3]
+    assert Ground.query.count() == 2
+
+
+def test_json_array_rows_are_numbered_by_element(company):
+    records = [{'Location': 'Gent', 'Owner': 'Owner', 'm2': 500, 'budget': 200000}, 'not a plot',
+               {'location': 'Mol', 'owner': 'Owner', 'm2': 700, 'budget': 150000}]
+    result = import_grounds(company, json.dumps(records), fmt='json')
+    assert result.imported == 2
+    assert result.errors == [(2, 'not a JSON object')]
+
+
+def test_an_unreadable_json_file_imports_nothing(company):
+    with pytest.raises(ValueError, match='element 2'):
+        import_grounds(company, '[{"location": "Gent", "owner": "Owner", "m2": 500, "budget": 1},'
+                                ' {"location": }]', fmt='json', batch_size=1)
+    assert Ground.query.count() == 0
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_json_arrays_are_read_in_chunks(chunk_size):
+    records = [{'n': i, 'text': 'x' * i, 'nested': [i, {'f': i / 3}]} for i in range(200)] + [1234567, 'end']
+    assert list(iter_json_array(io.StringIO(json.dumps(records, indent=1)), chunk_size)) == records
+
+
+def test_import_has_its_own_upload_cap(app, client, company):
+    app.config['MAX_IMPORT_BYTES'] = 1024
+    with client.session_transaction() as session:
+        session['role'] = 'company'
+        session['company_id'] = company.id
+    content = HEADER + 'Gent,Owner,500,200000,detached\n' * 50000
+    response = client.post('/import', data={'kind': 'grounds', 'file': (io.BytesIO(content.encode()), 'grounds.csv')})
+    assert response.status_code == 413
+    assert Ground.query.count() == 0
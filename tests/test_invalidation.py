@@ -0,0 +1,65 @@
+"""Invalidation events: local delivery after commit and the NOTIFY payloads of the statement triggers"""
+
+import pytest
+
+from app.invalidation import bus, is_own_transaction, parse_payload, remember_own_transaction, subscribe
+from app.models import db, Ground
+
+
+@pytest.fixture
+def ground_events():
+    """(table, op, row_id) of every ground event published during the test"""
+    events = []
+
+    def record(table, op, row_id):
+        events.append((table, op, row_id))
+
+    subscribe('ground', record)
+    yield events
+    bus.unsubscribe('ground', record)
+
+
+def test_payload_lists_ids_or_asks_for_a_resync():
+    assert parse_payload('{"table": "ground", "op": "DELETE", "ids": [3, 4], "txid": 77}') == \
+        ('ground', 'DELETE', [3, 4], 77)
+    assert parse_payload('{"table": "match", "op": "RESYNC", "ids": null, "txid": 78}') == \
+        ('match', 'RESYNC', [None], 78)
+
+
+def test_own_transactions_are_recognised():
+    remember_own_transaction(1001)
+    assert is_own_transaction(1001)
+    assert not is_own_transaction(1002)
+
+
+def test_writes_are_delivered_after_commit_only(app, ground_events):
+    events = ground_events
+    ground = Ground(location='Gent', address='Dorpsstraat 1', m2=500, budget=200000,
+                    subdivision_type='detached', owner='Owner', provider='Acme', image_url='')
+    db.session.add(ground)
+    db.session.flush()
+    assert events == []
+    db.session.commit()
+    assert events == [('ground', 'INSERT', ground.id)]
+
+    ground.m2 = 600
+    db.session.flush()
+    db.session.rollback()
+    assert events == [('ground', 'INSERT', ground.id)]
+
+
+def test_bulk_deletes_mark_the_ground_grid_stale(app):
+    from app import geo
+    from app.routes import bulk_delete
+
+    ground = Ground(location='Gent', address='Dorpsstraat 1', m2=500, budget=200000,
+                    subdivision_type='detached', owner='Owner', provider='Acme', image_url='')
+    db.session.add(ground)
+    db.session.commit()
+    geo.get_ground_grid()
+    assert not geo._ground_grid_dirty
+
+    bulk_delete(Ground, [ground.id])
+    assert not geo._ground_grid_dirty
+    db.session.commit()
+    assert geo._ground_grid_dirty
@@ -0,0 +1,27 @@
+"""Free-text locations resolve to a place only on a full name, never on one word of a longer name"""
+
+import pytest
+
+from app.locations import lookup_place
+
+
+@pytest.mark.parametrize('text, name', [
+    ('Gent', 'Gent'),
+    ('9000 Gent', 'Gent'),
+    ('GAND', 'Gent'),
+    ('Oud-Heverlee', 'Oud-Heverlee'),
+    ('Mol (Achterbos)', 'Mol'),
+    ('Gent, Drongen', 'Gent'),
+    ('Gent centrum', 'Gent'),
+    # Places of the seeded grounds
+    ('Durbuy', 'Durbuy'),
+    ('Hulshout', 'Hulshout'),
+    ('3720 Kortessem', 'Kortessem'),
+])
+def test_known_names(text, name):
+    assert lookup_place(text).name == name
+
+
+@pytest.mark.parametrize('text', ['Oud-Zzyzx Gent', 'Ter Gent', 'Niklaas', 'centrum', ''])
+def test_words_of_unknown_names_do_not_match(text):
+    assert lookup_place(text) is None
@@ -0,0 +1,113 @@
+"""The SQL engine (score_columns) must score every pair exactly like compute_match_scores"""
+
+import math
+import uuid
+
+from app.geo import KM_PER_DEG_LAT, KM_PER_DEG_LNG, LOCATION_DISTANCE_BANDS, squared_distance_km
+from app.matching_sql import check_parity, clear_candidates, load_candidates, run_sql_matching
+from app.models import db, Client, Company, Ground, Preferences
+from app.snapshot import current_snapshot, refresh_snapshot
+
+# Names missing from the location dictionary, so neither side gets a location_id
+UNKNOWN = 'Zzyzxdorp'
+ORIGIN = (0.0, 0.0)
+
+
+def band_edge(max_km):
+    """Points just inside, exactly on and just outside max_km from ORIGIN, as both engines compute it.
+    The edge is searched north of the origin first, then east (not every distance is representable along both).
+    """
+    target = max_km * max_km
+    for axis, km_per_deg in ((0, KM_PER_DEG_LAT), (1, KM_PER_DEG_LNG)):
+        offset = max_km / km_per_deg
+        for _ in range(8):
+            point = list(ORIGIN)
+            point[axis] += offset
+            if squared_distance_km(*point, *ORIGIN) == target:
+                points = []
+                for value in (math.nextafter(offset, 0), offset, math.nextafter(offset, math.inf)):
+                    point = list(ORIGIN)
+                    point[axis] += value
+                    points.append(tuple(point))
+                return points
+            offset = math.nextafter(offset, math.inf if squared_distance_km(*point, *ORIGIN) < target else 0)
+    raise AssertionError(f'no point exactly {max_km} km from the origin')
+
+
+def add_client(company, location, subdivision_type='detached', m2=(100, 900), budget=(100000, 300000),
+               lat=None, lng=None):
+    client = Client(company_id=company.id, name=location, email=f'{uuid.uuid4().hex}@example.be',
+                    location=location, address='Kerkstraat 1')
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Preferences(client_id=client.id, location=location, subdivision_type=subdivision_type,
+                               min_m2=m2[0], max_m2=m2[1], min_budget=budget[0], max_budget=budget[1],
+                               lat=lat, lng=lng))
+    return client
+
+
+def add_ground(location, subdivision_type='detached', m2=500, budget=200000, lat=None, lng=None):
+    ground = Ground(location=location, address='Dorpsstraat 2', m2=m2, budget=budget,
+                    subdivision_type=subdivision_type, owner='Owner', provider='Acme', image_url='',
+                    lat=lat, lng=lng)
+    db.session.add(ground)
+    return ground
+
+
+def make_company():
+    company = Company(name='Acme', email='acme@example.be')
+    db.session.add(company)
+    db.session.flush()
+    return company
+
+
+def test_engines_agree_on_edge_cases(app):
+    company = make_company()
+
+    # Unset (zero) and half-set ranges, boundaries of the ranges
+    add_client(company, 'Gent', m2=(0, 0), budget=(0, 0))
+    add_client(company, 'Gent', m2=(0, 600), budget=(0, 250000))
+    add_client(company, 'Gent', m2=(500, 500), budget=(200000, 200000))
+    # Subdivision type differing only in case, and an empty type
+    add_client(company, 'Antwerpen', subdivision_type='DETACHED')
+    add_client(company, 'Antwerpen', subdivision_type='')
+    # Without location_id and coordinates: substring matching both ways, case-insensitive
+    add_client(company, UNKNOWN)
+    add_client(company, UNKNOWN + '-Noord')
+    add_client(company, UNKNOWN.upper())
+    add_client(company, '')
+    # Geocoded by explicit coordinates only: distance bands
+    add_client(company, UNKNOWN + 'hoek', lat=ORIGIN[0], lng=ORIGIN[1])
+
+    add_ground('Gent')
+    add_ground('Gent', m2=600, budget=250000)
+    add_ground('Antwerpen', subdivision_type='Detached')
+    add_ground('Antwerpen', subdivision_type='terraced')
+    add_ground(UNKNOWN)
+    add_ground(UNKNOWN + '-Noord')
+    add_ground('Bij ' + UNKNOWN.lower())
+    for max_km, _ in LOCATION_DISTANCE_BANDS:
+        # Exactly on, and the nearest representable points inside and outside each band
+        for lat, lng in band_edge(max_km):
+            add_ground(UNKNOWN + 'veld', lat=lat, lng=lng)
+    db.session.commit()
+
+    assert Ground.query.filter(Ground.location_id.is_(None), Ground.lat.is_(None)).count() > 0
+    # Grounds read from the database, then from the memory-mapped snapshot
+    assert check_parity(company.id) == []
+    refresh_snapshot(app.config['GROUND_SNAPSHOT_DIR'])
+    assert current_snapshot() is not None
+    assert check_parity(company.id) == []
+
+
+def test_parity_check_keeps_a_pending_run(app):
+    company = make_company()
+    add_client(company, 'Gent')
+    add_ground('Gent')
+    db.session.commit()
+
+    run_id, count = run_sql_matching(company.id)
+    assert check_parity(company.id) == []
+    assert len(load_candidates(run_id, company.id)) == count == 1
+    clear_candidates(company.id)
+    assert load_candidates(run_id, company.id) == []
@@ -0,0 +1,16 @@
+"""/metrics is only served to scrapers that present METRICS_TOKEN"""
+
+
+def test_metrics_need_a_configured_token(app, client):
+    app.config['METRICS_TOKEN'] = ''
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_need_the_bearer_token(app, client):
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    client.get('/')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert 'endpoint="home"' in response.get_data(as_text=True)
@@ -0,0 +1,134 @@
+"""Pages with a @query_budget run a fixed number of SQL statements, however many rows they show"""
+
+import re
+import uuid
+
+from app.models import db, Client, Company, Ground, Match, Preferences
+from app.snapshot import refresh_snapshot, wait_for_refreshes
+
+SMALL, LARGE = 2, 25
+
+# (endpoint path, who is logged in)
+PAGES = [
+    ('/', None),
+    ('/grounds', None),
+    ('/grounds/{ground_id}', None),
+    ('/dashboard', 'company'),
+    ('/clients', 'company'),
+    ('/preferences', 'company'),
+    ('/preferences/{client_id}', 'company'),
+    ('/matches', 'company'),
+    ('/client/dashboard', 'client'),
+    ('/client/preferences', 'client'),
+]
+
+
+def add_rows(company_id, provider, count):
+    """count clients (with preferences) and grounds; every client of the company ends up matched to every ground.
+    Returns the ids of the first new client and ground.
+    """
+    grounds = [Ground(location='Gent', address=f'Dorpsstraat {i}', m2=500 + i, budget=200000 + i,
+                      subdivision_type='detached', owner='Owner', provider=provider, image_url='')
+               for i in range(count)]
+    clients = [Client(company_id=company_id, name=f'Client {i}', email=f'{uuid.uuid4().hex}@example.be',
+                      location='Gent', address='Kerkstraat 1')
+               for i in range(count)]
+    db.session.add_all(grounds + clients)
+    db.session.flush()
+    for client in clients:
+        db.session.add(Preferences(client_id=client.id, location='Gent', subdivision_type='detached',
+                                   min_m2=100, max_m2=900, min_budget=100000, max_budget=300000))
+    new = {client.id for client in clients} | {ground.id for ground in grounds}
+    for client in Client.query.filter_by(company_id=company_id):
+        for ground in Ground.query:
+            if client.id in new or ground.id in new:
+                db.session.add(Match(client_id=client.id, ground_id=ground.id, status='approved',
+                                     m2_score=100, budget_score=100, location_score=100, type_score=100))
+    db.session.commit()
+    return clients[0].id, grounds[0].id
+
+
+def log_in(http, role, company_id, client_id):
+    with http.session_transaction() as session:
+        session['role'] = role
+        session['company_id'] = company_id
+        if role == 'client':
+            session['client_id'] = client_id
+
+
+def queries_per_page(app, http, company_id, client_id, ground_id, count_queries):
+    # Pages read the ground snapshot when it is current, so have one
+    refresh_snapshot(app.config['GROUND_SNAPSHOT_DIR'])
+    counts = {}
+    for path, role in PAGES:
+        http.get('/logout')
+        if role:
+            log_in(http, role, company_id, client_id)
+        wait_for_refreshes()
+        # Requests share the test's app context: start each on an empty identity map
+        db.session.remove()
+        with count_queries() as queries:
+            response = http.get(path.format(client_id=client_id, ground_id=ground_id))
+        wait_for_refreshes()
+        assert response.status_code == 200, path
+        counts[path] = queries.count
+    return counts
+
+
+def test_query_count_does_not_grow_with_rows(app, client, count_queries):
+    # Pages are full at both sizes, so the "more rows than shown" queries run in both
+    app.config.update(CLIENT_DASHBOARD_MATCHES=SMALL, MATCHES_PER_PAGE=SMALL)
+    company = Company(name='Acme', email='acme@example.be')
+    db.session.add(company)
+    db.session.commit()
+    company_id = company.id
+
+    client_id, ground_id = add_rows(company_id, 'Acme', SMALL)
+    small = queries_per_page(app, client, company_id, client_id, ground_id, count_queries)
+    add_rows(company_id, 'Acme', LARGE - SMALL)
+    assert Ground.query.count() == Client.query.count() == LARGE
+    large = queries_per_page(app, client, company_id, client_id, ground_id, count_queries)
+
+    assert large == small
+
+
+def match_flow_queries(app, http, company_id, count_queries):
+    """Statements per request of running the python engine, reviewing and approving every candidate shown"""
+    refresh_snapshot(app.config['GROUND_SNAPSHOT_DIR'])
+    counts = {}
+    log_in(http, 'company', company_id, None)
+    for name, request in [
+        ('run', lambda: http.post('/match/run', data={'engine': 'python'})),
+        ('review', lambda: http.get('/match/review')),
+        ('approve', lambda: http.post('/match/review', data={'approved_matches': shown})),
+    ]:
+        wait_for_refreshes()
+        db.session.remove()
+        with count_queries() as queries:
+            response = request()
+        wait_for_refreshes()
+        assert response.status_code in (200, 302), name
+        counts[name] = queries.count
+        if name == 'review':
+            shown = re.findall(r'name="approved_matches" value="([\d:]+)"', response.get_data(as_text=True))
+            assert shown
+    return counts
+
+
+def test_match_flow_query_count_does_not_grow_with_rows(app, client, count_queries):
+    company = Company(name='Acme', email='acme@example.be')
+    db.session.add(company)
+    db.session.commit()
+    company_id = company.id
+
+    # Approved pairs are skipped by a run, so clear them to have candidates to review
+    add_rows(company_id, 'Acme', SMALL)
+    Match.query.delete()
+    db.session.commit()
+    small = match_flow_queries(app, client, company_id, count_queries)
+    add_rows(company_id, 'Acme', LARGE - SMALL)
+    Match.query.delete()
+    db.session.commit()
+    large = match_flow_queries(app, client, company_id, count_queries)
+
+    assert large == small
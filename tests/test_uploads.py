@@ -0,0 +1,107 @@
+"""Photo uploads: content sniffing, rejection of non-images and oversized files, spooling to disk"""
+
+import io
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+from app.models import db, Company, Ground
+from app.uploads import UploadError, sniff_image_type, spool_upload
+
+
+def jpeg_bytes(size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 120, 80)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class Upload:
+    """The part of werkzeug's FileStorage that spool_upload reads"""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    """Temp files of spool_upload go here, so leftovers can be checked"""
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize('head, kind', [
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF', ('jpg', 'image/jpeg')),
+    (b'\x89PNG\r\n\x1a\n\x00\x00', ('png', 'image/png')),
+    (b'GIF89a\x01\x00', ('gif', 'image/gif')),
+    (b'RIFF\x24\x00\x00\x00WEBPVP8 ', ('webp', 'image/webp')),
+    (b'<svg xmlns="http://www.w3.org/2000/svg">', None),
+    (b'%PDF-1.7', None),
+])
+def test_image_type_is_sniffed_from_content(head, kind):
+    assert sniff_image_type(head) == kind
+
+
+def test_image_is_spooled_in_chunks(spool_dir):
+    data = jpeg_bytes()
+    path, extension, content_type = spool_upload(Upload(data), max_bytes=len(data), chunk_size=100)
+    assert (extension, content_type) == ('jpg', 'image/jpeg')
+    assert os.path.dirname(path) == str(spool_dir)
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('data, max_bytes, message', [
+    (b'GIF89a' + b'\x00' * 500, 100, 'larger than'),
+    (b'just some text, named photo.jpg', 1000, 'not a supported image'),
+    (b'', 1000, 'empty'),
+])
+def test_rejected_uploads_leave_no_temp_file(spool_dir, data, max_bytes, message):
+    with pytest.raises(UploadError, match=message):
+        spool_upload(Upload(data), max_bytes=max_bytes, chunk_size=64)
+    assert os.listdir(spool_dir) == []
+
+
+@pytest.fixture
+def company_client(app, client, tmp_path):
+    app.config.update(IMAGE_STORAGE='local', LOCAL_STORAGE_ROOT=str(tmp_path / 'uploads'), IMAGE_UPLOAD_ASYNC=False)
+    company = Company(name='Acme', email='acme@example.be')
+    db.session.add(company)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session['role'] = 'company'
+        session['company_id'] = company.id
+    return client
+
+
+def add_ground(http, photo, filename):
+    return http.post('/grounds/add', data={
+        'location': 'Gent', 'address': 'Dorpsstraat 1', 'm2': '500', 'budget': '200000',
+        'subdivision_type': 'detached', 'owner': 'Owner', 'photo': (io.BytesIO(photo), filename),
+    }, follow_redirects=True)
+
+
+def test_added_ground_shows_its_uploaded_photo(company_client):
+    data = jpeg_bytes()
+    add_ground(company_client, data, 'plot.png')
+    ground = Ground.query.one()
+    assert ground.image_url.endswith('.jpg')
+    db.session.remove()
+    response = company_client.get(f'/grounds/{ground.id}/image')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.get_data() == data
+
+
+def test_a_non_image_is_refused_but_the_ground_is_added(company_client):
+    response = add_ground(company_client, b'<html>not a photo</html>', 'plot.jpg')
+    assert b'not a supported image' in response.data
+    assert Ground.query.one().image_url == ''
+
+
+def test_oversized_upload_is_refused_before_the_view(app, company_client):
+    app.config['MAX_UPLOAD_BYTES'] = 1024
+    response = add_ground(company_client, b'\xff\xd8\xff' + b'\x00' * (2 * 1024 * 1024), 'plot.jpg')
+    assert response.status_code == 413
+    assert Ground.query.count() == 0